@@ -56,12 +56,17 @@ setup(
     entry_points={
         'console_scripts': [
             'supervisor_memory_check=supervisor_checks.bin.memory_check:main',
+            'supervisor_memory_growth_check='
+            'supervisor_checks.bin.memory_growth_check:main',
             'supervisor_cpu_check=supervisor_checks.bin.cpu_check:main',
             'supervisor_http_check=supervisor_checks.bin.http_check:main',
             'supervisor_tcp_check=supervisor_checks.bin.tcp_check:main',
             'supervisor_xmlrpc_check=supervisor_checks.bin.xmlrpc_check:main',
             'supervisor_complex_check=supervisor_checks.bin.complex_check:main',
-            'supervisor_file_check=supervisor_checks.bin.file_check:main']
+            'supervisor_multi_check=supervisor_checks.bin.multi_check:main',
+            'supervisor_file_check=supervisor_checks.bin.file_check:main',
+            'supervisor_heartbeat_check='
+            'supervisor_checks.bin.heartbeat_check:main']
     }
 )
 
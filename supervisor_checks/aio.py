@@ -0,0 +1,185 @@
+"""Asyncio helpers used by native asynchronous check implementations.
+"""
+
+import asyncio
+
+__author__ = 'vovanec@gmail.com'
+
+
+HTTP_VERSION = 'HTTP/1.1'
+MAX_HEADER_LINES = 100
+
+
+class HTTPResponse(object):
+    """Minimal HTTP response returned by http_request coroutine.
+    """
+
+    def __init__(self, status, reason, headers, body):
+        """Constructor.
+
+        :param int status: HTTP status code.
+        :param str reason: HTTP reason phrase.
+        :param dict headers: response headers, lower-cased names.
+        :param bytes body: response body.
+        """
+
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+async def open_connection(host=None, port=None, unix_path=None, timeout=None):
+    """Open stream connection to TCP or UNIX socket.
+
+    :param str host: TCP host.
+    :param int port: TCP port.
+    :param str unix_path: path to UNIX socket. If specified, host and port
+           are ignored.
+    :param float timeout: connect timeout, seconds.
+
+    :rtype: (asyncio.StreamReader, asyncio.StreamWriter)
+    """
+
+    if unix_path:
+        connect = asyncio.open_unix_connection(unix_path)
+    else:
+        connect = asyncio.open_connection(host, port)
+
+    return await asyncio.wait_for(connect, timeout)
+
+
+async def close_connection(writer):
+    """Close stream writer ignoring errors.
+
+    :param asyncio.StreamWriter writer: stream writer.
+    """
+
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+async def http_request(method, url, body=None, headers=None, host=None,
+                       port=None, unix_path=None, timeout=None,
+                       max_body_size=None):
+    """Make single HTTP request and read the whole response.
+
+    :param str method: HTTP method.
+    :param str url: request URL (path and query).
+    :param str|bytes body: request body.
+    :param dict headers: request headers.
+    :param str host: TCP host.
+    :param int port: TCP port.
+    :param str unix_path: path to UNIX socket.
+    :param float timeout: overall request timeout, seconds.
+    :param int max_body_size: read not more than that many bytes of response
+           body.
+
+    :rtype: HTTPResponse
+    """
+
+    return await asyncio.wait_for(
+        _http_request(method, url, body, headers or {}, host, port, unix_path,
+                      max_body_size),
+        timeout)
+
+
+async def _http_request(method, url, body, headers, host, port, unix_path,
+                        max_body_size):
+
+    reader, writer = await open_connection(host, port, unix_path)
+
+    try:
+        if isinstance(body, str):
+            body = body.encode()
+
+        if unix_path:
+            host_header = 'localhost'
+        else:
+            host_header = '%s:%s' % (host, port)
+
+        request_headers = {'Host': host_header,
+                           'Connection': 'close',
+                           'Content-Length': str(len(body or b''))}
+        request_headers.update(headers)
+
+        request = ['%s %s %s' % (method, url, HTTP_VERSION)]
+        request.extend('%s: %s' % item for item in request_headers.items())
+        writer.write(('\r\n'.join(request) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+        return await _read_response(reader, max_body_size)
+    finally:
+        await close_connection(writer)
+
+
+async def _read_response(reader, max_body_size=None):
+
+    status_line = (await reader.readline()).decode('latin-1').rstrip()
+    try:
+        _, status, reason = (status_line.split(None, 2) + [''])[:3]
+        status = int(status)
+    except ValueError:
+        raise ValueError('Bad HTTP status line: %r' % (status_line,))
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = (await reader.readline()).decode('latin-1').rstrip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError('Too many HTTP response headers.')
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = await _read_chunked(reader, max_body_size)
+    elif 'content-length' in headers:
+        content_length = int(headers['content-length'])
+        if max_body_size is not None:
+            content_length = min(content_length, max_body_size)
+        body = await reader.readexactly(content_length)
+    elif max_body_size is not None:
+        body = b''
+        while len(body) < max_body_size:
+            data = await reader.read(max_body_size - len(body))
+            if not data:
+                break
+            body += data
+    else:
+        body = await reader.read()
+
+    return HTTPResponse(status, reason, headers, body)
+
+
+async def _read_chunked(reader, max_body_size=None):
+
+    # Connection is closed after request, so the rest of the body
+    # exceeding max_body_size is not read at all.
+    chunks = []
+    body_size = 0
+    while True:
+        size_line = (await reader.readline()).split(b';', 1)[0].strip()
+        size = int(size_line, 16)
+        if not size:
+            # Skip trailers.
+            while (await reader.readline()).strip():
+                pass
+            break
+        if max_body_size is not None and body_size + size >= max_body_size:
+            chunks.append(
+                await reader.readexactly(max_body_size - body_size))
+            break
+        chunks.append(await reader.readexactly(size))
+        body_size += size
+        await reader.readline()
+
+    return b''.join(chunks)
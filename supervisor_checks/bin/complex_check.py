@@ -13,22 +13,11 @@ import json
 import sys
 
 from supervisor_checks import check_runner
-from supervisor_checks.check_modules import cpu
-from supervisor_checks.check_modules import http
-from supervisor_checks.check_modules import memory
-from supervisor_checks.check_modules import tcp
-from supervisor_checks.check_modules import xmlrpc
+from supervisor_checks.check_modules import registry
 
 __author__ = 'vovanec@gmail.com'
 
 
-CHECK_CLASSES = {http.HTTPCheck.NAME: http.HTTPCheck,
-                 memory.MemoryCheck.NAME: memory.MemoryCheck,
-                 tcp.TCPCheck.NAME: tcp.TCPCheck,
-                 xmlrpc.XMLRPCCheck.NAME: xmlrpc.XMLRPCCheck,
-                 cpu.CPUCheck.NAME: cpu.CPUCheck}
-
-
 def _make_argument_parser():
     """Create the option parser.
     """
@@ -47,6 +36,7 @@ def _make_argument_parser():
                              'is passed in')
     parser.add_argument('-c', '--check-config', dest='check_config', type=str,
                         help='Check config JSON', required=True, default=None)
+    check_runner.add_runner_arguments(parser)
 
     return parser
 
@@ -62,10 +52,12 @@ def main():
 
     checks_config = []
     for check_name, check_config in checks_config_dict.items():
-        checks_config.append((CHECK_CLASSES[check_name], check_config))
+        checks_config.append((registry.get_check_class(check_name),
+                              check_config))
 
     return check_runner.CheckRunner(
-        args.check_name, args.process_group, args.process_name, checks_config).run()
+        args.check_name, args.process_group, args.process_name, checks_config,
+        **check_runner.get_runner_kwargs(args)).run()
 
 
 if __name__ == '__main__':
@@ -12,6 +12,7 @@ import argparse
 import sys
 
 from supervisor_checks import check_runner
+from supervisor_checks import stats
 from supervisor_checks.check_modules import cpu
 
 
@@ -43,6 +44,23 @@ def _make_argument_parser():
         '-i', '--interval', dest='interval', type=int, required=True,
         help='How long process is allowed to use CPU over threshold, seconds.')
 
+    parser.add_argument(
+        '-s', '--sampling', dest='sampling', type=str, required=False,
+        default=cpu.SAMPLING_INTERVAL, choices=cpu.SAMPLING_MODES,
+        help='CPU sampling mode: `interval` measures CPU usage within %s '
+             'seconds interval, `tick` measures CPU usage since the previous '
+             'check without blocking. Default: %s' % (
+                 cpu.PSUTIL_CHECK_INTERVAL, cpu.SAMPLING_INTERVAL))
+    parser.add_argument(
+        '-S', '--stat', dest='stat', type=str, required=False, default=None,
+        help='Rolling window statistic compared to the threshold: %s or '
+             'percentile in format pNN, e.g. p95.' % (', '.join(stats.STATS),))
+    parser.add_argument(
+        '-w', '--window', dest='window', type=int, required=False,
+        default=None,
+        help='Rolling window length, seconds. Required if statistic is '
+             'specified.')
+
     return parser
 
 
@@ -52,7 +70,10 @@ def main():
     args = arg_parser.parse_args()
 
     checks_config = [(cpu.CPUCheck, {'max_cpu': args.max_cpu,
-                                     'interval': args.interval})]
+                                     'interval': args.interval,
+                                     'sampling': args.sampling,
+                                     'stat': args.stat,
+                                     'window': args.window})]
 
     return check_runner.CheckRunner(
         args.check_name, args.process_group, args.process_name, checks_config).run()
@@ -28,6 +28,7 @@ def _make_argument_parser():
     parser.add_argument("-x", "--fail-on-error", dest="fail_on_error", action="store_true", help="Fail the health check on any error.")
     parser.add_argument("-f", "--filepath", dest="filepath", type=str, default=None, help="Filepath of file to check (default: %%(root_directory)/%%(process_group)s-%%(process_name)s-%%(process_pid)s-*)")
     parser.add_argument("-d", "--root-dir", dest="root_dir", type=str, default=None, help="Root Directory of Notification Files (default: tempfile.gettempdir())")
+    parser.add_argument("-w", "--watch", dest="watch", action="store_true", help="Watch notification files with inotify instead of stat-ing them on every check, or sweep their directory once per tick if inotify is unavailable.")
     return parser
 
 
@@ -36,7 +37,7 @@ def main():
     arg_parser = _make_argument_parser()
     args = arg_parser.parse_args()
 
-    checks_config = [(file.FileCheck, {'timeout': args.timeout, 'fail_on_error': args.fail_on_error, 'filepath': args.filepath, 'root_dir': args.root_dir})]
+    checks_config = [(file.FileCheck, {'timeout': args.timeout, 'fail_on_error': args.fail_on_error, 'filepath': args.filepath, 'root_dir': args.root_dir, 'watch': args.watch})]
     return check_runner.CheckRunner(
         args.check_name, args.process_group, args.process_name, checks_config).run()
 
@@ -0,0 +1,84 @@
+#! /usr/bin/env python3
+
+"""Example configuration(restart process when it hasn't published heartbeat
+to the default shared memory segment for 30 seconds):
+
+[eventlistener:example_check]
+command=/usr/local/bin/supervisor_heartbeat_check -n example_check -t 30 -g example_service
+events=TICK_5
+"""
+
+import argparse
+import sys
+
+from supervisor_checks import check_runner
+from supervisor_checks import heartbeat_segment
+from supervisor_checks.check_modules import heartbeat
+
+
+__author__ = 'vovanec@gmail.com'
+
+
+def _make_argument_parser():
+    """Create the option parser.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Run shared memory heartbeat check program.')
+    parser.add_argument('-n', '--check-name', dest='check_name',
+                        type=str, required=True, default=None,
+                        help='Health check name.')
+    parser.add_argument('-g', '--process-group', dest='process_group',
+                        type=str, default=None,
+                        help='Supervisor process group name.')
+    parser.add_argument('-N', '--process-name', dest='process_name',
+                        type=str, default=None,
+                        help='Supervisor process name. Process group argument is ignored if this ' +
+                             'is passed in')
+    parser.add_argument(
+        '-t', '--timeout', dest='timeout', type=float, required=True,
+        help='Timeout in seconds after no heartbeat a process is considered '
+             'dead.')
+    parser.add_argument(
+        '-p', '--progress-timeout', dest='progress_timeout', type=float,
+        required=False, default=None,
+        help='Timeout in seconds after no change of progress counter a '
+             'process is considered stuck.')
+    parser.add_argument(
+        '-s', '--segment-path', dest='segment_path', type=str,
+        required=False, default=None,
+        help='Heartbeat segment path. Default: %s' % (
+            heartbeat_segment.get_default_path(),))
+    parser.add_argument(
+        '-o', '--segment-owner', dest='segment_owner', type=str,
+        required=False, default=None,
+        help='User the heartbeat segment must be owned by, if workers run as '
+             'another user. Default: the user check runs as.')
+    parser.add_argument(
+        '-x', '--fail-on-error', dest='fail_on_error', action='store_true',
+        help='Fail the health check if the segment or process slot is '
+             'missing.')
+
+    return parser
+
+
+def main():
+
+    arg_parser = _make_argument_parser()
+    args = arg_parser.parse_args()
+
+    check_config = {'timeout': args.timeout,
+                    'fail_on_error': args.fail_on_error}
+    for param in ('progress_timeout', 'segment_path', 'segment_owner'):
+        if getattr(args, param) is not None:
+            check_config[param] = getattr(args, param)
+
+    checks_config = [(heartbeat.HeartbeatCheck, check_config)]
+
+    return check_runner.CheckRunner(
+        args.check_name, args.process_group, args.process_name, checks_config).run()
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
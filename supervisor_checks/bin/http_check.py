@@ -12,6 +12,8 @@ import json
 import sys
 
 from supervisor_checks import check_runner
+from supervisor_checks import http_pool
+from supervisor_checks import utils
 from supervisor_checks.check_modules import http
 
 __author__ = 'vovanec@gmail.com'
@@ -63,6 +65,77 @@ def _make_argument_parser():
         '-r', '--num-retries', dest='num_retries', type=int,
         default=http.DEFAULT_RETRIES, required=False,
         help='Connection retries. Default: %s' % (http.DEFAULT_RETRIES,))
+    parser.add_argument(
+        '-B', '--retry-backoff', dest='retry_backoff', type=float,
+        default=utils.RETRY_SLEEP_TIME, required=False,
+        help='Base delay between retries, grows exponentially with every '
+             'retry and is randomized. Default: %s' % (
+                 utils.RETRY_SLEEP_TIME,))
+    parser.add_argument(
+        '-D', '--deadline', dest='deadline', type=float, default=None,
+        required=False,
+        help='Give up retrying when that many seconds passed since the '
+             'first try. Timeout of every try is capped by the time left.')
+    parser.add_argument(
+        '-E', '--retry-on', dest='retry_on', nargs='+', default=None,
+        choices=sorted(utils.RETRYABLE_ERRORS), required=False,
+        help='Retry only on these errors. By default any error is retried.')
+    parser.add_argument(
+        '-k', '--keep-alive', dest='keep_alive', action='store_true',
+        help='Reuse persistent HTTP connections across checks.')
+    parser.add_argument(
+        '-s', '--pool-size', dest='pool_size', type=int, required=False,
+        default=http_pool.DEFAULT_POOL_SIZE,
+        help='Maximum number of idle keep-alive connections per port. '
+             'Default: %s' % (http_pool.DEFAULT_POOL_SIZE,))
+    parser.add_argument(
+        '-i', '--idle-timeout', dest='idle_timeout', type=int, required=False,
+        default=http_pool.DEFAULT_IDLE_TIMEOUT,
+        help='Close keep-alive connections idle for longer than that, '
+             'seconds. Default: %s' % (http_pool.DEFAULT_IDLE_TIMEOUT,))
+    parser.add_argument(
+        '-c', '--status-codes', dest='status_codes', type=int, nargs='+',
+        default=None, required=False,
+        help='HTTP status codes considered successful. Default: %s' % (
+            ' '.join(str(code) for code in http.DEFAULT_STATUS_CODES),))
+    parser.add_argument(
+        '-e', '--expect-body', dest='expect_body', type=str, default=None,
+        required=False,
+        help='Check succeeds only if response body contains that string.')
+    parser.add_argument(
+        '-R', '--expect-body-re', dest='expect_body_re', type=str,
+        default=None, required=False,
+        help='Check succeeds only if response body matches that regular '
+             'expression.')
+    parser.add_argument(
+        '-J', '--expect-json', dest='expect_json', type=json.loads,
+        default=None, required=False,
+        help='Check succeeds only if response body is JSON having these '
+             'values, e.g. \'{"healthy": true, "checks.0.status": "ok"}\'.')
+    parser.add_argument(
+        '-M', '--max-body-size', dest='max_body_size', type=int,
+        default=http.DEFAULT_MAX_BODY_SIZE, required=False,
+        help='Read not more than that many bytes of response body. '
+             'Default: %s' % (http.DEFAULT_MAX_BODY_SIZE,))
+    parser.add_argument(
+        '-L', '--max-latency-ms', dest='max_latency_ms', type=int,
+        default=None, required=False,
+        help='Maximum response time, milliseconds.')
+    parser.add_argument(
+        '-V', '--max-latency-violations', dest='max_latency_violations',
+        type=int, default=http.DEFAULT_MAX_LATENCY_VIOLATIONS,
+        required=False,
+        help='Fail if response time is above the maximum on that many '
+             'consecutive checks. Default: %s' % (
+                 http.DEFAULT_MAX_LATENCY_VIOLATIONS,))
+    parser.add_argument(
+        '-a', '--asyncio', dest='asyncio', action='store_true',
+        help='Run checks as coroutines on a single event loop.')
+    parser.add_argument(
+        '-C', '--max-concurrency', dest='max_concurrency', type=int,
+        default=check_runner.DEFAULT_MAX_CONCURRENCY, required=False,
+        help='Maximum number of checks running at once in asyncio mode. '
+             'Default: %s' % (check_runner.DEFAULT_MAX_CONCURRENCY,))
 
     return parser
 
@@ -72,19 +145,38 @@ def main():
     arg_parser = _make_argument_parser()
     args = arg_parser.parse_args()
 
-    checks_config = [(http.HTTPCheck, {'url': args.url,
-                                       'timeout': args.timeout,
-                                       'num_retries': args.num_retries,
-                                       'method': args.method,
-                                       'json': args.json,
-                                       'body': args.body,
-                                       'headers': args.headers,
-                                       'port': args.port,
-                                       'username': args.username,
-                                       'password': args.password,
-                                       })]
+    check_config = {'url': args.url,
+                    'timeout': args.timeout,
+                    'num_retries': args.num_retries,
+                    'retry_backoff': args.retry_backoff,
+                    'deadline': args.deadline,
+                    'retry_on': args.retry_on,
+                    'method': args.method,
+                    'json': args.json,
+                    'body': args.body,
+                    'headers': args.headers,
+                    'port': args.port,
+                    'username': args.username,
+                    'password': args.password,
+                    'keep_alive': args.keep_alive,
+                    'pool_size': args.pool_size,
+                    'idle_timeout': args.idle_timeout,
+                    'status_codes': args.status_codes,
+                    'max_body_size': args.max_body_size,
+                    'max_latency_ms': args.max_latency_ms,
+                    'max_latency_violations': args.max_latency_violations}
+    for param in ('expect_body', 'expect_body_re', 'expect_json'):
+        if getattr(args, param) is not None:
+            check_config[param] = getattr(args, param)
+
+    checks_config = [(http.HTTPCheck, check_config)]
+    execution_mode = (check_runner.EXECUTION_MODE_ASYNCIO if args.asyncio
+                      else check_runner.EXECUTION_MODE_THREADS)
+
     return check_runner.CheckRunner(
-        args.check_name, args.process_group, args.process_name, checks_config).run()
+        args.check_name, args.process_group, args.process_name, checks_config,
+        execution_mode=execution_mode,
+        max_concurrency=args.max_concurrency).run()
 
 
 if __name__ == '__main__':
@@ -11,6 +11,7 @@ import argparse
 import sys
 
 from supervisor_checks import check_runner
+from supervisor_checks import stats
 from supervisor_checks.check_modules import memory
 
 
@@ -39,6 +40,21 @@ def _make_argument_parser():
     parser.add_argument(
         '-c', '--cumulative', dest='cumulative', action='store_true',
         help='Recursively calculate memory used by all process children.')
+    parser.add_argument(
+        '-M', '--metric', dest='metric', type=str, required=False,
+        default=memory.METRIC_RSS, choices=memory.METRICS,
+        help='Memory usage metric compared to the threshold. pss counts '
+             'shared pages proportionally, uss counts only pages private to '
+             'process. Default: %s' % (memory.METRIC_RSS,))
+    parser.add_argument(
+        '-S', '--stat', dest='stat', type=str, required=False, default=None,
+        help='Rolling window statistic compared to the threshold: %s or '
+             'percentile in format pNN, e.g. p95.' % (', '.join(stats.STATS),))
+    parser.add_argument(
+        '-w', '--window', dest='window', type=int, required=False,
+        default=None,
+        help='Rolling window length, seconds. Required if statistic is '
+             'specified.')
 
     return parser
 
@@ -49,7 +65,10 @@ def main():
     args = arg_parser.parse_args()
 
     checks_config = [(memory.MemoryCheck, {'max_rss': args.max_rss,
-                                           'cumulative': args.cumulative})]
+                                           'cumulative': args.cumulative,
+                                           'metric': args.metric,
+                                           'stat': args.stat,
+                                           'window': args.window})]
 
     return check_runner.CheckRunner(
         args.check_name, args.process_group, args.process_name, checks_config).run()
@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+
+"""Example configuration(restart process when its memory usage grows faster
+than 1M per minute over the last hour):
+
+[eventlistener:example_check]
+command=/usr/local/bin/supervisor_memory_growth_check -n example_check -r 1024 -w 3600 -g example_service
+events=TICK_60
+"""
+
+import argparse
+import sys
+
+from supervisor_checks import check_runner
+from supervisor_checks.check_modules import memory
+from supervisor_checks.check_modules import memory_growth
+
+
+__author__ = 'vovanec@gmail.com'
+
+
+def _make_argument_parser():
+    """Create the option parser.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Run memory growth check program.')
+    parser.add_argument('-n', '--check-name', dest='check_name',
+                        type=str, required=True, default=None,
+                        help='Health check name.')
+    parser.add_argument('-g', '--process-group', dest='process_group',
+                        type=str, default=None,
+                        help='Supervisor process group name.')
+    parser.add_argument('-N', '--process-name', dest='process_name',
+                        type=str, default=None,
+                        help='Supervisor process name. Process group argument is ignored if this ' +
+                             'is passed in')
+    parser.add_argument(
+        '-w', '--window', dest='window', type=int, required=True,
+        help='Window to calculate memory usage growth rate over, seconds.')
+    parser.add_argument(
+        '-r', '--max-growth-rate', dest='max_growth_rate', type=float,
+        required=False, default=None,
+        help='Maximum memory usage growth rate, KB per minute.')
+    parser.add_argument(
+        '-m', '--max-rss', dest='max_rss', type=int, required=False,
+        default=None,
+        help='Memory usage limit, KB. Required if horizon is specified.')
+    parser.add_argument(
+        '-H', '--horizon', dest='horizon', type=int, required=False,
+        default=None,
+        help='Fail if memory usage is projected to reach the limit within '
+             'that many seconds.')
+    parser.add_argument(
+        '-c', '--cumulative', dest='cumulative', action='store_true',
+        help='Recursively calculate memory used by all process children.')
+    parser.add_argument(
+        '-M', '--metric', dest='metric', type=str, required=False,
+        default=memory.METRIC_RSS, choices=memory.METRICS,
+        help='Memory usage metric. Default: %s' % (memory.METRIC_RSS,))
+
+    return parser
+
+
+def main():
+
+    arg_parser = _make_argument_parser()
+    args = arg_parser.parse_args()
+
+    check_config = {'window': args.window,
+                    'cumulative': args.cumulative,
+                    'metric': args.metric}
+    for param in ('max_growth_rate', 'max_rss', 'horizon'):
+        if getattr(args, param) is not None:
+            check_config[param] = getattr(args, param)
+
+    checks_config = [(memory_growth.MemoryGrowthCheck, check_config)]
+
+    return check_runner.CheckRunner(
+        args.check_name, args.process_group, args.process_name, checks_config).run()
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+
+r"""Run checks for many process groups and processes from single listener.
+
+Example configuration:
+
+[eventlistener:example_check]
+command=/usr/local/bin/supervisor_multi_check -n example_check -f /etc/supervisor/checks.json
+events=TICK_5
+
+Where /etc/supervisor/checks.json maps process group names or process
+namespecs(group:name) to their check configs in the same format as
+supervisor_complex_check accepts:
+
+{
+  "example_service": {"http": {"timeout": 15, "port": 8090, "url": "\/ping"}},
+  "workers:worker_01": {"memory": {"cumulative": true, "max_rss": 4194304}}
+}
+"""
+
+import argparse
+import json
+import sys
+
+from supervisor_checks import check_runner
+from supervisor_checks.check_modules import registry
+
+__author__ = 'vovanec@gmail.com'
+
+
+def _make_argument_parser():
+    """Create the option parser.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Run SupervisorD checks for many process groups.')
+    parser.add_argument('-n', '--check-name', dest='check_name',
+                        type=str, required=True, default=None,
+                        help='Health check name.')
+    parser.add_argument('-f', '--config-file', dest='config_file', type=str,
+                        help='Path to JSON file mapping process group names '
+                             'or namespecs to check configs',
+                        required=True, default=None)
+    check_runner.add_runner_arguments(parser)
+
+    return parser
+
+
+def _load_targets(config_file):
+    """Load check targets from config file.
+
+    :param str config_file: path to JSON config file.
+
+    :return: the list of tuples (process_group, process_name, checks_config)
+    :rtype: list
+    """
+
+    with open(config_file) as fobj:
+        targets_config_dict = json.load(fobj)
+
+    if not isinstance(targets_config_dict, dict):
+        raise ValueError('Check config must be dictionary type!')
+
+    targets = []
+    for process_spec, checks_config_dict in targets_config_dict.items():
+        if not isinstance(checks_config_dict, dict):
+            raise ValueError('Check config for %s must be dictionary type!' % (
+                process_spec,))
+
+        checks_config = []
+        for check_name, check_config in checks_config_dict.items():
+            checks_config.append((registry.get_check_class(check_name),
+                                  check_config))
+
+        if ':' in process_spec:
+            targets.append((None, process_spec, checks_config))
+        else:
+            targets.append((process_spec, None, checks_config))
+
+    return targets
+
+
+def main():
+
+    arg_parser = _make_argument_parser()
+    args = arg_parser.parse_args()
+
+    return check_runner.CheckRunner(
+        args.check_name, None, None, None,
+        targets=_load_targets(args.config_file),
+        **check_runner.get_runner_kwargs(args)).run()
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -8,9 +8,11 @@ events=TICK_60
 """
 
 import argparse
+import codecs
 import sys
 
 from supervisor_checks import check_runner
+from supervisor_checks import utils
 from supervisor_checks.check_modules import tcp
 
 
@@ -46,6 +48,37 @@ def _make_argument_parser():
         '-r', '--num-retries', dest='num_retries', type=int,
         default=tcp.DEFAULT_RETRIES, required=False,
         help='Connection retries. Default: %s' % (tcp.DEFAULT_RETRIES,))
+    parser.add_argument(
+        '-B', '--retry-backoff', dest='retry_backoff', type=float,
+        default=utils.RETRY_SLEEP_TIME, required=False,
+        help='Base delay between retries, grows exponentially with every '
+             'retry and is randomized. Default: %s' % (
+                 utils.RETRY_SLEEP_TIME,))
+    parser.add_argument(
+        '-D', '--deadline', dest='deadline', type=float, default=None,
+        required=False,
+        help='Give up retrying when that many seconds passed since the '
+             'first try. Timeout of every try is capped by the time left.')
+    parser.add_argument(
+        '-E', '--retry-on', dest='retry_on', nargs='+', default=None,
+        choices=sorted(utils.RETRYABLE_ERRORS), required=False,
+        help='Retry only on these errors. By default any error is retried.')
+    parser.add_argument(
+        '-s', '--send', dest='send', type=str, default=None, required=False,
+        help='Data to send once connected. Backslash escapes are '
+             'interpreted, e.g. "PING\\r\\n".')
+    parser.add_argument(
+        '-e', '--expect', dest='expect', type=str, default=None,
+        required=False,
+        help='Check succeeds only if response contains that string.')
+    parser.add_argument(
+        '-a', '--asyncio', dest='asyncio', action='store_true',
+        help='Run checks as coroutines on a single event loop.')
+    parser.add_argument(
+        '-C', '--max-concurrency', dest='max_concurrency', type=int,
+        default=check_runner.DEFAULT_MAX_CONCURRENCY, required=False,
+        help='Maximum number of checks running at once in asyncio mode. '
+             'Default: %s' % (check_runner.DEFAULT_MAX_CONCURRENCY,))
 
     return parser
 
@@ -55,12 +88,26 @@ def main():
     arg_parser = _make_argument_parser()
     args = arg_parser.parse_args()
 
-    checks_config = [(tcp.TCPCheck, {'timeout': args.timeout,
-                                     'num_retries': args.num_retries,
-                                     'port': args.port})]
+    check_config = {'timeout': args.timeout,
+                    'num_retries': args.num_retries,
+                    'retry_backoff': args.retry_backoff,
+                    'deadline': args.deadline,
+                    'retry_on': args.retry_on,
+                    'port': args.port}
+    for param in ('send', 'expect'):
+        if getattr(args, param) is not None:
+            check_config[param] = codecs.decode(getattr(args, param),
+                                                'unicode_escape')
+
+    checks_config = [(tcp.TCPCheck, check_config)]
+
+    execution_mode = (check_runner.EXECUTION_MODE_ASYNCIO if args.asyncio
+                      else check_runner.EXECUTION_MODE_THREADS)
 
     return check_runner.CheckRunner(
-        args.check_name, args.process_group, args.process_name, checks_config).run()
+        args.check_name, args.process_group, args.process_name, checks_config,
+        execution_mode=execution_mode,
+        max_concurrency=args.max_concurrency).run()
 
 
 if __name__ == '__main__':
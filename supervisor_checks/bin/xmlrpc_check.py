@@ -11,6 +11,8 @@ import argparse
 import sys
 
 from supervisor_checks import check_runner
+from supervisor_checks import utils
+from supervisor_checks import xmlrpc_pool
 from supervisor_checks.check_modules import xmlrpc
 
 __author__ = 'vovanec@gmail.com'
@@ -57,10 +59,46 @@ def _make_argument_parser():
         default=None, required=False,
         help='Port to query. Can be integer or regular expression which '
              'will be used to extract port from a process name.')
+    parser.add_argument(
+        '-t', '--timeout', dest='timeout', type=float, required=False,
+        default=xmlrpc.DEFAULT_TIMEOUT,
+        help='Connection and response timeout of every try, seconds. '
+             'Default: %s' % (xmlrpc.DEFAULT_TIMEOUT,))
     parser.add_argument(
         '-r', '--num-retries', dest='num_retries', type=int,
         default=xmlrpc.DEFAULT_RETRIES, required=False,
         help='Connection retries. Default: %s' % (xmlrpc.DEFAULT_RETRIES,))
+    parser.add_argument(
+        '-B', '--retry-backoff', dest='retry_backoff', type=float,
+        default=utils.RETRY_SLEEP_TIME, required=False,
+        help='Base delay between retries, grows exponentially with every '
+             'retry and is randomized. Default: %s' % (
+                 utils.RETRY_SLEEP_TIME,))
+    parser.add_argument(
+        '-D', '--deadline', dest='deadline', type=float, default=None,
+        required=False,
+        help='Give up retrying when that many seconds passed since the '
+             'first try. Timeout of every try is capped by the time left.')
+    parser.add_argument(
+        '-E', '--retry-on', dest='retry_on', nargs='+', default=None,
+        choices=sorted(utils.RETRYABLE_ERRORS), required=False,
+        help='Retry only on these errors. By default any error is retried.')
+    parser.add_argument(
+        '-k', '--keep-alive', dest='keep_alive', action='store_true',
+        help='Reuse persistent XML RPC connections across checks.')
+    parser.add_argument(
+        '-i', '--idle-timeout', dest='idle_timeout', type=int, required=False,
+        default=xmlrpc_pool.DEFAULT_IDLE_TIMEOUT,
+        help='Close keep-alive connections idle for longer than that, '
+             'seconds. Default: %s' % (xmlrpc_pool.DEFAULT_IDLE_TIMEOUT,))
+    parser.add_argument(
+        '-a', '--asyncio', dest='asyncio', action='store_true',
+        help='Run checks as coroutines on a single event loop.')
+    parser.add_argument(
+        '-C', '--max-concurrency', dest='max_concurrency', type=int,
+        default=check_runner.DEFAULT_MAX_CONCURRENCY, required=False,
+        help='Maximum number of checks running at once in asyncio mode. '
+             'Default: %s' % (check_runner.DEFAULT_MAX_CONCURRENCY,))
 
     return parser
 
@@ -73,15 +111,26 @@ def main():
     checks_config = [(xmlrpc.XMLRPCCheck, {'url': args.url,
                                            'sock_path': args.sock_path,
                                            'sock_dir': args.sock_dir,
+                                           'timeout': args.timeout,
                                            'num_retries': args.num_retries,
+                                           'retry_backoff': args.retry_backoff,
+                                           'deadline': args.deadline,
+                                           'retry_on': args.retry_on,
                                            'port': args.port,
                                            'method': args.method,
                                            'username': args.username,
                                            'password': args.password,
+                                           'keep_alive': args.keep_alive,
+                                           'idle_timeout': args.idle_timeout,
                                            })]
 
+    execution_mode = (check_runner.EXECUTION_MODE_ASYNCIO if args.asyncio
+                      else check_runner.EXECUTION_MODE_THREADS)
+
     return check_runner.CheckRunner(
-        args.check_name, args.process_group, args.process_name, checks_config).run()
+        args.check_name, args.process_group, args.process_name, checks_config,
+        execution_mode=execution_mode,
+        max_concurrency=args.max_concurrency).run()
 
 
 if __name__ == '__main__':
@@ -1,6 +1,12 @@
 """Base class for checks.
 """
 
+import logging
+import threading
+
+from supervisor_checks import logs
+from supervisor_checks import result_cache
+
 __author__ = 'vovanec@gmail.com'
 
 
@@ -14,12 +20,27 @@ class BaseCheck(object):
         """Constructor.
 
         :param dict check_config: implementation specific check config.
-        :param (str) -> None log: logging function.
+        :param log: logger, or logging function (str) -> None which
+               receives messages of all levels.
         """
 
         self._config = check_config
         self._validate_config()
-        self.__log = log
+        self._cache_policy = result_cache.CachePolicy.from_config(
+            self.NAME, check_config, stateful=self._keeps_state())
+        self._result_cache = (result_cache.get_cache(self._cache_policy)
+                              if self._cache_policy is not None else None)
+        # Number of retries made by check, exported as metric. Checks of
+        # different processes retry concurrently from the thread pool.
+        self.retries_count = 0
+        self._retries_lock = threading.Lock()
+        if isinstance(log, (logging.Logger, logging.LoggerAdapter)):
+            self.__logger = logs.CheckLoggerAdapter(
+                log, {'check': self.__class__.__name__})
+            self.__log = None
+        else:
+            self.__logger = None
+            self.__log = log
 
     def __call__(self, process_spec):
         """Run single check.
@@ -35,6 +56,87 @@ class BaseCheck(object):
 
         raise NotImplementedError
 
+    async def check_async(self, process_spec):
+        """Run single check from asyncio event loop.
+
+        Default implementation runs blocking check in event loop's default
+        executor. Checks that are able to do their I/O natively should
+        override this method.
+
+        :param dict process_spec: process specification dictionary as returned
+               by SupervisorD API.
+
+        :return: True is check succeeded, otherwise False.
+
+        :rtype: bool
+        """
+
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self, process_spec)
+
+    def run(self, process_spec):
+        """Run single check, or reuse its fresh result if caching is
+        configured. This is what check runner calls.
+
+        :param dict process_spec: process specification dictionary as returned
+               by SupervisorD API.
+
+        :return: check result, wrapped in CachedResult if it was reused.
+        :rtype: bool|result_cache.CachedResult
+        """
+
+        if self._result_cache is None:
+            return self(process_spec)
+
+        key = result_cache.make_key(self.NAME, self._config, process_spec)
+        result = self._get_cached_result(key, process_spec)
+        if result is None:
+            result = self(process_spec)
+            self._result_cache.set(key, result, self._cache_policy.ttl)
+
+        return result
+
+    async def run_async(self, process_spec):
+        """Run single check from asyncio event loop, or reuse its fresh result
+        if caching is configured.
+
+        :param dict process_spec: process specification dictionary as returned
+               by SupervisorD API.
+
+        :return: check result, wrapped in CachedResult if it was reused.
+        :rtype: bool|result_cache.CachedResult
+        """
+
+        if self._result_cache is None:
+            return await self.check_async(process_spec)
+
+        key = result_cache.make_key(self.NAME, self._config, process_spec)
+        result = self._get_cached_result(key, process_spec)
+        if result is None:
+            result = await self.check_async(process_spec)
+            self._result_cache.set(key, result, self._cache_policy.ttl)
+
+        return result
+
+    def prepare(self, process_specs, timeout=None):
+        """Prepare for checks of many processes on this tick.
+
+        Called once per tick before the check is run for every process, so
+        that checks are able to batch their I/O across processes. Should not
+        block for long, since checks are only started once all of them are
+        prepared: slow I/O should be run in background, and the check should
+        wait for its result. Default implementation does nothing.
+
+        :param list process_specs: specifications of processes the check is
+               due for, except for processes it may be skipped for because of
+               gating checks. May be empty.
+        :param float timeout: should complete within that many seconds.
+        """
+
+        pass
+
     def _validate_config(self):
         """Method may be implemented in subclasses. Should return None or
         raise InvalidCheckConfig in case if configuration is invalid.
@@ -49,10 +151,71 @@ class BaseCheck(object):
 
         pass
 
+    def _keeps_state(self):
+        """Whether check result depends on previous runs of the check, so
+        that it can't be cached. Method may be implemented in subclasses.
+
+        :rtype: bool
+        """
+
+        return False
+
+    def _get_cached_result(self, key, process_spec):
+        """Get fresh cached result of the check.
+
+        :param str key: result key, as returned by result_cache.make_key.
+        :param dict process_spec: process specification dictionary.
+
+        :return: cached result, or None if there's no fresh result.
+        :rtype: result_cache.CachedResult|None
+        """
+
+        result = self._result_cache.get(key)
+        if result is None:
+            return None
+
+        self._debug('Reusing cached result for process %s: %s.',
+                    process_spec['name'], result)
+
+        return result_cache.CachedResult(result)
+
+    def _on_retry(self):
+        """Count retry. Should be passed as `on_retry` argument to
+        utils.retry_errors.
+        """
+
+        with self._retries_lock:
+            self.retries_count += 1
+
     def _log(self, msg, *args):
         """Log check message.
 
         :param str msg: log message.
         """
 
-        self.__log('%s: %s' % (self.__class__.__name__, msg % args))
+        self.__log_at(logging.INFO, msg, args)
+
+    def _debug(self, msg, *args):
+        """Log check message which is only useful for troubleshooting, such
+        as successful check details.
+
+        :param str msg: log message.
+        """
+
+        self.__log_at(logging.DEBUG, msg, args)
+
+    def _warning(self, msg, *args):
+        """Log check failure details.
+
+        :param str msg: log message.
+        """
+
+        self.__log_at(logging.WARNING, msg, args)
+
+    def __log_at(self, level, msg, args):
+
+        if self.__logger is not None:
+            # Message is only formatted if level is enabled.
+            self.__logger.log(level, msg, *args)
+        else:
+            self.__log('%s: %s' % (self.__class__.__name__, msg % args))
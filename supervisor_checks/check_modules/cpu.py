@@ -2,9 +2,11 @@
 """
 
 import psutil
+import threading
 import time
 
 from supervisor_checks import errors
+from supervisor_checks import stats
 from supervisor_checks.check_modules import base
 
 __author__ = 'vovanec@gmail.com'
@@ -12,6 +14,12 @@ __author__ = 'vovanec@gmail.com'
 
 PSUTIL_CHECK_INTERVAL = 3.0
 DEF_CPU_CHECK_INTERVAL = 3600
+PROCESS_CACHE_PRUNE_INTERVAL = 60
+
+# CPU sampling modes
+SAMPLING_INTERVAL = 'interval'
+SAMPLING_TICK = 'tick'
+SAMPLING_MODES = (SAMPLING_INTERVAL, SAMPLING_TICK)
 
 
 class CPUCheck(base.BaseCheck):
@@ -27,15 +35,27 @@ class CPUCheck(base.BaseCheck):
         self._process_states = {}
         self._check_interval = self._config.get(
             'interval', DEF_CPU_CHECK_INTERVAL)
+        self._sampling = self._config.get('sampling', SAMPLING_INTERVAL)
+
+        # psutil.Process objects cached by pid for `tick` sampling mode.
+        self._processes = {}
+        self._processes_lock = threading.Lock()
+        self._processes_pruned_at = time.time()
+
+        # Rolling window samples, used when `stat` parameter is specified.
+        self._stats = stats.StatsStore()
 
     def __call__(self, process_spec):
 
         pid = process_spec['pid']
         process_name = process_spec['name']
 
-        cpu_pct = self._get_cpu_percent(pid, process_name)
-        self._log('CPU percent used by process %s is %s',
-                  process_name, cpu_pct)
+        process, cpu_pct = self._get_cpu_percent(pid, process_name)
+        self._debug('CPU percent used by process %s is %s',
+                    process_name, cpu_pct)
+
+        if self._config.get('stat'):
+            return self._check_window_stat(process, process_name, cpu_pct)
 
         proc_state = self._process_states.setdefault(
             process_name, {'first_seen_over_threshold': float('inf'),
@@ -79,13 +99,91 @@ class CPUCheck(base.BaseCheck):
 
         return True
 
+    def _check_window_stat(self, process, process_name, cpu_pct):
+        """Check CPU usage statistic over the rolling window against
+        the threshold.
+        """
+
+        stat = self._config['stat']
+        window = self._config['window']
+        process_key = (process.pid, process.create_time())
+
+        self._stats.add_sample(process_key, cpu_pct, window)
+        cpu_stat = self._stats.get_stat(process_key, stat, window)
+        if cpu_stat is None:
+            self._debug('Not enough CPU samples for process %s to calculate '
+                        '%s over %s seconds yet.', process_name, stat, window)
+
+            return True
+
+        self._debug('CPU percent %s used by process %s over %s seconds is %s',
+                    stat, process_name, window, cpu_stat)
+
+        if cpu_stat > self._config['max_cpu']:
+            self._log('CPU usage %s for process %s over %s seconds is above '
+                      'the configured threshold: %s vs %s.', stat,
+                      process_name, window, cpu_stat, self._config['max_cpu'])
+
+            return False
+
+        return True
+
     def _get_cpu_percent(self, pid, process_name):
         """Get CPU percent used by process.
+
+        :return: tuple (psutil.Process, CPU percent)
         """
 
-        self._log('Checking for CPU percent used by process %s.', process_name)
+        self._debug('Checking for CPU percent used by process %s.',
+                    process_name)
+
+        if self._sampling == SAMPLING_TICK:
+            return self._get_cpu_percent_since_last_sample(pid)
 
-        return psutil.Process(pid).cpu_percent(PSUTIL_CHECK_INTERVAL)
+        process = psutil.Process(pid)
+
+        return process, process.cpu_percent(PSUTIL_CHECK_INTERVAL)
+
+    def _get_cpu_percent_since_last_sample(self, pid):
+        """Get CPU percent used by process since the previous check without
+        blocking. Blocks for PSUTIL_CHECK_INTERVAL only on first sight of pid.
+        """
+
+        self._prune_processes()
+
+        with self._processes_lock:
+            process = self._processes.get(pid)
+
+        # is_running() also guards against pid reuse.
+        if process is not None and process.is_running():
+            return process, process.cpu_percent(None)
+
+        process = psutil.Process(pid)
+        cpu_pct = process.cpu_percent(PSUTIL_CHECK_INTERVAL)
+
+        with self._processes_lock:
+            self._processes[pid] = process
+
+        return process, cpu_pct
+
+    def _prune_processes(self):
+        """Evict cached processes that are not running anymore.
+        """
+
+        with self._processes_lock:
+            now = time.time()
+            if now - self._processes_pruned_at < PROCESS_CACHE_PRUNE_INTERVAL:
+                return
+
+            self._processes_pruned_at = now
+            for pid, process in list(self._processes.items()):
+                if not process.is_running():
+                    del self._processes[pid]
+
+    def _keeps_state(self):
+
+        # Time above threshold or rolling window samples.
+        return True
 
     def _validate_config(self):
 
@@ -98,3 +196,10 @@ class CPUCheck(base.BaseCheck):
             raise errors.InvalidCheckConfig(
                 '`max_cpu` parameter must be numeric type in %s check config.'
                 % (self.NAME,))
+
+        if self._config.get('sampling', SAMPLING_INTERVAL) not in SAMPLING_MODES:
+            raise errors.InvalidCheckConfig(
+                '`sampling` parameter must be one of %s in %s check config.'
+                % (', '.join(SAMPLING_MODES), self.NAME))
+
+        stats.validate_config(self._config, self.NAME)
@@ -1,6 +1,7 @@
 import time
 import os
 from supervisor_checks import errors
+from supervisor_checks import heartbeats
 from supervisor_checks import utils
 from supervisor_checks.check_modules import base
 
@@ -8,18 +9,42 @@ from supervisor_checks.check_modules import base
 class FileCheck(base.BaseCheck):
     NAME = "file"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # With `watch` enabled heartbeats are taken from inotify events, or
+        # from a single directory sweep per tick if inotify is unavailable.
+        self._heartbeats = None
+        if self._config.get("watch", False):
+            self._heartbeats = heartbeats.HeartbeatMonitor()
+
     def __call__(self, process_spec):
-        notification_filepath = self._config["filepath"]
-        if notification_filepath is None:
-            notification_filepath = utils.NotificationFile.get_filepath(self._config["root_dir"], process_spec["group"], process_spec["name"], process_spec["pid"])
+        notification_filepath = self._get_filepath(process_spec)
 
         try:
-            stat = os.stat(notification_filepath, follow_symlinks=False)
-            return time.time() - stat.st_ctime <= self._config["timeout"]
+            if self._heartbeats is not None:
+                heartbeat_age = self._heartbeats.get_heartbeat_age(notification_filepath)
+            else:
+                stat = os.stat(notification_filepath, follow_symlinks=False)
+                heartbeat_age = time.time() - stat.st_ctime
+            return heartbeat_age <= self._config["timeout"]
         except OSError:
-            self._log("ERROR: Could not stat file: %s" % (notification_filepath,))
+            self._warning("ERROR: Could not stat file: %s",
+                          notification_filepath)
             return not self._config["fail_on_error"]
 
+    def prepare(self, process_specs, timeout=None):
+        if self._heartbeats is not None:
+            self._heartbeats.sweep(
+                os.path.dirname(self._get_filepath(process_spec))
+                for process_spec in process_specs)
+
+    def _get_filepath(self, process_spec):
+        notification_filepath = self._config["filepath"]
+        if notification_filepath is None:
+            notification_filepath = utils.NotificationFile.get_filepath(self._config["root_dir"], process_spec["group"], process_spec["name"], process_spec["pid"])
+
+        return notification_filepath
 
     def _validate_config(self):
         if "timeout" not in self._config:
@@ -45,4 +70,9 @@ class FileCheck(base.BaseCheck):
         if "root_dir" not in self._config:
             raise errors.InvalidCheckConfig(
                 'Required `root_dir` parameter is missing in %s check config.' % (
-                    self.NAME,))
\ No newline at end of file
+                    self.NAME,))
+
+        if not isinstance(self._config.get("watch", False), bool):
+            raise errors.InvalidCheckConfig(
+                '`watch` parameter must be boolean type in %s check config.' % (
+                    self.NAME,))
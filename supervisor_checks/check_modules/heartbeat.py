@@ -0,0 +1,151 @@
+"""Process check based on heartbeats published to shared memory segment.
+"""
+
+import pwd
+import threading
+
+from supervisor_checks import errors
+from supervisor_checks import heartbeat_segment
+from supervisor_checks.check_modules import base
+
+__author__ = 'vovanec@gmail.com'
+
+
+class HeartbeatCheck(base.BaseCheck):
+    """Process check based on heartbeats published to shared memory segment
+    with heartbeat_segment.HeartbeatSlot.notify.
+
+    Heartbeats of all processes are read from the segment once per tick.
+    Check fails if the process hasn't published heartbeat for `timeout`
+    seconds, or if its progress counter hasn't changed for
+    `progress_timeout` seconds.
+    """
+
+    NAME = 'heartbeat'
+
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        self._reader = heartbeat_segment.HeartbeatReader(
+            self._config.get('segment_path'),
+            owner=self._get_segment_owner())
+        # pid -> (progress counter, monotonic time it was first seen at)
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, process_spec):
+
+        process_name = process_spec['name']
+        pid = process_spec['pid']
+
+        try:
+            heartbeats, read_at = self._reader.read()
+        except OSError as exc:
+            self._warning('ERROR: Could not read heartbeat segment %s: %s',
+                          self._reader.path, exc)
+            return not self._config.get('fail_on_error', False)
+
+        if pid not in heartbeats:
+            self._warning('ERROR: No heartbeat slot for process %s, pid %s.',
+                          process_name, pid)
+            return not self._config.get('fail_on_error', False)
+
+        timestamp, progress = heartbeats[pid]
+        heartbeat_age = read_at - timestamp
+        self._debug('Process %s published heartbeat %.2f seconds ago, '
+                    'progress %s.', process_name, heartbeat_age, progress)
+
+        if heartbeat_age > self._config['timeout']:
+            self._log('Process %s has not published heartbeat for %.1f '
+                      'seconds.', process_name, heartbeat_age)
+            return False
+
+        progress_timeout = self._config.get('progress_timeout')
+        if progress_timeout is not None:
+            stalled_for = self._get_stalled_time(pid, progress, read_at)
+            if stalled_for > progress_timeout:
+                self._log('Process %s has made no progress for %.1f seconds.',
+                          process_name, stalled_for)
+                return False
+
+        return True
+
+    def prepare(self, process_specs, timeout=None):
+
+        try:
+            # Checks of the tick share the snapshot.
+            heartbeats, _ = self._reader.refresh()
+        except OSError:
+            # Reported by checks.
+            return
+
+        with self._lock:
+            # Forget processes which have released their slots or whose
+            # slots were reused. Processes which are not due on this tick
+            # keep their progress state.
+            for pid in list(self._progress):
+                if pid not in heartbeats:
+                    del self._progress[pid]
+
+    def _get_stalled_time(self, pid, progress, now):
+        """Get time progress counter of the process has not changed for.
+        """
+
+        with self._lock:
+            last_progress, changed_at = self._progress.get(pid, (None, now))
+            if last_progress != progress:
+                changed_at = now
+                self._progress[pid] = (progress, changed_at)
+
+        return now - changed_at
+
+    def _get_segment_owner(self):
+        """Get uid the segment must be owned by, e.g. when workers run as
+        another user than the listener.
+
+        :rtype: int|None
+        """
+
+        owner = self._config.get('segment_owner')
+        if isinstance(owner, str):
+            try:
+                return pwd.getpwnam(owner).pw_uid
+            except KeyError:
+                raise errors.InvalidCheckConfig(
+                    'Unknown user `%s` in `segment_owner` parameter of %s '
+                    'check config.' % (owner, self.NAME))
+
+        return owner
+
+    def _keeps_state(self):
+
+        # Time progress counter hasn't changed for.
+        return self._config.get('progress_timeout') is not None
+
+    def _validate_config(self):
+
+        if 'timeout' not in self._config:
+            raise errors.InvalidCheckConfig(
+                'Required `timeout` parameter is missing in %s check config.'
+                % (self.NAME,))
+
+        for param in ('timeout', 'progress_timeout'):
+            value = self._config.get(param)
+            if value is not None and (not isinstance(value, (int, float)) or
+                                      value <= 0):
+                raise errors.InvalidCheckConfig(
+                    '`%s` parameter must be positive number in %s check '
+                    'config.' % (param, self.NAME))
+
+        owner = self._config.get('segment_owner')
+        if owner is not None and (isinstance(owner, bool) or
+                                  not isinstance(owner, (int, str))):
+            raise errors.InvalidCheckConfig(
+                '`segment_owner` parameter must be user name or uid in %s '
+                'check config.' % (self.NAME,))
+
+        if not isinstance(self._config.get('fail_on_error', False), bool):
+            raise errors.InvalidCheckConfig(
+                '`fail_on_error` parameter must be boolean type in %s check '
+                'config.' % (self.NAME,))
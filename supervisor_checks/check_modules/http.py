@@ -3,8 +3,13 @@
 
 import base64
 import json
+import re
+import threading
+import time
 
+from supervisor_checks import aio
 from supervisor_checks import errors
+from supervisor_checks import http_pool
 from supervisor_checks import utils
 from supervisor_checks.check_modules import base
 from supervisor_checks.compat import httplib
@@ -14,64 +19,275 @@ __author__ = 'vovanec@gmail.com'
 
 DEFAULT_RETRIES = 2
 DEFAULT_TIMEOUT = 15
+DEFAULT_METHOD = 'GET'
+DEFAULT_STATUS_CODES = (httplib.OK,)
+# Response body is read up to that many bytes, the rest is ignored.
+DEFAULT_MAX_BODY_SIZE = 65536
+DEFAULT_MAX_LATENCY_VIOLATIONS = 1
 
 LOCALHOST = '127.0.0.1'
 
 
 class HTTPCheck(base.BaseCheck):
     """Process check based on HTTP query.
+
+    Check fails if response status is not one of `status_codes`, or if
+    response body doesn't match `expect_body` substring, `expect_body_re`
+    regular expression or `expect_json` values. If `max_latency_ms` is
+    configured, check also fails when response time exceeds it on
+    `max_latency_violations` consecutive checks of the process.
     """
 
     HEADERS = {'User-Agent': 'http_check'}
     NAME = 'http'
 
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        self._retry_policy = utils.RetryPolicy.from_config(
+            self._config, DEFAULT_RETRIES)
+        self._pool = None
+        if self._config.get('keep_alive', False):
+            self._pool = http_pool.HTTPConnectionPool(
+                pool_size=self._config.get(
+                    'pool_size', http_pool.DEFAULT_POOL_SIZE),
+                idle_timeout=self._config.get(
+                    'idle_timeout', http_pool.DEFAULT_IDLE_TIMEOUT))
+
+        self._status_codes = frozenset(
+            self._config.get('status_codes') or DEFAULT_STATUS_CODES)
+        self._expect_body_re = None
+        if self._config.get('expect_body_re'):
+            self._expect_body_re = re.compile(
+                self._config['expect_body_re'].encode('utf-8'))
+        self._max_body_size = self._config.get(
+            'max_body_size', DEFAULT_MAX_BODY_SIZE)
+        # process name -> number of consecutive latency threshold violations
+        self._latency_violations = {}
+        self._lock = threading.Lock()
+
     def __call__(self, process_spec):
 
         try:
             port = utils.get_port(self._config['port'], process_spec['name'])
             return self._http_check(process_spec['name'], port)
         except errors.InvalidPortSpec:
-            self._log('ERROR: Could not extract the HTTP port for process '
-                      'name %s using port specification %s.',
-                      process_spec['name'], self._config['port'])
+            self._warning('ERROR: Could not extract the HTTP port for process '
+                          'name %s using port specification %s.',
+                          process_spec['name'], self._config['port'])
 
             return True
         except Exception as exc:
-            self._log('Check failed: %s', exc)
+            self._warning('Check failed: %s', exc)
+
+        return False
+
+    async def check_async(self, process_spec):
+
+        try:
+            port = utils.get_port(self._config['port'], process_spec['name'])
+            return await self._http_check_async(process_spec['name'], port)
+        except errors.InvalidPortSpec:
+            self._warning('ERROR: Could not extract the HTTP port for process '
+                          'name %s using port specification %s.',
+                          process_spec['name'], self._config['port'])
+
+            return True
+        except Exception as exc:
+            self._warning('Check failed: %s', exc)
 
         return False
 
     def _http_check(self, process_name, port):
 
-        self._log('Querying URL http://%s:%s%s for process %s',
-                  LOCALHOST, port, self._config['url'],
-                  process_name)
+        self._debug('Querying URL http://%s:%s%s for process %s',
+                    LOCALHOST, port, self._config['url'],
+                    process_name)
 
         host_port = '%s:%s' % (LOCALHOST, port,)
-        num_retries = self._config.get('num_retries', DEFAULT_RETRIES)
         timeout = self._config.get('timeout', DEFAULT_TIMEOUT)
         username = self._config.get('username')
         password = self._config.get('password')
 
-        with utils.retry_errors(num_retries, self._log).retry_context(
-                self._make_http_request) as retry_http_request:
-            res = retry_http_request(
-                host_port, timeout, username=username, password=password)
+        with utils.retry_errors(
+                self._retry_policy, self._log, self._on_retry).retry_context(
+                    self._make_http_request) as retry_http_request:
+            res, latency_ms = retry_http_request(
+                host_port, timeout=timeout, username=username,
+                password=password)
 
-        self._log('Status contacting URL http://%s%s for process %s: '
-                  '%s %s' % (host_port, self._config['url'], process_name,
-                             res.status, res.reason))
+        self._debug('Status contacting URL http://%s%s for process %s: '
+                    '%s %s in %.1f ms', host_port, self._config['url'],
+                    process_name, res.status, res.reason, latency_ms)
 
-        if res.status != httplib.OK:
-            raise httplib.HTTPException(
-                'Bad HTTP status code: %s' % (res.status,))
+        return self._check_response(process_name, res, latency_ms)
+
+    async def _http_check_async(self, process_name, port):
+
+        self._debug('Querying URL http://%s:%s%s for process %s',
+                    LOCALHOST, port, self._config['url'],
+                    process_name)
+
+        timeout = self._config.get('timeout', DEFAULT_TIMEOUT)
 
-        return True
+        retry_http_request = utils.retry_errors(
+            self._retry_policy, self._log, self._on_retry).wrap_async(
+                self._make_http_request_async)
+        res, latency_ms = await retry_http_request(port, timeout=timeout)
+
+        self._debug('Status contacting URL http://%s:%s%s for process %s: '
+                    '%s %s in %.1f ms', LOCALHOST, port, self._config['url'],
+                    process_name, res.status, res.reason, latency_ms)
+
+        return self._check_response(process_name, res, latency_ms)
 
     def _make_http_request(self, host_port, timeout,
                            username=None, password=None):
+        """Make HTTP request.
+
+        :return: tuple (response, response time in milliseconds)
+        :rtype: (aio.HTTPResponse, float)
+        """
+
+        method, body, headers = self._get_request_params(username, password)
+
+        started_at = time.monotonic()
+        if self._pool is not None:
+            res, res_body = self._pool.request(
+                host_port, method, self._config['url'], body, headers,
+                timeout=timeout, max_body_size=self._max_body_size)
+        else:
+            connection = httplib.HTTPConnection(host_port, timeout=timeout)
+            try:
+                connection.request(
+                    method, self._config['url'], body, headers=headers)
+                res = connection.getresponse()
+                res_body, _ = http_pool.read_body(res, self._max_body_size)
+            finally:
+                connection.close()
+
+        latency_ms = (time.monotonic() - started_at) * 1000
+
+        return aio.HTTPResponse(
+            res.status, res.reason,
+            dict((name.lower(), value) for name, value in res.getheaders()),
+            res_body), latency_ms
+
+    async def _make_http_request_async(self, port, timeout):
+        """Make HTTP request. Coroutine version of _make_http_request.
+
+        :return: tuple (response, response time in milliseconds)
+        :rtype: (aio.HTTPResponse, float)
+        """
+
+        method, body, headers = self._get_request_params(
+            self._config.get('username'), self._config.get('password'))
+
+        started_at = time.monotonic()
+        res = await aio.http_request(
+            method, self._config['url'], body, headers, host=LOCALHOST,
+            port=port, timeout=timeout, max_body_size=self._max_body_size)
+
+        return res, (time.monotonic() - started_at) * 1000
+
+    def _check_response(self, process_name, res, latency_ms):
+        """Check response status, body and latency.
+
+        :param str process_name: process name.
+        :param aio.HTTPResponse res: HTTP response.
+        :param float latency_ms: response time, milliseconds.
+
+        :return: False if latency threshold has been exceeded too many times
+                 in a row. HTTPException is raised if response is bad.
+        :rtype: bool
+        """
+
+        if res.status not in self._status_codes:
+            raise httplib.HTTPException(
+                'Bad HTTP status code: %s' % (res.status,))
+
+        self._check_body(res.body)
+
+        return self._check_latency(process_name, latency_ms)
+
+    def _check_body(self, body):
+        """Raise HTTPException if response body doesn't match expectations.
+
+        :param bytes body: response body, truncated to max_body_size.
+        """
+
+        expect_body = self._config.get('expect_body')
+        if expect_body and expect_body.encode('utf-8') not in body:
+            raise httplib.HTTPException(
+                'Response body does not contain %r' % (expect_body,))
+
+        if (self._expect_body_re is not None and
+                not self._expect_body_re.search(body)):
+            raise httplib.HTTPException(
+                'Response body does not match %r' % (
+                    self._config['expect_body_re'],))
+
+        expect_json = self._config.get('expect_json')
+        if not expect_json:
+            return
+
+        try:
+            doc = json.loads(body.decode('utf-8'))
+        except ValueError as exc:
+            raise httplib.HTTPException(
+                'Response body is not valid JSON: %s' % (exc,))
+
+        for path, expected_value in expect_json.items():
+            try:
+                value = get_json_path(doc, path)
+            except LookupError:
+                raise httplib.HTTPException(
+                    'JSON path %s is missing in response body' % (path,))
+
+            if value != expected_value:
+                raise httplib.HTTPException(
+                    'Unexpected value of JSON path %s in response body: %r '
+                    'vs %r' % (path, value, expected_value))
+
+    def _check_latency(self, process_name, latency_ms):
+        """Count consecutive violations of latency threshold.
+
+        :return: False if latency threshold has been exceeded on
+                 max_latency_violations consecutive checks.
+        :rtype: bool
+        """
+
+        max_latency_ms = self._config.get('max_latency_ms')
+        if max_latency_ms is None:
+            return True
+
+        with self._lock:
+            if latency_ms <= max_latency_ms:
+                self._latency_violations.pop(process_name, None)
+                return True
+
+            violations = self._latency_violations.get(process_name, 0) + 1
+            max_violations = self._config.get(
+                'max_latency_violations', DEFAULT_MAX_LATENCY_VIOLATIONS)
+            if violations >= max_violations:
+                # Process is about to be restarted, start counting over.
+                self._latency_violations.pop(process_name, None)
+            else:
+                self._latency_violations[process_name] = violations
+
+        self._warning('Response time of process %s is above the configured '
+                      'threshold: %.1f ms vs %s ms, %s time(s) in a row.',
+                      process_name, latency_ms, max_latency_ms, violations)
+
+        return violations < max_violations
+
+    def _get_request_params(self, username=None, password=None):
+        """Get HTTP request method, body and headers.
+
+        :rtype: (str, str|None, dict)
+        """
 
-        connection = httplib.HTTPConnection(host_port, timeout=timeout)
         headers = self.HEADERS.copy()
 
         if username and password:
@@ -91,11 +307,12 @@ class HTTPCheck(base.BaseCheck):
         if json_body:
             body = json.dumps(json_body)
 
-        connection.request(
-            self._config.get('method'), self._config['url'], body,
-            headers=headers)
+        return self._config.get('method') or DEFAULT_METHOD, body, headers
 
-        return connection.getresponse()
+    def _keeps_state(self):
+
+        # Consecutive latency threshold violations.
+        return self._config.get('max_latency_ms') is not None
 
     def _validate_config(self):
 
@@ -113,3 +330,74 @@ class HTTPCheck(base.BaseCheck):
             raise errors.InvalidCheckConfig(
                 'Required `port` parameter is missing in %s check config.' % (
                     self.NAME,))
+
+        status_codes = self._config.get('status_codes')
+        if status_codes is not None and (
+                not isinstance(status_codes, (list, tuple)) or
+                not all(isinstance(code, int) for code in status_codes)):
+            raise errors.InvalidCheckConfig(
+                '`status_codes` parameter must be the list of integers in %s '
+                'check config.' % (self.NAME,))
+
+        for param in ('expect_body', 'expect_body_re'):
+            if param in self._config and \
+                    not isinstance(self._config[param], str):
+                raise errors.InvalidCheckConfig(
+                    '`%s` parameter must be string type in %s check config.'
+                    % (param, self.NAME))
+
+        try:
+            re.compile(self._config.get('expect_body_re') or '')
+        except re.error as exc:
+            raise errors.InvalidCheckConfig(
+                '`expect_body_re` parameter is not valid regular expression '
+                'in %s check config: %s' % (self.NAME, exc))
+
+        if 'expect_json' in self._config and \
+                not isinstance(self._config['expect_json'], dict):
+            raise errors.InvalidCheckConfig(
+                '`expect_json` parameter must be dictionary type in %s check '
+                'config.' % (self.NAME,))
+
+        for param in ('max_body_size', 'max_latency_violations'):
+            value = self._config.get(param)
+            if value is not None and (not isinstance(value, int) or
+                                      value <= 0):
+                raise errors.InvalidCheckConfig(
+                    '`%s` parameter must be positive integer in %s check '
+                    'config.' % (param, self.NAME))
+
+        max_latency_ms = self._config.get('max_latency_ms')
+        if max_latency_ms is not None and (
+                not isinstance(max_latency_ms, (int, float)) or
+                max_latency_ms <= 0):
+            raise errors.InvalidCheckConfig(
+                '`max_latency_ms` parameter must be positive number in %s '
+                'check config.' % (self.NAME,))
+
+        utils.validate_retry_config(self._config, self.NAME)
+
+
+def get_json_path(doc, path):
+    """Get value from JSON document by path: dot separated object keys and
+    array indexes, e.g. `checks.0.status`.
+
+    :param doc: JSON document.
+    :param str path: value path.
+
+    :raise LookupError: if path doesn't exist in document.
+    """
+
+    value = doc
+    for key in path.split('.'):
+        if isinstance(value, list):
+            try:
+                value = value[int(key)]
+            except ValueError:
+                raise LookupError(path)
+        elif isinstance(value, dict):
+            value = value[key]
+        else:
+            raise LookupError(path)
+
+    return value
@@ -1,32 +1,72 @@
 """Process check based on RSS memory usage.
 """
 
+import threading
+import time
+
 import psutil
 
 from supervisor_checks import errors
+from supervisor_checks import proc_snapshot
+from supervisor_checks import stats
 from supervisor_checks.check_modules import base
 
 __author__ = 'vovanec@gmail.com'
 
 
+# Memory usage metrics
+METRIC_RSS = 'rss'
+METRIC_PSS = 'pss'
+METRIC_USS = 'uss'
+METRIC_SWAP = 'swap'
+METRICS = (METRIC_RSS, METRIC_PSS, METRIC_USS, METRIC_SWAP)
+
+# Reading PSS, USS and swap requires parsing /proc/<pid>/smaps, which is
+# expensive for big processes, so it's read not more often than once in that
+# many seconds per process.
+DEFAULT_FULL_INFO_INTERVAL = 60
+
+
 class MemoryCheck(base.BaseCheck):
     """Process check based on memory usage.
     """
 
     NAME = 'memory'
 
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        # Rolling window samples, used when `stat` parameter is specified.
+        self._stats = stats.StatsStore()
+        # Cumulative RSS is read from process tree snapshot shared by all
+        # checks within the tick.
+        self._use_snapshot = (self._config.get('tree_snapshot', True) and
+                              proc_snapshot.is_supported())
+
+        self._metric = self._config.get('metric') or METRIC_RSS
+        self._full_info_interval = self._config.get(
+            'full_info_interval', DEFAULT_FULL_INFO_INTERVAL)
+        # (pid, create time) -> (read at, psutil memory full info)
+        self._full_info_cache = {}
+        self._full_info_lock = threading.Lock()
+        self._full_info_pruned_at = time.monotonic()
+
+    def prepare(self, process_specs, timeout=None):
+
+        if self._use_snapshot:
+            # Processes are checked against the snapshot of this tick.
+            proc_snapshot.snapshot_cache.expire()
+
     def __call__(self, process_spec):
 
-        pid = process_spec['pid']
+        process = psutil.Process(process_spec['pid'])
         process_name = process_spec['name']
 
-        if self._config.get('cumulative', False):
-            rss = self._get_cumulative_rss(pid, process_name)
-        else:
-            rss = self._get_rss(pid, process_name)
+        rss = self._get_usage(process, process_name)
 
-        self._log('Total memory consumed by process %s is %s KB',
-                  process_name, rss)
+        if self._config.get('stat'):
+            return self._check_window_stat(process, process_name, rss)
 
         if rss > self._config['max_rss']:
             self._log('Memory usage for process %s is above the configured '
@@ -37,28 +77,155 @@ class MemoryCheck(base.BaseCheck):
 
         return True
 
-    def _get_rss(self, pid, process_name):
+    def _get_usage(self, process, process_name):
+        """Get memory used by process according to the configured metric,
+        KB.
+        """
+
+        if self._metric != METRIC_RSS:
+            usage = self._get_full_info_usage(process, process_name)
+        elif self._config.get('cumulative', False):
+            usage = self._get_cumulative_rss(process, process_name)
+        else:
+            usage = self._get_rss(process, process_name)
+
+        self._debug('Total memory (%s) consumed by process %s is %s KB',
+                    self._metric, process_name, usage)
+
+        return usage
+
+    def _check_window_stat(self, process, process_name, rss):
+        """Check memory usage statistic over the rolling window against
+        the threshold.
+        """
+
+        stat = self._config['stat']
+        window = self._config['window']
+        process_key = (process.pid, process.create_time())
+
+        self._stats.add_sample(process_key, rss, window)
+        rss_stat = self._stats.get_stat(process_key, stat, window)
+        if rss_stat is None:
+            self._debug('Not enough memory samples for process %s to '
+                        'calculate %s over %s seconds yet.', process_name,
+                        stat, window)
+
+            return True
+
+        self._debug('Memory %s consumed by process %s over %s seconds is '
+                    '%s KB', stat, process_name, window, rss_stat)
+
+        if rss_stat > self._config['max_rss']:
+            self._log('Memory usage %s for process %s over %s seconds is above '
+                      'the configured threshold: %s KB vs %s KB.', stat,
+                      process_name, window, rss_stat, self._config['max_rss'])
+
+            return False
+
+        return True
+
+    def _get_rss(self, process, process_name):
         """Get RSS used by process.
         """
 
-        self._log('Checking for RSS memory used by process %s', process_name)
+        self._debug('Checking for RSS memory used by process %s', process_name)
 
-        return int(psutil.Process(pid).memory_info().rss / 1024)
+        return int(process.memory_info().rss / 1024)
 
-    def _get_cumulative_rss(self, pid, process_name):
+    def _get_cumulative_rss(self, parent, process_name):
         """Get cumulative RSS used by process and all its children.
         """
 
-        self._log('Checking for cumulative RSS memory used by process %s',
-                  process_name)
+        self._debug('Checking for cumulative RSS memory used by process %s',
+                    process_name)
+
+        if self._use_snapshot:
+            rss_total = proc_snapshot.snapshot_cache.get().get_cumulative_rss(
+                parent.pid)
+            if rss_total is not None:
+                return int(rss_total / 1024)
+
+            # Process has started after snapshot was taken.
 
-        parent = psutil.Process(pid)
         rss_total = parent.memory_info().rss
         for child_process in parent.children(recursive=True):
             rss_total += child_process.memory_info().rss
 
         return int(rss_total / 1024)
 
+    def _get_full_info_usage(self, process, process_name):
+        """Get PSS, USS or swap used by process, or by process and all its
+        children if `cumulative` parameter is set.
+        """
+
+        self._debug('Checking for %s memory used by process %s',
+                    self._metric, process_name)
+
+        processes = [process]
+        if self._config.get('cumulative', False):
+            if self._use_snapshot:
+                processes.extend(
+                    _get_process(pid) for pid in
+                    proc_snapshot.snapshot_cache.get().get_descendants(
+                        process.pid))
+            else:
+                processes.extend(process.children(recursive=True))
+
+        usage_total = 0
+        for proc in processes:
+            if proc is None:
+                continue
+
+            try:
+                usage_total += getattr(self._get_memory_full_info(proc),
+                                       self._metric)
+            except psutil.NoSuchProcess:
+                if proc is process:
+                    raise
+
+        self._prune_full_info_cache()
+
+        return int(usage_total / 1024)
+
+    def _get_memory_full_info(self, process):
+        """Get memory full info of the process, cached for
+        `full_info_interval` seconds.
+        """
+
+        key = (process.pid, process.create_time())
+        now = time.monotonic()
+
+        with self._full_info_lock:
+            cached = self._full_info_cache.get(key)
+        if cached is not None and now - cached[0] < self._full_info_interval:
+            return cached[1]
+
+        full_info = process.memory_full_info()
+        with self._full_info_lock:
+            self._full_info_cache[key] = (now, full_info)
+
+        return full_info
+
+    def _prune_full_info_cache(self):
+        """Drop cached memory info of processes not seen for a while.
+        """
+
+        now = time.monotonic()
+        max_age = 2 * self._full_info_interval
+        with self._full_info_lock:
+            if now - self._full_info_pruned_at < max_age:
+                return
+
+            self._full_info_pruned_at = now
+            for key, (read_at, _) in list(self._full_info_cache.items()):
+                if now - read_at > max_age:
+                    del self._full_info_cache[key]
+
+    def _keeps_state(self):
+
+        # Rolling window samples.
+        return bool(self._config.get('stat'))
+
     def _validate_config(self):
 
         if 'max_rss' not in self._config:
@@ -70,3 +237,41 @@ class MemoryCheck(base.BaseCheck):
             raise errors.InvalidCheckConfig(
                 '`max_rss` parameter must be numeric type in %s check config.'
                 % (self.NAME,))
+
+        self._validate_usage_config()
+
+        stats.validate_config(self._config, self.NAME)
+
+    def _validate_usage_config(self):
+        """Validate parameters of memory usage measurement.
+        """
+
+        if self._config.get('metric') not in (None,) + METRICS:
+            raise errors.InvalidCheckConfig(
+                '`metric` parameter must be one of: %s in %s check config.'
+                % (', '.join(METRICS), self.NAME))
+
+        full_info_interval = self._config.get('full_info_interval')
+        if full_info_interval is not None and (
+                not isinstance(full_info_interval, (int, float)) or
+                full_info_interval < 0):
+            raise errors.InvalidCheckConfig(
+                '`full_info_interval` parameter must be non-negative number '
+                'in %s check config.' % (self.NAME,))
+
+        if not isinstance(self._config.get('tree_snapshot', True), bool):
+            raise errors.InvalidCheckConfig(
+                '`tree_snapshot` parameter must be boolean type in %s check '
+                'config.' % (self.NAME,))
+
+
+def _get_process(pid):
+    """Get psutil.Process by pid.
+
+    :return: process or None if process has exited.
+    """
+
+    try:
+        return psutil.Process(pid)
+    except psutil.NoSuchProcess:
+        return None
@@ -0,0 +1,110 @@
+"""Process check based on memory usage growth rate.
+"""
+
+import time
+
+import psutil
+
+from supervisor_checks import errors
+from supervisor_checks import stats
+from supervisor_checks.check_modules import memory
+
+__author__ = 'vovanec@gmail.com'
+
+
+# Minimum number of samples within the window to fit the growth rate.
+MIN_SAMPLES = 3
+
+
+class MemoryGrowthCheck(memory.MemoryCheck):
+    """Process check based on memory usage growth rate.
+
+    Memory usage of every process is sampled on every check and the line is
+    fitted to samples within the window using least squares. Check fails if
+    the growth rate is above `max_growth_rate` KB per minute, or if memory
+    usage is projected to reach `max_rss` within `horizon` seconds.
+    """
+
+    NAME = 'memory_growth'
+
+    def __call__(self, process_spec):
+
+        process = psutil.Process(process_spec['pid'])
+        process_name = process_spec['name']
+        window = self._config['window']
+
+        usage = self._get_usage(process, process_name)
+
+        now = time.time()
+        process_key = (process.pid, process.create_time())
+        self._stats.add_sample(process_key, usage, window, now)
+        samples = self._stats.get_samples(process_key, window, now)
+        if samples is None or len(samples) < MIN_SAMPLES:
+            self._debug('Not enough memory samples for process %s to '
+                        'calculate growth rate over %s seconds yet.',
+                        process_name, window)
+
+            return True
+
+        slope, fitted_usage = stats.linear_regression(samples)
+        growth_rate = slope * 60
+
+        self._debug('Memory usage of process %s grows at %.2f KB/min over '
+                    '%s seconds.', process_name, growth_rate, window)
+
+        max_growth_rate = self._config.get('max_growth_rate')
+        if max_growth_rate is not None and growth_rate > max_growth_rate:
+            self._log('Memory usage growth rate for process %s is above the '
+                      'configured threshold: %.2f KB/min vs %s KB/min.',
+                      process_name, growth_rate, max_growth_rate)
+
+            return False
+
+        horizon = self._config.get('horizon')
+        if horizon is not None and slope > 0:
+            time_to_limit = (self._config['max_rss'] - fitted_usage) / slope
+            if time_to_limit < horizon:
+                self._log('Memory usage of process %s is projected to reach '
+                          'the configured threshold %s KB in %d seconds, '
+                          'growing at %.2f KB/min.', process_name,
+                          self._config['max_rss'], max(time_to_limit, 0),
+                          growth_rate)
+
+                return False
+
+        return True
+
+    def _keeps_state(self):
+
+        # Samples growth rate is fitted over.
+        return True
+
+    def _validate_config(self):
+
+        window = self._config.get('window')
+        if not isinstance(window, (int, float)) or window <= 0:
+            raise errors.InvalidCheckConfig(
+                'Required `window` parameter must be positive number in %s '
+                'check config.' % (self.NAME,))
+
+        stats.validate_window(window, self.NAME)
+
+        if 'max_growth_rate' not in self._config and \
+                'horizon' not in self._config:
+            raise errors.InvalidCheckConfig(
+                'One of `max_growth_rate` or `horizon` parameters is required '
+                'in %s check config.' % (self.NAME,))
+
+        for param in ('max_growth_rate', 'horizon', 'max_rss'):
+            if param in self._config and \
+                    not isinstance(self._config[param], (int, float)):
+                raise errors.InvalidCheckConfig(
+                    '`%s` parameter must be numeric type in %s check config.'
+                    % (param, self.NAME))
+
+        if 'horizon' in self._config and 'max_rss' not in self._config:
+            raise errors.InvalidCheckConfig(
+                'When `horizon` parameter is specified, `max_rss` parameter '
+                'is required in %s check config.' % (self.NAME,))
+
+        self._validate_usage_config()
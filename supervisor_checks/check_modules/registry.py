@@ -0,0 +1,122 @@
+"""Registry of check classes by check name.
+
+Check modules are only imported when the check is used, so that listeners
+don't pay for modules and dependencies, such as psutil, they don't need.
+Third-party packages may provide checks by `supervisor_checks.check_modules`
+entry point, named after the check:
+
+    entry_points={
+        'supervisor_checks.check_modules': [
+            'example=example_package.checks:ExampleCheck']}
+"""
+
+import importlib
+import threading
+
+from supervisor_checks import errors
+from supervisor_checks.check_modules import base
+
+__author__ = 'vovanec@gmail.com'
+
+
+ENTRY_POINT_GROUP = 'supervisor_checks.check_modules'
+
+# check name -> 'module:class'
+BUILTIN_CHECKS = {
+    'cpu': 'supervisor_checks.check_modules.cpu:CPUCheck',
+    'file': 'supervisor_checks.check_modules.file:FileCheck',
+    'heartbeat': 'supervisor_checks.check_modules.heartbeat:HeartbeatCheck',
+    'http': 'supervisor_checks.check_modules.http:HTTPCheck',
+    'memory': 'supervisor_checks.check_modules.memory:MemoryCheck',
+    'memory_growth':
+        'supervisor_checks.check_modules.memory_growth:MemoryGrowthCheck',
+    'tcp': 'supervisor_checks.check_modules.tcp:TCPCheck',
+    'xmlrpc': 'supervisor_checks.check_modules.xmlrpc:XMLRPCCheck',
+}
+
+_check_classes = {}
+_lock = threading.Lock()
+
+
+def get_check_class(check_name):
+    """Get check class by check name, importing its module if needed.
+
+    :param str check_name: check name, e.g. `http`.
+
+    :rtype: type
+    :raise InvalidCheckConfig: if there's no such check.
+    """
+
+    with _lock:
+        check_class = _check_classes.get(check_name)
+        if check_class is None:
+            check_class = _load_check_class(check_name)
+            _check_classes[check_name] = check_class
+
+    return check_class
+
+
+def get_check_names():
+    """Get names of all available checks, built in and provided by entry
+    points.
+
+    :rtype: list
+    """
+
+    check_names = set(BUILTIN_CHECKS)
+    check_names.update(entry_point.name for entry_point in _get_entry_points())
+
+    return sorted(check_names)
+
+
+def _load_check_class(check_name):
+
+    check_path = BUILTIN_CHECKS.get(check_name)
+    if check_path is not None:
+        module_name, class_name = check_path.split(':')
+        check_class = getattr(importlib.import_module(module_name),
+                              class_name)
+    else:
+        for entry_point in _get_entry_points():
+            if entry_point.name == check_name:
+                check_class = entry_point.load()
+                break
+        else:
+            raise errors.InvalidCheckConfig(
+                'Unknown check `%s`, available checks: %s.' % (
+                    check_name, ', '.join(get_check_names())))
+
+    _validate_check_class(check_name, check_class)
+
+    return check_class
+
+
+def _validate_check_class(check_name, check_class):
+
+    if not (isinstance(check_class, type) and
+            issubclass(check_class, base.BaseCheck)):
+        raise errors.InvalidCheckConfig(
+            '%r registered as `%s` check is not BaseCheck subclass.' % (
+                check_class, check_name))
+
+    if not check_class.NAME:
+        raise errors.InvalidCheckConfig(
+            '%r registered as `%s` check has no NAME.' % (
+                check_class, check_name))
+
+
+def _get_entry_points():
+    """Get check entry points of installed packages. Scanning packages
+    metadata is slow, so built in checks are resolved without it.
+    """
+
+    try:
+        from importlib import metadata
+    except ImportError:
+        return []
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return entry_points.select(group=ENTRY_POINT_GROUP)
+
+    return entry_points.get(ENTRY_POINT_GROUP, [])
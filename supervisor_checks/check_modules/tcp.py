@@ -1,9 +1,13 @@
 """Process check based on TCP connection status.
 """
 
+import asyncio
 import socket
+import threading
 
+from supervisor_checks import aio
 from supervisor_checks import errors
+from supervisor_checks import tcp_probe
 from supervisor_checks import utils
 from supervisor_checks.check_modules import base
 
@@ -18,48 +22,209 @@ LOCALHOST = '127.0.0.1'
 
 class TCPCheck(base.BaseCheck):
     """Process check based on TCP connection status.
+
+    Ports of all processes are probed at once on every tick, using
+    non-blocking connects multiplexed on single selector in background
+    thread, so that other checks of the tick are not held. Result of batched
+    probe is used as the first try of the check. If `send` is configured, it
+    is sent once connected, and check succeeds only if response contains
+    `expect` string.
     """
 
     NAME = 'tcp'
 
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        self._retry_policy = utils.RetryPolicy.from_config(
+            self._config, DEFAULT_RETRIES)
+        self._send = _to_bytes(self._config.get('send'))
+        self._expect = _to_bytes(self._config.get('expect'))
+        # (pid, port) -> probe run by prepare()
+        self._prepared_probes = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, process_specs, timeout=None):
+
+        check_timeout = self._config.get('timeout', DEFAULT_TIMEOUT)
+        if timeout is not None:
+            check_timeout = min(check_timeout, timeout)
+
+        probes = {}
+        for process_spec in process_specs:
+            try:
+                port = utils.get_port(self._config['port'],
+                                      process_spec['name'])
+            except errors.InvalidPortSpec:
+                # Logged when check is run.
+                continue
+
+            probes[(process_spec['pid'], port)] = tcp_probe.Probe(
+                LOCALHOST, port, check_timeout, send=self._send,
+                expect=self._expect)
+
+        with self._lock:
+            self._prepared_probes = probes
+
+        if probes:
+            self._debug('Probing %s TCP ports at once.', len(probes))
+            tcp_probe.start_probes(list(probes.values()))
+
     def __call__(self, process_spec):
 
         timeout = self._config.get('timeout', DEFAULT_TIMEOUT)
-        num_retries = self._config.get('num_retries', DEFAULT_RETRIES)
 
         try:
             port = utils.get_port(self._config['port'], process_spec['name'])
-            with utils.retry_errors(num_retries, self._log).retry_context(
-                    self._tcp_check) as retry_tcp_check:
-                return retry_tcp_check(process_spec['name'], port, timeout)
+            with utils.retry_errors(
+                    self._retry_policy, self._log,
+                    self._on_retry).retry_context(
+                        self._tcp_check) as retry_tcp_check:
+                return retry_tcp_check(process_spec['name'], port,
+                                       process_spec.get('pid'),
+                                       timeout=timeout)
+        except errors.InvalidPortSpec:
+            self._warning('ERROR: Could not extract the HTTP port for process '
+                          'name %s using port specification %s.',
+                          process_spec['name'], self._config['port'])
+
+            return True
+        except Exception as exc:
+            self._warning('Check failed: %s', exc)
+
+        return False
+
+    async def check_async(self, process_spec):
+
+        timeout = self._config.get('timeout', DEFAULT_TIMEOUT)
+
+        try:
+            port = utils.get_port(self._config['port'], process_spec['name'])
+            retry_tcp_check = utils.retry_errors(
+                self._retry_policy, self._log, self._on_retry).wrap_async(
+                    self._tcp_check_async)
+
+            return await retry_tcp_check(process_spec['name'], port,
+                                         process_spec.get('pid'),
+                                         timeout=timeout)
         except errors.InvalidPortSpec:
-            self._log('ERROR: Could not extract the HTTP port for process '
-                      'name %s using port specification %s.',
-                      process_spec['name'], self._config['port'])
+            self._warning('ERROR: Could not extract the HTTP port for process '
+                          'name %s using port specification %s.',
+                          process_spec['name'], self._config['port'])
 
             return True
         except Exception as exc:
-            self._log('Check failed: %s', exc)
+            self._warning('Check failed: %s', exc)
 
         return False
 
-    def _tcp_check(self, process_name, port, timeout):
+    def _tcp_check(self, process_name, port, pid, timeout):
+
+        probe = self._pop_prepared_probe(pid, port)
+        if probe is None:
+            self._debug('Trying to connect to TCP port %s for process %s',
+                        port, process_name)
+            probe = tcp_probe.Probe(LOCALHOST, port, timeout,
+                                    send=self._send, expect=self._expect)
+            tcp_probe.run_probes([probe])
+        elif not probe.wait(timeout):
+            raise socket.timeout(
+                'Batched probe of port %s did not complete within %s '
+                'seconds' % (port, timeout))
 
-        self._log('Trying to connect to TCP port %s for process %s',
-                  port, process_name)
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((LOCALHOST, port))
-        sock.close()
+        probe.get_result()
 
-        self._log('Successfully connected to TCP port %s for process %s',
-                  port, process_name)
+        self._debug('Successfully connected to TCP port %s for process %s',
+                    port, process_name)
 
         return True
 
+    async def _tcp_check_async(self, process_name, port, pid, timeout):
+
+        probe = self._pop_prepared_probe(pid, port)
+        if probe is not None:
+            await asyncio.wait_for(_wait_probe(probe), timeout)
+            probe.get_result()
+        else:
+            self._debug('Trying to connect to TCP port %s for process %s',
+                        port, process_name)
+            await asyncio.wait_for(self._probe_async(port), timeout)
+
+        self._debug('Successfully connected to TCP port %s for process %s',
+                    port, process_name)
+
+        return True
+
+    async def _probe_async(self, port):
+
+        reader, writer = await aio.open_connection(LOCALHOST, port)
+        try:
+            if self._send:
+                writer.write(self._send)
+                await writer.drain()
+
+            if self._expect is None:
+                return
+
+            response = b''
+            while self._expect not in response:
+                data = await reader.read(tcp_probe.MAX_RESPONSE_SIZE)
+                response += data
+                if not data or len(response) >= tcp_probe.MAX_RESPONSE_SIZE:
+                    if self._expect in response:
+                        break
+                    raise tcp_probe.UnexpectedResponse(
+                        'Response from port %s does not contain %r: %r' % (
+                            port, self._expect,
+                            response[:tcp_probe.MAX_RESPONSE_SIZE]))
+        finally:
+            await aio.close_connection(writer)
+
+    def _pop_prepared_probe(self, pid, port):
+        """Get the result of batched probe of the process port, which is
+        only used once, as the first try of the check.
+
+        :rtype: tcp_probe.Probe|None
+        """
+
+        with self._lock:
+            return self._prepared_probes.pop((pid, port), None)
+
     def _validate_config(self):
 
         if 'port' not in self._config:
             raise errors.InvalidCheckConfig(
                 'Required `port` parameter is missing in %s check config.' % (
                     self.NAME,))
+
+        for param in ('send', 'expect'):
+            if param in self._config and (
+                    not isinstance(self._config[param], str) or
+                    not self._config[param]):
+                raise errors.InvalidCheckConfig(
+                    '`%s` parameter must be non-empty string in %s check '
+                    'config.' % (param, self.NAME))
+
+        utils.validate_retry_config(self._config, self.NAME)
+
+
+async def _wait_probe(probe):
+    """Wait until batched probe is done, without blocking event loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def on_done():
+        if not future.done():
+            future.set_result(None)
+
+    probe.add_done_callback(lambda: loop.call_soon_threadsafe(on_done))
+
+    await future
+
+
+def _to_bytes(value):
+
+    return value.encode('utf-8') if value is not None else None
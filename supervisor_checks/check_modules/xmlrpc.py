@@ -1,10 +1,13 @@
 """Process check based on call to XML RPC server.
 """
 
-import supervisor.xmlrpc
+import base64
+import urllib.parse
 
+from supervisor_checks import aio
 from supervisor_checks import errors
 from supervisor_checks import utils
+from supervisor_checks import xmlrpc_pool
 from supervisor_checks.check_modules import base
 from supervisor_checks.compat import xmlrpclib
 
@@ -13,6 +16,9 @@ __author__ = 'vovanec@gmail.com'
 
 DEFAULT_RETRIES = 2
 DEFAULT_METHOD = 'status'
+DEFAULT_TIMEOUT = 15
+# The same handler SupervisorTransport ends up posting to.
+RPC_HANDLER = '/RPC2'
 
 LOCALHOST = '127.0.0.1'
 
@@ -23,11 +29,24 @@ class XMLRPCCheck(base.BaseCheck):
 
     NAME = 'xmlrpc'
 
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        self._retry_policy = utils.RetryPolicy.from_config(
+            self._config, DEFAULT_RETRIES)
+        self._transports = None
+        if self._config.get('keep_alive', False):
+            self._transports = xmlrpc_pool.TransportCache(
+                max_transports=self._config.get(
+                    'max_transports', xmlrpc_pool.DEFAULT_MAX_TRANSPORTS),
+                idle_timeout=self._config.get(
+                    'idle_timeout', xmlrpc_pool.DEFAULT_IDLE_TIMEOUT))
+
     def __call__(self, process_spec):
 
         try:
             process_name = process_spec['name']
-            retries_left = self._config.get('num_retries', DEFAULT_RETRIES)
             method_name = self._config.get('method', DEFAULT_METHOD)
             username = self._config.get('username')
             password = self._config.get('password')
@@ -36,35 +55,110 @@ class XMLRPCCheck(base.BaseCheck):
             if not server_url:
                 return True
 
-            self._log('Querying XML RPC server at %s, method %s for process %s',
-                      server_url, method_name, process_name)
+            self._debug('Querying XML RPC server at %s, method %s for '
+                        'process %s', server_url, method_name, process_name)
+
+            with utils.retry_errors(
+                    self._retry_policy, self._log,
+                    self._on_retry).retry_context(
+                        self._xmlrpc_check) as retry_xmlrpc_check:
+
+                return retry_xmlrpc_check(
+                    process_name, server_url, method_name,
+                    username=username, password=password,
+                    timeout=self._config.get('timeout', DEFAULT_TIMEOUT))
+        except Exception as exc:
+            self._warning('Check failed: %s', exc)
+
+        return False
+
+    async def check_async(self, process_spec):
+
+        try:
+            process_name = process_spec['name']
+            method_name = self._config.get('method', DEFAULT_METHOD)
+            username = self._config.get('username')
+            password = self._config.get('password')
+
+            server_url = self._get_server_url(process_name)
+            if not server_url:
+                return True
+
+            self._debug('Querying XML RPC server at %s, method %s for '
+                        'process %s', server_url, method_name, process_name)
 
-            with utils.retry_errors(retries_left, self._log).retry_context(
-                    self._xmlrpc_check) as retry_xmlrpc_check:
+            retry_xmlrpc_check = utils.retry_errors(
+                self._retry_policy, self._log, self._on_retry).wrap_async(
+                    self._xmlrpc_check_async)
 
-                return retry_xmlrpc_check(process_name, server_url, method_name,
-                                          username=username, password=password)
+            return await retry_xmlrpc_check(
+                process_name, server_url, method_name,
+                username=username, password=password,
+                timeout=self._config.get('timeout', DEFAULT_TIMEOUT))
         except Exception as exc:
-            self._log('Check failed: %s', exc)
+            self._warning('Check failed: %s', exc)
 
         return False
 
     def _xmlrpc_check(self, process_name, server_url, method_name,
-                      username=None, password=None):
+                      username=None, password=None, timeout=None):
 
         try:
-            xmlrpc_result = getattr(
-                self._get_rpc_client(server_url,
-                                     username=username,
-                                     password=password), method_name)()
+            if self._transports is not None:
+                xmlrpc_result = self._transports.call(
+                    server_url, method_name, username=username,
+                    password=password, timeout=timeout)
+            else:
+                xmlrpc_result = getattr(
+                    self._get_rpc_client(server_url,
+                                         username=username,
+                                         password=password,
+                                         timeout=timeout), method_name)()
+
+            self._debug('Successfully contacted XML RPC server at %s, '
+                        'method %s for process %s. Result: %s', server_url,
+                        method_name, process_name, xmlrpc_result)
+
+            return True
+        except xmlrpclib.Fault as err:
+            self._warning('XML RPC server returned error: %s', err)
+
+        return False
+
+    async def _xmlrpc_check_async(self, process_name, server_url, method_name,
+                                  username=None, password=None, timeout=None):
 
-            self._log('Successfully contacted XML RPC server at %s, '
-                      'method %s for process %s. Result: %s', server_url,
-                      method_name, process_name, xmlrpc_result)
+        headers = {'Content-Type': 'text/xml', 'Accept': 'text/xml'}
+        if username is not None and password is not None:
+            auth_str = '%s:%s' % (username, password)
+            headers['Authorization'] = 'Basic %s' % base64.b64encode(
+                auth_str.encode()).decode()
+
+        if server_url.startswith('unix://'):
+            address = {'unix_path': server_url[len('unix://'):]}
+        else:
+            parsed_url = urllib.parse.urlparse(server_url)
+            address = {'host': parsed_url.hostname,
+                       'port': parsed_url.port or 80}
+
+        res = await aio.http_request(
+            'POST', RPC_HANDLER, xmlrpclib.dumps((), method_name), headers,
+            timeout=timeout, **address)
+
+        if res.status != 200:
+            raise xmlrpclib.ProtocolError(
+                server_url, res.status, res.reason, res.headers)
+
+        try:
+            (xmlrpc_result,), _ = xmlrpclib.loads(res.body)
+
+            self._debug('Successfully contacted XML RPC server at %s, '
+                        'method %s for process %s. Result: %s', server_url,
+                        method_name, process_name, xmlrpc_result)
 
             return True
         except xmlrpclib.Fault as err:
-            self._log('XML RPC server returned error: %s', err)
+            self._warning('XML RPC server returned error: %s', err)
 
         return False
 
@@ -88,6 +182,8 @@ class XMLRPCCheck(base.BaseCheck):
                 'When `url` parameter is specified, `port` parameter is '
                 'required in %s check config.' % (self.NAME,))
 
+        utils.validate_retry_config(self._config, self.NAME)
+
     def _get_server_url(self, process_name):
         """Construct XML RPC server URL.
 
@@ -104,9 +200,9 @@ class XMLRPCCheck(base.BaseCheck):
 
                 return 'http://%s:%s%s' % (LOCALHOST, port, url)
             except errors.InvalidPortSpec:
-                self._log('ERROR: Could not extract the HTTP port for '
-                          'process name %s using port specification %s.',
-                          process_name, self._config['port'])
+                self._warning('ERROR: Could not extract the HTTP port for '
+                              'process name %s using port specification %s.',
+                              process_name, self._config['port'])
         else:
             sock_path = self._config.get('sock_path')
 
@@ -114,9 +210,10 @@ class XMLRPCCheck(base.BaseCheck):
                 sock_dir = self._config.get('sock_dir')
 
                 if not sock_dir:
-                    self._log('ERROR: Could not construct XML RPC socket '
-                              'path using configuration provided. sock_dir '
-                              'or sock_path argument must be specified.')
+                    self._warning('ERROR: Could not construct XML RPC '
+                                  'socket path using configuration provided. '
+                                  'sock_dir or sock_path argument must be '
+                                  'specified.')
                     return None
 
                 sock_path = 'unix://%s/%s.sock' % (sock_dir, process_name,)
@@ -127,8 +224,9 @@ class XMLRPCCheck(base.BaseCheck):
             return sock_path
 
     @staticmethod
-    def _get_rpc_client(server_url, username=None, password=None):
+    def _get_rpc_client(server_url, username=None, password=None,
+                        timeout=None):
 
         return xmlrpclib.ServerProxy(
-            'http://127.0.0.1', supervisor.xmlrpc.SupervisorTransport(
-                username, password, server_url))
+            'http://127.0.0.1', xmlrpc_pool.TimeoutTransport(
+                username, password, server_url, timeout=timeout))
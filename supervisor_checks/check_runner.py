@@ -3,18 +3,26 @@ against the process running under SupervisorD.
 """
 
 import concurrent.futures
-import datetime
 import os
 import select
 import signal
 import sys
 import threading
+import time
 
 from supervisor import childutils
-from supervisor.options import make_namespec, split_namespec
+from supervisor.options import make_namespec
+from supervisor.options import split_namespec
 from supervisor.states import ProcessStates
 
-from supervisor_checks.compat import xmlrpclib
+from supervisor_checks import errors
+from supervisor_checks import hysteresis
+from supervisor_checks import logs
+from supervisor_checks import metrics
+from supervisor_checks import process_table
+from supervisor_checks import restarter
+from supervisor_checks import result_cache
+from supervisor_checks import scheduler
 
 __author__ = 'vovanec@gmail.com'
 
@@ -26,7 +34,15 @@ GROUP_KEY = 'group'
 EVENT_NAME_KEY = 'eventname'
 
 MAX_THREADS = 16
-TICK_EVENTS = set(['TICK_5', 'TICK_60', 'TICK_3600'])
+DEFAULT_MAX_CONCURRENCY = 256
+# Tick event name -> tick period, seconds
+TICK_PERIODS = {'TICK_5': 5, 'TICK_60': 60, 'TICK_3600': 3600}
+TICK_EVENTS = set(TICK_PERIODS)
+
+# Check execution modes
+EXECUTION_MODE_THREADS = 'threads'
+EXECUTION_MODE_ASYNCIO = 'asyncio'
+EXECUTION_MODES = (EXECUTION_MODE_THREADS, EXECUTION_MODE_ASYNCIO)
 
 
 class AboutToShutdown(Exception):
@@ -37,44 +53,175 @@ class AboutToShutdown(Exception):
     pass
 
 
+class CheckTarget(object):
+    """Set of checks to run against process group or single process.
+    """
+
+    def __init__(self, process_group, process_name, checks_config, log):
+        """Constructor.
+
+        :param str process_group: the name of the process group.
+        :param str process_name: the namespec of the process. Process group
+               is ignored if this is passed in.
+        :param list checks_config: the list of check module configurations
+               in format [(check_class, check_configuration_dictionary)]
+        :param logging.Logger log: logger.
+        """
+
+        self.process_group = process_group
+        self.process_name = process_name
+        self.process_name_key = (split_namespec(process_name)
+                                 if process_name else None)
+        self.checks_config = checks_config
+        self.checks = []
+        self.schedules = {}
+        self.failure_policies = {}
+        for check_class, check_cfg in checks_config:
+            check = check_class(check_cfg, log)
+            self.checks.append(check)
+            self.schedules[check] = scheduler.CheckSchedule.from_config(
+                check_class.NAME, check_cfg)
+            self.failure_policies[check] = \
+                hysteresis.FailurePolicy.from_config(check_class.NAME,
+                                                     check_cfg)
+
+    @property
+    def display_name(self):
+        return self.process_name or self.process_group
+
+
 class CheckRunner(object):
     """SupervisorD checks runner.
     """
 
-    def __init__(self, check_name, process_group, process_name, checks_config, env=None):
+    def __init__(self, check_name, process_group, process_name, checks_config,
+                 env=None, execution_mode=EXECUTION_MODE_THREADS,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 resync_ticks=process_table.DEFAULT_RESYNC_TICKS,
+                 targets=None, parallel_checks=False,
+                 max_restarts=restarter.DEFAULT_MAX_RESTARTS,
+                 max_group_restarts=None,
+                 log_level=logs.DEFAULT_LOG_LEVEL,
+                 log_format=logs.LOG_FORMAT_TEXT,
+                 metrics_port=None, metrics_textfile=None,
+                 tick_deadline=None, min_restart_interval=0,
+                 restart_backoff=0,
+                 max_restart_backoff=hysteresis.DEFAULT_MAX_RESTART_BACKOFF):
         """Constructor.
 
         :param str check_name: the name of check to display in log.
         :param str process_group: the name of the process group.
+        :param str process_name: the namespec of the process. Process group
+               is ignored if this is passed in.
         :param list checks_config: the list of check module configurations
                in format [(check_class, check_configuration_dictionary)]
         :param dict env: environment.
+        :param str execution_mode: how checks are executed: `threads` runs
+               them in a thread pool created per tick, `asyncio` runs them
+               as coroutines on a single long-lived event loop.
+        :param int max_concurrency: maximum number of checks running at
+               once in `asyncio` execution mode.
+        :param int resync_ticks: re-read full process table from SupervisorD
+               every that many ticks. In between, process table is updated
+               from PROCESS_STATE events, so listener should be subscribed
+               to them if this is greater than 1.
+        :param list targets: check many process groups and processes from
+               single listener: the list of tuples (process_group,
+               process_name, checks_config). If passed in, process_group,
+               process_name and checks_config arguments are ignored.
+        :param bool parallel_checks: run checks of single process
+               concurrently. When one of them fails, the rest are cancelled
+               and process is restarted. Gating checks are run before the
+               other ones, which are skipped if any gating check fails.
+        :param int max_restarts: maximum number of processes restarted at
+               once. Processes are restarted in background, so checks of
+               other processes are not held by slow stopping process.
+        :param int|float max_group_restarts: maximum number of processes of
+               single group restarted at once, or fraction of the group's
+               processes if less than 1. Restarts over the limit are
+               deferred until the process fails the check again.
+        :param str log_level: minimum level of messages to log. Successful
+               checks are logged with DEBUG level.
+        :param str log_format: `text` or `json` (one JSON object per line).
+        :param int metrics_port: serve metrics in Prometheus format on that
+               localhost port.
+        :param str metrics_textfile: write metrics in Prometheus format to
+               that file after every tick, for node_exporter textfile
+               collector.
+        :param float tick_deadline: abandon checks still running that many
+               seconds after the tick, so that the tick is acknowledged in
+               time. Abandoned checks don't restart processes.
+        :param float min_restart_interval: don't restart the process more
+               often than once in that many seconds.
+        :param float restart_backoff: delay before restarting the process
+               which keeps failing right after restart, seconds. Doubles
+               with every such restart.
+        :param float max_restart_backoff: maximum delay before restarting
+               the process, seconds. Restart streak is over when the process
+               hasn't been restarted for that long.
         """
 
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError('Unsupported execution mode: %s' % (
+                execution_mode,))
+
         self._environment = env or os.environ
         self._name = check_name
-        self._checks_config = checks_config
-        self._checks = self._init_checks()
-        self._process_group = process_group
-        # represents specific process name
-        self._process_name = process_name
+        self._logger = logs.make_logger(check_name, log_level, log_format)
+        if targets is None:
+            targets = [(process_group, process_name, checks_config)]
+        self._targets = self._init_targets(targets)
+        self._metrics = metrics.Metrics()
+        self._metrics.add_retry_source(self._get_retry_counts)
+        self._metrics_port = metrics_port
+        self._metrics_textfile = metrics_textfile
+        self._metrics_server = None
         self._group_check_name = '%s_check' % (self._process_display_name(),)
         self._rpc_client = childutils.getRPCInterface(self._environment)
+        self._process_table = process_table.ProcessTable(
+            self._rpc_client, resync_ticks=resync_ticks)
+        self._scheduler = scheduler.Scheduler()
+        self._restart_queue = restarter.RestartQueue(
+            childutils.getRPCInterface(self._environment), self._log,
+            max_restarts=max_restarts,
+            on_restart=self._process_table.invalidate,
+            max_group_restarts=max_group_restarts, warn=self._warning)
+        self._failure_tracker = hysteresis.FailureTracker()
+        self._restart_damper = hysteresis.RestartDamper(
+            min_interval=min_restart_interval, backoff=restart_backoff,
+            max_backoff=max_restart_backoff)
+        self._parallel_checks = parallel_checks
+        self._tick_deadline = tick_deadline
+        # Run checks having timeout and parallel checks of single process
+        # in `threads` execution mode.
+        self._timeout_executor = None
+        self._parallel_executor = None
         self._stop_event = threading.Event()
 
+        self._execution_mode = execution_mode
+        self._max_concurrency = max_concurrency
+        self._loop = None
+        self._executor = None
+        self._semaphore = None
+        if self._execution_mode == EXECUTION_MODE_ASYNCIO:
+            self._init_async_engine()
+
     def run(self):
         """Run main check loop.
         """
 
-        self._log('Starting the health check for %s process '
-                  'Checks config: %s', self._process_display_name(), self._checks_config)
+        for target in self._targets:
+            self._log('Starting the health check for %s process '
+                      'Checks config: %s', target.display_name,
+                      target.checks_config)
 
         self._install_signal_handlers()
+        self._start_metrics_server()
 
         while not self._stop_event.is_set():
 
             try:
-                event_type = self._wait_for_supervisor_event()
+                event_type, event_headers = self._wait_for_supervisor_event()
             except AboutToShutdown:
                 self._log(
                     'Health check for %s process has been told to stop.',
@@ -83,136 +230,653 @@ class CheckRunner(object):
                 break
 
             if event_type in TICK_EVENTS:
-                self._check_processes()
-            else:
+                if self._is_stale_tick(event_type, event_headers):
+                    # Ticks queued while the previous tick was running:
+                    # only the newest one is run.
+                    self._log('Skipping stale %s event from %s',
+                              event_type, event_headers.get('when'))
+                    self._metrics.observe_skipped_tick()
+                else:
+                    self._run_tick(event_type)
+            elif not self._process_table.handle_event(event_type,
+                                                      event_headers):
                 self._log('Received unsupported event type: %s', event_type)
 
+            logs.flush(self._logger)
             childutils.listener.ok(sys.stdout)
 
+        self._restart_queue.stop()
+        self._shutdown_executors()
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+
         self._log('Done.')
+        logs.flush(self._logger)
+
+    def _run_tick(self, event_type):
+        """Run checks on TICK event and record tick duration.
+
+        :param str event_type: TICK event name.
+        """
+
+        tick_started_at = time.monotonic()
+        self._check_processes()
+        tick_duration = time.monotonic() - tick_started_at
+
+        self._metrics.observe_tick(tick_duration)
+        if tick_duration > TICK_PERIODS[event_type]:
+            self._warning('Checks on %s event took %.2f seconds, longer than '
+                          'the tick period.', event_type, tick_duration)
+
+        self._write_metrics_textfile()
+
+    @staticmethod
+    def _is_stale_tick(event_type, event_headers):
+        """Whether TICK event is older than the tick period, i.e. newer
+        TICK event of the same type has already been emitted.
+
+        :rtype: bool
+        """
+
+        try:
+            when = int(event_headers['when'])
+        except (KeyError, ValueError):
+            return False
+
+        return time.time() - when >= TICK_PERIODS[event_type]
 
     def _check_processes(self):
-        """Run single check loop for process group or name.
+        """Run single check loop for all process groups and names.
         """
 
-        process_specs = self._get_process_spec_list(ProcessStates.RUNNING)
-        if process_specs:
-            if len(process_specs) == 1:
-                self._check_and_restart(process_specs[0])
-            else:
-                # Query and restart in multiple threads simultaneously.
-                with concurrent.futures.ThreadPoolExecutor(MAX_THREADS) as pool:
-                    for process_spec in process_specs:
-                        pool.submit(self._check_and_restart, process_spec)
+        self._process_table.tick()
+
+        process_checks = []
+        for target in self._targets:
+            process_specs = self._get_process_spec_list(
+                target, ProcessStates.RUNNING)
+            if not process_specs:
+                self._log(
+                    'No processes in state RUNNING found for process %s',
+                    target.display_name)
+
+            for process_spec in process_specs:
+                due_checks = self._get_due_checks(process_spec, target)
+                if due_checks:
+                    process_checks.append((process_spec, target, due_checks))
+
+        if not process_checks:
+            return
+
+        started_at = time.monotonic()
+        self._prepare_checks(process_checks)
+        timeout = None
+        if self._tick_deadline is not None:
+            timeout = max(
+                self._tick_deadline - (time.monotonic() - started_at), 0)
+
+        if self._execution_mode == EXECUTION_MODE_ASYNCIO:
+            self._loop.run_until_complete(
+                self._check_processes_async(process_checks, timeout))
+        elif len(process_checks) == 1 and timeout is None:
+            self._check_and_restart(*process_checks[0])
         else:
-            self._log(
-                'No processes in state RUNNING found for process %s',
-                self._process_display_name())
+            self._check_processes_threads(process_checks, timeout)
 
-    def _check_and_restart(self, process_spec):
-        """Run checks for the process and restart if needed.
+    def _prepare_checks(self, process_checks):
+        """Let every check prepare for the tick, e.g. batch its I/O across
+        all processes it is due for. Checks which follow gating checks of the
+        process are prepared without the process, since they may be skipped.
         """
 
-        for check in self._checks:
-            self._log('Performing `%s` check for process name %s',
-                      check.NAME, process_spec['name'])
+        process_specs = {}
+        for process_spec, _, due_checks in process_checks:
+            for stage, checks in enumerate(due_checks):
+                for check in checks:
+                    check_process_specs = process_specs.setdefault(check, [])
+                    if stage == 0:
+                        check_process_specs.append(process_spec)
 
+        for check, check_process_specs in process_specs.items():
             try:
-                if not check(process_spec):
-                    self._log('`%s` check failed for process %s. Trying to '
-                              'restart.', check.NAME, process_spec['name'])
-
-                    return self._restart_process(process_spec)
-                else:
-                    self._log('`%s` check succeeded for process %s',
-                              check.NAME, process_spec['name'])
+                check.prepare(check_process_specs,
+                              timeout=self._tick_deadline)
             except Exception as exc:
-                self._log('`%s` check raised error for process %s: %s',
-                          check.NAME, process_spec['name'], exc)
+                self._error('Failed to prepare `%s` check: %s', check.NAME,
+                            exc)
+
+    def _check_processes_threads(self, process_checks, timeout=None):
+        """Query and restart in multiple threads simultaneously. Checks
+        still running at the tick deadline are abandoned.
+
+        :param float timeout: time left until the tick deadline, seconds.
+        """
+
+        abandoned = threading.Event()
+        pool = concurrent.futures.ThreadPoolExecutor(MAX_THREADS)
+        futures = dict(
+            (pool.submit(self._check_and_restart, process_spec, target,
+                         due_checks, abandoned), process_spec)
+            for process_spec, target, due_checks in process_checks)
+
+        _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        if not_done:
+            # Running threads can't be interrupted: they are left to finish
+            # in background, ignoring their results.
+            abandoned.set()
+            for future in not_done:
+                future.cancel()
+                self._log_abandoned(futures[future])
+
+        pool.shutdown(wait=not not_done)
+
+    def _log_abandoned(self, process_spec):
+        """Log checks of the process abandoned at the tick deadline.
+        """
+
+        self._warning('Checks for process %s did not complete within tick '
+                      'deadline of %s seconds, abandoning them.',
+                      process_spec[NAME_KEY], self._tick_deadline)
+        self._metrics.observe_abandoned(make_namespec(
+            process_spec[GROUP_KEY], process_spec[NAME_KEY]))
 
-    def _init_checks(self):
-        """Init check instances.
+    def _check_and_restart(self, process_spec, target, due_checks,
+                           abandoned=None):
+        """Run checks for the process and restart if needed.
+
+        :param list due_checks: checks due for the process, as returned by
+               _get_due_checks.
+        :param threading.Event abandoned: set if tick deadline has passed,
+               in which case the process is not restarted.
+        """
+
+        for checks in due_checks:
+            if abandoned is not None and abandoned.is_set():
+                return
+            if self._parallel_checks and len(checks) > 1:
+                failure = self._run_checks_parallel(
+                    checks, target, process_spec)
+            else:
+                failure = None
+                for check in checks:
+                    result = self._perform_check(check, target, process_spec)
+                    if not result:
+                        failure = (check, result)
+                        break
+
+            if failure is not None:
+                failed_check, result = failure
+                if abandoned is not None and abandoned.is_set():
+                    self._log('`%s` check failed for process %s after tick '
+                              'deadline, not restarting.', failed_check.NAME,
+                              process_spec['name'])
+                    return
+
+                return self._handle_failure(
+                    failed_check, target, process_spec,
+                    cached=result_cache.is_cached(result))
+
+    def _run_checks_parallel(self, checks, target, process_spec):
+        """Run checks for the process concurrently. Checks which are still
+        pending when the first one fails are cancelled.
+
+        :return: tuple (failed check, its result) or None.
+        """
+
+        if self._parallel_executor is None:
+            self._parallel_executor = concurrent.futures.ThreadPoolExecutor(
+                MAX_THREADS)
+
+        futures = dict(
+            (self._parallel_executor.submit(
+                self._perform_check, check, target, process_spec), check)
+            for check in checks)
+
+        for future in concurrent.futures.as_completed(futures):
+            if not future.result():
+                for pending_future in futures:
+                    # Checks which are already running can't be interrupted,
+                    # their results are ignored.
+                    pending_future.cancel()
+
+                return futures[future], future.result()
+
+        return None
+
+    def _perform_check(self, check, target, process_spec):
+        """Run single check and log its outcome.
+
+        :return: falsy value if check failed, truthy value if check succeeded
+                 or raised error. Result reused from cache is returned as
+                 result_cache.CachedResult.
+        :rtype: bool|result_cache.CachedResult
+        """
+
+        self._debug('Performing `%s` check for process name %s',
+                    check.NAME, process_spec['name'])
+
+        started_at = time.monotonic()
+        try:
+            result = self._run_check(check, target.schedules[check],
+                                     process_spec)
+        except Exception as exc:
+            self._observe_check(check, process_spec,
+                                metrics.OUTCOME_EXCEPTION, started_at)
+            self._error('`%s` check raised error for process %s: %s',
+                        check.NAME, process_spec['name'], exc)
+            return True
+
+        return self._record_result(check, target, process_spec, result,
+                                   started_at)
+
+    def _record_result(self, check, target, process_spec, result,
+                       started_at):
+        """Record check outcome. Result reused from cache has already been
+        recorded when the check was actually run.
+
+        :return: check result.
+        :rtype: bool|result_cache.CachedResult
+        """
+
+        if result_cache.is_cached(result):
+            return result
+
+        if not result:
+            self._observe_check(check, process_spec, metrics.OUTCOME_FAILURE,
+                                started_at)
+            return False
+
+        self._observe_check(check, process_spec, metrics.OUTCOME_SUCCESS,
+                            started_at)
+        self._failure_tracker.record_success(
+            check, target.failure_policies[check], process_spec)
+        self._debug('`%s` check succeeded for process %s',
+                    check.NAME, process_spec['name'])
+
+        return True
+
+    def _get_due_checks(self, process_spec, target):
+        """Get checks due for the process on this tick, split in two stages:
+        gating checks, and the rest of checks, which are only run if all
+        gating checks succeed.
 
         :rtype: list
         """
 
+        gating_checks = []
         checks = []
-        for check_class, check_cfg in self._checks_config:
-            checks.append(check_class(check_cfg, self._log))
+        for check in target.checks:
+            schedule = target.schedules[check]
+            if self._scheduler.is_due(check, schedule, process_spec):
+                if schedule.gating:
+                    gating_checks.append(check)
+                else:
+                    checks.append(check)
+
+        return [stage for stage in (gating_checks, checks) if stage]
+
+    async def _check_processes_async(self, process_checks, timeout=None):
+        """Run checks for all processes concurrently on the event loop.
+
+        :param float timeout: time left until the tick deadline, seconds.
+        """
+
+        import asyncio
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        tasks = dict(
+            (asyncio.ensure_future(
+                self._check_and_restart_async(process_spec, target,
+                                              due_checks)),
+             process_spec)
+            for process_spec, target, due_checks in process_checks)
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            for task in pending:
+                task.cancel()
+                self._log_abandoned(tasks[task])
+
+            await asyncio.wait(pending)
+
+        for task in done:
+            if task.exception() is not None:
+                self._error('Failed to check and restart process %s: %s',
+                            tasks[task][NAME_KEY], task.exception())
+
+    async def _check_and_restart_async(self, process_spec, target,
+                                       due_checks):
+        """Run checks for the process and restart if needed. Coroutine
+        version of _check_and_restart.
+        """
+
+        for checks in due_checks:
+            if self._parallel_checks and len(checks) > 1:
+                failure = await self._run_checks_parallel_async(
+                    checks, target, process_spec)
+            else:
+                failure = None
+                for check in checks:
+                    result = await self._perform_check_async(
+                        check, target, process_spec)
+                    if not result:
+                        failure = (check, result)
+                        break
+
+            if failure is not None:
+                failed_check, result = failure
+                return self._handle_failure(
+                    failed_check, target, process_spec,
+                    cached=result_cache.is_cached(result))
+
+    async def _run_checks_parallel_async(self, checks, target, process_spec):
+        """Run checks for the process concurrently. Checks which are still
+        in flight when the first one fails are cancelled.
+
+        :return: tuple (failed check, its result) or None.
+        """
 
-        return checks
+        import asyncio
 
-    def _get_process_spec_list(self, state=None):
+        tasks = dict(
+            (asyncio.ensure_future(self._perform_check_async(
+                check, target, process_spec)), check)
+            for check in checks)
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.result():
+                        return tasks[task], task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return None
+
+    async def _perform_check_async(self, check, target, process_spec):
+        """Run single check on the event loop and log its outcome. Coroutine
+        version of _perform_check.
+
+        :rtype: bool|result_cache.CachedResult
+        """
+
+        self._debug('Performing `%s` check for process name %s',
+                    check.NAME, process_spec['name'])
+
+        started_at = time.monotonic()
+        try:
+            async with self._semaphore:
+                # Don't count the time spent waiting for the semaphore.
+                started_at = time.monotonic()
+                result = await self._run_check_async(
+                    check, target.schedules[check], process_spec)
+        except Exception as exc:
+            self._observe_check(check, process_spec,
+                                metrics.OUTCOME_EXCEPTION, started_at)
+            self._error('`%s` check raised error for process %s: %s',
+                        check.NAME, process_spec['name'], exc)
+            return True
+
+        return self._record_result(check, target, process_spec, result,
+                                   started_at)
+
+    def _handle_failure(self, check, target, process_spec, cached=False):
+        """Restart the process if the check has failed enough times.
+
+        :param bool cached: failure has been reused from cache, so it has
+               already been counted.
+        """
+
+        if cached:
+            self._debug('`%s` check failure for process %s is reused from '
+                        'cache, not counting it again.', check.NAME,
+                        process_spec['name'])
+            return
+
+        policy = target.failure_policies[check]
+        failures, restart = self._failure_tracker.record_failure(
+            check, policy, process_spec)
+        if not restart:
+            self._warning('`%s` check failed for process %s, %s of %s '
+                          'failures before restart.', check.NAME,
+                          process_spec['name'], failures,
+                          policy.failures_before_restart)
+            return
+
+        self._warning('`%s` check failed for process %s. Trying to '
+                      'restart.', check.NAME, process_spec['name'])
+
+        return self._restart_process(process_spec)
+
+    def _observe_check(self, check, process_spec, outcome, started_at):
+        """Record check outcome and duration.
+        """
+
+        self._metrics.observe_check(
+            check.NAME, make_namespec(process_spec[GROUP_KEY],
+                                      process_spec[NAME_KEY]),
+            outcome, time.monotonic() - started_at)
+
+    def _get_retry_counts(self):
+        """Get the number of retries made by every check.
+
+        :return: the list of tuples (check name, target name, retries)
+        :rtype: list
+        """
+
+        return [(check.NAME, target.display_name, check.retries_count)
+                for target in self._targets for check in target.checks]
+
+    def _start_metrics_server(self):
+        """Start serving metrics over HTTP, if configured.
+        """
+
+        if self._metrics_port is None:
+            return
+
+        self._metrics_server = metrics.MetricsServer(
+            self._metrics, self._metrics_port)
+        self._metrics_server.start()
+
+        self._log('Serving metrics on port %s', self._metrics_server.port)
+
+    def _write_metrics_textfile(self):
+        """Write metrics to textfile, if configured.
+        """
+
+        if self._metrics_textfile is None:
+            return
+
+        try:
+            self._metrics.write_textfile(self._metrics_textfile)
+        except Exception as exc:
+            self._error('Failed to write metrics to %s: %s',
+                        self._metrics_textfile, exc)
+
+    def _run_check(self, check, schedule, process_spec):
+        """Run single check, enforcing its timeout if configured.
+
+        :rtype: bool
+        """
+
+        if schedule.timeout is None:
+            return check.run(process_spec)
+
+        if self._timeout_executor is None:
+            self._timeout_executor = concurrent.futures.ThreadPoolExecutor(
+                MAX_THREADS)
+
+        started = threading.Event()
+
+        def run_check():
+            started.set()
+            return check.run(process_spec)
+
+        future = self._timeout_executor.submit(run_check)
+        # Time spent in the queue doesn't count against check timeout. If the
+        # check doesn't even start within timeout, it's not a check failure.
+        if not started.wait(schedule.timeout) and future.cancel():
+            raise errors.CheckNotStarted(
+                'all %s timeout threads are busy with hung checks' % (
+                    MAX_THREADS,))
+
+        try:
+            return future.result(schedule.timeout)
+        except concurrent.futures.TimeoutError:
+            # Running check can't be interrupted, its thread is only
+            # released when the check returns.
+            future.cancel()
+            self._warning('`%s` check timed out after %s seconds for '
+                          'process %s', check.NAME, schedule.timeout,
+                          process_spec['name'])
+
+        return False
+
+    async def _run_check_async(self, check, schedule, process_spec):
+        """Run single check on the event loop, enforcing its timeout if
+        configured.
+
+        :rtype: bool
+        """
+
+        import asyncio
+
+        try:
+            return await asyncio.wait_for(check.run_async(process_spec),
+                                          schedule.timeout)
+        except asyncio.TimeoutError:
+            self._warning('`%s` check timed out after %s seconds for '
+                          'process %s', check.NAME, schedule.timeout,
+                          process_spec['name'])
+
+        return False
+
+    def _init_async_engine(self):
+        """Create long-lived event loop and the executor shared by checks
+        that don't have native asynchronous implementation. asyncio is
+        imported here, so that listeners running checks in threads don't pay
+        for it.
+        """
+
+        import asyncio
+
+        self._loop = asyncio.new_event_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(MAX_THREADS)
+        self._loop.set_default_executor(self._executor)
+
+    def _shutdown_executors(self):
+        """Close event loop and executors, if any.
+        """
+
+        if self._loop is not None:
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+            self._loop = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+        if self._timeout_executor is not None:
+            self._timeout_executor.shutdown(wait=False)
+            self._timeout_executor = None
+
+        if self._parallel_executor is not None:
+            self._parallel_executor.shutdown(wait=False)
+            self._parallel_executor = None
+
+    def _init_targets(self, targets):
+        """Init check targets.
+
+        :param list targets: the list of tuples (process_group,
+               process_name, checks_config).
+
+        :rtype: list
+        """
+
+        return [CheckTarget(process_group, process_name, checks_config,
+                            self._logger)
+                for process_group, process_name, checks_config in targets]
+
+    def _get_process_spec_list(self, target, state=None):
         """Get the list of processes in a process group or name.
 
         If process_name doesn't exist then get all processes in the defined group
         If process_name exists then get only the process(es) that match that name
         """
 
-        process_specs = []
-        for process_spec in self._rpc_client.supervisor.getAllProcessInfo():
-            if not self._process_name:
-                if (process_spec[GROUP_KEY] == self._process_group and
-                    (state is None or process_spec[STATE_KEY] == state)):
-                    process_specs.append(process_spec)
-            else:
-                if ((process_spec[GROUP_KEY], process_spec[NAME_KEY]) == 
-                    split_namespec(self._process_name) and
-                    (state is None or process_spec[STATE_KEY] == state)):
-                    process_specs.append(process_spec)
+        if not target.process_name:
+            return self._process_table.get_group(target.process_group, state)
 
-        return process_specs
+        process_spec = self._process_table.get_process(
+            target.process_name_key[0], target.process_name_key[1], state)
+
+        return [process_spec] if process_spec is not None else []
 
     def _restart_process(self, process_spec):
-        """Restart a process.
+        """Queue process restart, unless the process has been restarted too
+        recently.
         """
 
-        if not self._process_name:
-            name_spec = make_namespec(
-                process_spec[GROUP_KEY], process_spec[NAME_KEY])
-        else:
-            name_spec_tuple = split_namespec(self._process_name)
-            name_spec = make_namespec(name_spec_tuple[0], name_spec_tuple[1])
+        delay = self._restart_damper.get_delay(process_spec)
+        if delay:
+            self._warning('Process %s has been restarted recently, delaying '
+                          'restart for %.0f more seconds.',
+                          process_spec[NAME_KEY], delay)
+            return
 
-        rpc_client = childutils.getRPCInterface(self._environment)
+        group_size = len(self._process_table.get_group(
+            process_spec[GROUP_KEY]))
+        if self._restart_queue.submit(process_spec, group_size=group_size):
+            self._restart_damper.record_restart(process_spec)
+            self._failure_tracker.forget(process_spec)
+            self._metrics.observe_restart(make_namespec(
+                process_spec[GROUP_KEY], process_spec[NAME_KEY]))
 
-        process_spec = rpc_client.supervisor.getProcessInfo(name_spec)
-        if process_spec[STATE_KEY] is ProcessStates.RUNNING:
-            self._log('Trying to stop process %s', name_spec)
+    def _log(self, msg, *args):
+        """Write message to STDERR. Message is formatted only if its level
+        is enabled, and written in batches, at least once per event.
 
-            try:
-                rpc_client.supervisor.stopProcess(name_spec)
-                self._log('Stopped process %s', name_spec)
-            except xmlrpclib.Fault as exc:
-                self._log('Failed to stop process %s: %s', name_spec, exc)
+        :param str msg: string message.
+        """
 
-            try:
-                self._log('Starting process %s', name_spec)
-                rpc_client.supervisor.startProcess(name_spec, False)
-            except xmlrpclib.Fault as exc:
-                self._log('Failed to start process %s: %s', name_spec, exc)
+        self._logger.info(msg, *args)
 
-        else:
-            self._log('%s not in RUNNING state, cannot restart', name_spec)
+    def _debug(self, msg, *args):
+        """Write troubleshooting message to STDERR.
 
-    def _log(self, msg, *args):
-        """Write message to STDERR.
+        :param str msg: string message.
+        """
+
+        self._logger.debug(msg, *args)
+
+    def _warning(self, msg, *args):
+        """Write warning message to STDERR.
 
         :param str msg: string message.
         """
 
-        curr_dt = datetime.datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+        self._logger.warning(msg, *args)
+
+    def _error(self, msg, *args):
+        """Write error message to STDERR.
 
-        sys.stderr.write(
-            '%s [%s] %s\n' % (curr_dt, self._name, msg % args,))
+        :param str msg: string message.
+        """
 
-        sys.stderr.flush()
+        self._logger.error(msg, *args)
 
     def _install_signal_handlers(self):
         """Install signal handlers.
         """
 
-        self._log('Installing signal handlers.')
+        self._debug('Installing signal handlers.')
 
         for sig in (signal.SIGINT, signal.SIGUSR1, signal.SIGHUP,
                     signal.SIGTERM, signal.SIGQUIT):
@@ -226,6 +890,8 @@ class CheckRunner(object):
 
     def _wait_for_supervisor_event(self):
         """Wait for supervisor events.
+
+        :return: tuple (event type, event payload headers)
         """
 
         childutils.listener.ready(sys.stdout)
@@ -239,13 +905,133 @@ class CheckRunner(object):
             if rdfs:
                 headers = childutils.get_headers(rdfs[0].readline())
                 # Read the payload to make read buffer empty.
-                _ = sys.stdin.read(int(headers['len']))
+                payload = sys.stdin.read(int(headers['len']))
                 event_type = headers[EVENT_NAME_KEY]
-                self._log('Received %s event from supervisor', event_type)
+                self._debug('Received %s event from supervisor', event_type)
+
+                try:
+                    event_headers = childutils.get_headers(
+                        payload.split('\n', 1)[0])
+                except ValueError:
+                    # Malformed payload: handle the event without headers,
+                    # e.g. resync process table instead of updating it.
+                    self._warning('Failed to parse %s event payload: %r',
+                                  event_type, payload)
+                    event_headers = {}
 
-                return event_type
+                return event_type, event_headers
 
         raise AboutToShutdown
 
     def _process_display_name(self):
-        return self._process_name or self._process_group
+        return ', '.join(target.display_name for target in self._targets)
+
+
+def add_runner_arguments(parser):
+    """Add options of CheckRunner shared by check programs running many
+    checks, such as supervisor_complex_check and supervisor_multi_check.
+
+    :param argparse.ArgumentParser parser: the option parser.
+    """
+
+    parser.add_argument(
+        '-a', '--asyncio', dest='asyncio', action='store_true',
+        help='Run checks as coroutines on a single event loop.')
+    parser.add_argument(
+        '-C', '--max-concurrency', dest='max_concurrency', type=int,
+        default=DEFAULT_MAX_CONCURRENCY, required=False,
+        help='Maximum number of checks running at once in asyncio mode. '
+             'Default: %s' % (DEFAULT_MAX_CONCURRENCY,))
+    parser.add_argument(
+        '-p', '--parallel-checks', dest='parallel_checks',
+        action='store_true',
+        help='Run checks of single process concurrently, restart process '
+             'on the first failure.')
+    parser.add_argument(
+        '-M', '--max-restarts', dest='max_restarts', type=int,
+        default=restarter.DEFAULT_MAX_RESTARTS, required=False,
+        help='Maximum number of processes restarted at once. Default: %s' % (
+            restarter.DEFAULT_MAX_RESTARTS,))
+    parser.add_argument(
+        '-G', '--max-group-restarts', dest='max_group_restarts',
+        type=restarter.group_limit, default=None, required=False,
+        help='Maximum number of processes of single group restarted at '
+             'once, or fraction of the group\'s processes if less than 1. '
+             'Restarts over the limit are deferred. Default: no limit.')
+    parser.add_argument(
+        '-i', '--min-restart-interval', dest='min_restart_interval',
+        type=float, default=0, required=False,
+        help='Do not restart the process more often than once in that many '
+             'seconds.')
+    parser.add_argument(
+        '-b', '--restart-backoff', dest='restart_backoff', type=float,
+        default=0, required=False,
+        help='Delay before restarting the process which keeps failing right '
+             'after restart, seconds. Doubles with every such restart.')
+    parser.add_argument(
+        '-x', '--max-restart-backoff', dest='max_restart_backoff',
+        type=float, default=hysteresis.DEFAULT_MAX_RESTART_BACKOFF,
+        required=False,
+        help='Maximum delay before restarting the process, seconds. '
+             'Default: %s' % (hysteresis.DEFAULT_MAX_RESTART_BACKOFF,))
+    parser.add_argument(
+        '-R', '--resync-ticks', dest='resync_ticks', type=int,
+        default=process_table.DEFAULT_RESYNC_TICKS, required=False,
+        help='Re-read full process table every that many ticks, use '
+             'PROCESS_STATE events in between. Default: %s' % (
+                 process_table.DEFAULT_RESYNC_TICKS,))
+    parser.add_argument(
+        '-d', '--tick-deadline', dest='tick_deadline', type=float,
+        default=None, required=False,
+        help='Abandon checks still running that many seconds after the '
+             'tick, so that slow checks do not delay next ticks.')
+    parser.add_argument(
+        '-L', '--log-level', dest='log_level', type=str.upper,
+        choices=logs.LOG_LEVELS, default=logs.DEFAULT_LOG_LEVEL,
+        required=False,
+        help='Minimum level of logged messages, successful checks are '
+             'logged with DEBUG level. Default: %s' % (
+                 logs.DEFAULT_LOG_LEVEL,))
+    parser.add_argument(
+        '-F', '--log-format', dest='log_format', type=str,
+        choices=logs.LOG_FORMATS, default=logs.LOG_FORMAT_TEXT,
+        required=False,
+        help='Log format, `json` writes one JSON object per line. '
+             'Default: %s' % (logs.LOG_FORMAT_TEXT,))
+    parser.add_argument(
+        '-P', '--metrics-port', dest='metrics_port', type=int, default=None,
+        required=False,
+        help='Serve metrics in Prometheus format on that localhost port.')
+    parser.add_argument(
+        '-T', '--metrics-textfile', dest='metrics_textfile', type=str,
+        default=None, required=False,
+        help='Write metrics in Prometheus format to that file after every '
+             'tick, for node_exporter textfile collector.')
+
+
+def get_runner_kwargs(args):
+    """Get CheckRunner keyword arguments from options added by
+    add_runner_arguments().
+
+    :param argparse.Namespace args: parsed options.
+
+    :rtype: dict
+    """
+
+    return {
+        'execution_mode': (EXECUTION_MODE_ASYNCIO if args.asyncio
+                           else EXECUTION_MODE_THREADS),
+        'max_concurrency': args.max_concurrency,
+        'resync_ticks': args.resync_ticks,
+        'tick_deadline': args.tick_deadline,
+        'parallel_checks': args.parallel_checks,
+        'max_restarts': args.max_restarts,
+        'max_group_restarts': args.max_group_restarts,
+        'min_restart_interval': args.min_restart_interval,
+        'restart_backoff': args.restart_backoff,
+        'max_restart_backoff': args.max_restart_backoff,
+        'log_level': args.log_level,
+        'log_format': args.log_format,
+        'metrics_port': args.metrics_port,
+        'metrics_textfile': args.metrics_textfile,
+    }
@@ -16,3 +16,11 @@ class InvalidPortSpec(InvalidCheckConfig):
     """
 
     pass
+
+
+class CheckNotStarted(RuntimeError):
+    """Raised when check with timeout could not start because all timeout
+    threads are busy with checks that hang.
+    """
+
+    pass
@@ -0,0 +1,336 @@
+"""Heartbeats of many processes in single memory mapped file.
+
+Segment is an array of fixed size slots (pid, monotonic timestamp, progress
+counter) preceded by a header. Every process claims a slot once, under file
+lock, and then publishes heartbeats by writing to the slot in memory, with
+no syscall. Listener maps the segment read-only and reads all slots at once
+per tick.
+
+Timestamps are CLOCK_MONOTONIC, which is shared by all processes of the host.
+Segment is best placed on tmpfs, /dev/shm by default, so that it's never
+written back to disk.
+"""
+
+import contextlib
+import fcntl
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+
+__author__ = 'vovanec@gmail.com'
+
+
+SHM_DIR = '/dev/shm'
+SEGMENT_NAME = 'supervisor_checks-heartbeats'
+DEFAULT_SLOTS = 4096
+DEFAULT_MODE = 0o600
+
+_OPEN_FLAGS = os.O_NOFOLLOW | getattr(os, 'O_CLOEXEC', 0)
+
+MAGIC = b'SCHB'
+VERSION = 1
+
+# magic, version, number of slots, padded to keep slots 8-byte aligned.
+_HEADER = struct.Struct('=4sII4x')
+# pid, monotonic timestamp, progress counter.
+_SLOT = struct.Struct('=qdQ')
+_TIMESTAMP_OFFSET = 8
+_TIMESTAMP = struct.Struct('=d')
+_HEARTBEAT = struct.Struct('=dQ')
+_PROGRESS_MASK = 2 ** 64 - 1
+
+
+class SegmentFull(Exception):
+    """Raised when all slots are claimed by running processes.
+    """
+
+    pass
+
+
+class InvalidSegment(OSError):
+    """Raised when the file is not initialized heartbeat segment.
+    """
+
+    pass
+
+
+def get_default_path():
+    """Default segment path.
+
+    :rtype: str
+    """
+
+    root_dir = SHM_DIR if os.path.isdir(SHM_DIR) else tempfile.gettempdir()
+
+    return os.path.join(root_dir, SEGMENT_NAME)
+
+
+class HeartbeatSegment(object):
+    """Memory mapped heartbeat segment.
+    """
+
+    def __init__(self, path=None, slots=DEFAULT_SLOTS, mode=DEFAULT_MODE,
+                 readonly=False, owner=None):
+        """Constructor. Creates segment unless it exists or `readonly`.
+
+        :param str path: segment file path. Default: get_default_path()
+        :param int slots: number of slots of created segment. Existing
+               segment keeps its size.
+        :param int mode: permissions of created segment file.
+        :param bool readonly: only map existing segment for reading.
+        :param int owner: uid segment file must be owned by, so that other
+               users can't plant fake heartbeats. Default: effective uid.
+
+        :raise InvalidSegment: if file is not heartbeat segment.
+        """
+
+        self.path = path or get_default_path()
+        self.readonly = readonly
+        owner = os.geteuid() if owner is None else owner
+
+        if readonly:
+            self._fd = os.open(self.path, os.O_RDONLY | _OPEN_FLAGS)
+        else:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | _OPEN_FLAGS,
+                               mode)
+
+        try:
+            file_stat = os.fstat(self._fd)
+            if not stat.S_ISREG(file_stat.st_mode):
+                raise InvalidSegment('%s is not regular file' % (self.path,))
+            if file_stat.st_uid != owner:
+                raise InvalidSegment('%s is owned by uid %s, expected %s' % (
+                    self.path, file_stat.st_uid, owner))
+
+            if not readonly:
+                with _locked(self._fd):
+                    if os.fstat(self._fd).st_size == 0:
+                        self._initialize(self._fd, slots)
+
+            self.inode = file_stat.st_ino
+            self._mmap = self._map(self._fd)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+        _, _, self.slots = _HEADER.unpack_from(self._mmap)
+
+    def claim(self, pid=None):
+        """Claim slot for the process. Slot of exited process is reused.
+
+        :param int pid: process id. Default: current process.
+
+        :rtype: HeartbeatSlot
+        :raise SegmentFull: if there's no free slot.
+        """
+
+        pid = os.getpid() if pid is None else pid
+
+        with _locked(self._fd):
+            free_index = None
+            for index, (slot_pid, _, _) in enumerate(self._iter_slots()):
+                if slot_pid == pid:
+                    free_index = index
+                    break
+                if free_index is None and (slot_pid == 0 or
+                                           not _is_running(slot_pid)):
+                    free_index = index
+
+            if free_index is None:
+                raise SegmentFull('All %s heartbeat slots of %s are taken' % (
+                    self.slots, self.path))
+
+            offset = _HEADER.size + free_index * _SLOT.size
+            _SLOT.pack_into(self._mmap, offset, pid, time.monotonic(), 0)
+
+        return HeartbeatSlot(self._mmap, offset, pid)
+
+    def read(self):
+        """Read all claimed slots at once.
+
+        :return: pid -> (monotonic timestamp, progress counter).
+        :rtype: dict
+        """
+
+        return {pid: (timestamp, progress)
+                for pid, timestamp, progress in self._iter_slots() if pid}
+
+    def close(self):
+
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _iter_slots(self):
+
+        return _SLOT.iter_unpack(
+            self._mmap[_HEADER.size:_HEADER.size + self.slots * _SLOT.size])
+
+    def _map(self, fd):
+
+        size = os.fstat(fd).st_size
+        if size < _HEADER.size:
+            raise InvalidSegment('%s is not heartbeat segment' % (self.path,))
+
+        segment = mmap.mmap(fd, size, access=(mmap.ACCESS_READ if self.readonly
+                                              else mmap.ACCESS_WRITE))
+        magic, version, slots = _HEADER.unpack_from(segment)
+        if magic != MAGIC or version != VERSION or \
+                size < _HEADER.size + slots * _SLOT.size:
+            segment.close()
+            raise InvalidSegment('%s is not heartbeat segment' % (self.path,))
+
+        return segment
+
+    @staticmethod
+    def _initialize(fd, slots):
+
+        os.ftruncate(fd, _HEADER.size + slots * _SLOT.size)
+        os.pwrite(fd, _HEADER.pack(MAGIC, VERSION, slots), 0)
+
+
+class HeartbeatSlot(object):
+    """Slot of single process. Publishing heartbeat is a memory write.
+    """
+
+    def __init__(self, segment_mmap, offset, pid):
+        """Constructor.
+
+        :param mmap.mmap segment_mmap: segment memory.
+        :param int offset: slot offset.
+        :param int pid: process id slot is claimed for.
+        """
+
+        self._mmap = segment_mmap
+        self._offset = offset
+        self.pid = pid
+
+    def notify(self, progress=None):
+        """Publish heartbeat.
+
+        :param int progress: progress counter, e.g. number of requests
+               served so far. Left unchanged if not passed.
+        """
+
+        if progress is None:
+            _TIMESTAMP.pack_into(self._mmap, self._offset + _TIMESTAMP_OFFSET,
+                                 time.monotonic())
+        else:
+            _HEARTBEAT.pack_into(self._mmap, self._offset + _TIMESTAMP_OFFSET,
+                                 time.monotonic(), progress & _PROGRESS_MASK)
+
+    def release(self):
+        """Free the slot for other processes.
+        """
+
+        _SLOT.pack_into(self._mmap, self._offset, 0, 0, 0)
+
+
+class HeartbeatReader(object):
+    """Shared by checks of many processes: reads the segment once per tick,
+    when refresh() is called from check's prepare(). Thread safe.
+    """
+
+    def __init__(self, path=None, owner=None):
+        """Constructor.
+
+        :param str path: segment file path. Default: get_default_path()
+        :param int owner: uid segment file must be owned by. Default:
+               effective uid.
+        """
+
+        self.path = path or get_default_path()
+        self.owner = owner
+        self._segment = None
+        self._snapshot = None
+        self._taken_at = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        """Get heartbeats of all processes from the snapshot of the current
+        tick, reading the segment if there's no snapshot yet.
+
+        :return: the tuple (pid -> (monotonic timestamp, progress counter),
+                 monotonic time heartbeats were read at).
+        :rtype: (dict, float)
+        :raise OSError: if segment doesn't exist.
+        """
+
+        with self._lock:
+            if self._snapshot is None:
+                self._take_snapshot()
+
+            return self._snapshot, self._taken_at
+
+    def refresh(self):
+        """Read the segment again on new tick.
+
+        :return: the same as read()
+        :rtype: (dict, float)
+        :raise OSError: if segment doesn't exist.
+        """
+
+        with self._lock:
+            # If the segment can't be read, checks retry and report error.
+            self._snapshot = None
+            self._take_snapshot()
+
+            return self._snapshot, self._taken_at
+
+    def close(self):
+
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def _take_snapshot(self):
+        """Read heartbeats of all processes. Must be called with lock held.
+        """
+
+        self._snapshot = self._get_segment().read()
+        self._taken_at = time.monotonic()
+
+    def _get_segment(self):
+        """Map the segment, again if it was re-created. Must be called with
+        lock held.
+        """
+
+        if self._segment is not None:
+            inode = os.stat(self.path, follow_symlinks=False).st_ino
+            if inode != self._segment.inode:
+                self._segment.close()
+                self._segment = None
+
+        if self._segment is None:
+            self._segment = HeartbeatSegment(self.path, readonly=True,
+                                             owner=self.owner)
+
+        return self._segment
+
+
+@contextlib.contextmanager
+def _locked(fd):
+    """Exclusive lock of the file for the duration of the block.
+    """
+
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _is_running(pid):
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
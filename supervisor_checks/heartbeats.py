@@ -0,0 +1,289 @@
+"""In-memory table of heartbeats of notification files.
+
+NotificationFile.notify changes file mode, which updates file ctime and
+raises inotify IN_ATTRIB event. Monitor watches directories of notification
+files with inotify and records the time of every event, so that checking the
+heartbeat costs no syscall. Where inotify is not available, directories are
+swept with os.scandir once per tick, in check's prepare(), instead of stat-ing
+every file on every check. Sweep results are used until the next sweep.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+
+__author__ = 'vovanec@gmail.com'
+
+
+# How often watcher thread checks whether it should stop, seconds.
+POLL_INTERVAL = 1.0
+
+# inotify(7) constants.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+
+HEARTBEAT_EVENTS = IN_ATTRIB | IN_MODIFY | IN_CREATE | IN_MOVED_TO
+GONE_EVENTS = IN_DELETE | IN_MOVED_FROM
+WATCH_MASK = HEARTBEAT_EVENTS | GONE_EVENTS | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+class Inotify(object):
+    """Minimal inotify binding.
+    """
+
+    _libc = None
+
+    def __init__(self):
+        """Constructor.
+
+        :raise OSError: if inotify is not supported.
+        """
+
+        libc = self._get_libc()
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """Watch path.
+
+        :param str path: path to watch.
+        :param int mask: events to watch for.
+
+        :return: watch descriptor.
+        :rtype: int
+        """
+
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+
+        return wd
+
+    def read_events(self):
+        """Read pending events without blocking.
+
+        :return: the list of tuples (watch descriptor, mask, name)
+        :rtype: list
+        """
+
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            events.append((wd, mask, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    @classmethod
+    def _get_libc(cls):
+
+        if cls._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            if not hasattr(libc, 'inotify_init1'):
+                raise OSError(errno.ENOSYS, 'inotify is not supported')
+            libc.inotify_add_watch.argtypes = [
+                ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            cls._libc = libc
+
+        return cls._libc
+
+
+class HeartbeatMonitor(object):
+    """Last heartbeat time of every notification file. Thread safe.
+    """
+
+    def __init__(self, use_inotify=True):
+        """Constructor.
+
+        :param bool use_inotify: watch files with inotify if supported,
+               otherwise sweep directories.
+        """
+
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+            except OSError:
+                pass
+
+        # path -> last heartbeat timestamp
+        self._heartbeats = {}
+        # directory -> watch descriptor, and back
+        self._watches = {}
+        self._watched_dirs = {}
+        # directory -> time of the sweep of the current tick
+        self._swept_at = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def sweep(self, dir_paths):
+        """Read ctime of all files in directories at once, dropping results
+        of the previous sweep. Should be called once per tick. Does nothing in
+        inotify mode.
+
+        :param iterable dir_paths: directories to sweep.
+        """
+
+        if self._inotify is not None:
+            return
+
+        with self._lock:
+            # Files of directories not swept on this tick are stat-ed.
+            self._heartbeats.clear()
+            self._swept_at.clear()
+
+        for dir_path in set(map(os.path.normpath, dir_paths)):
+            heartbeats = {}
+            try:
+                for entry in os.scandir(dir_path):
+                    try:
+                        heartbeats[entry.path] = entry.stat(
+                            follow_symlinks=False).st_ctime
+                    except OSError:
+                        # File has been removed.
+                        continue
+            except OSError:
+                # Directory doesn't exist.
+                continue
+
+            with self._lock:
+                self._heartbeats.update(heartbeats)
+                self._swept_at[dir_path] = time.time()
+
+    def get_heartbeat_age(self, path):
+        """Get time passed since the last heartbeat of notification file.
+
+        :param str path: notification file path.
+
+        :rtype: float
+        :raise OSError: if file doesn't exist.
+        """
+
+        path = os.path.normpath(path)
+        dir_path = os.path.dirname(path)
+        if self._inotify is not None:
+            self._watch(dir_path)
+            now = time.time()
+        else:
+            with self._lock:
+                now = self._swept_at.get(dir_path)
+
+        with self._lock:
+            heartbeat = self._heartbeats.get(path) if now else None
+
+        if heartbeat is None:
+            # Not seen by watcher or sweep yet.
+            now = time.time()
+            heartbeat = os.stat(path, follow_symlinks=False).st_ctime
+            if self._inotify is not None:
+                self._record(path, heartbeat)
+
+        return now - heartbeat
+
+    def close(self):
+        """Stop watching.
+        """
+
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def _watch(self, dir_path):
+        """Start watching directory, unless it's watched already.
+        """
+
+        with self._lock:
+            if dir_path in self._watches:
+                return
+
+            wd = self._inotify.add_watch(dir_path, WATCH_MASK)
+            self._watches[dir_path] = wd
+            self._watched_dirs[wd] = dir_path
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._watcher, name='heartbeat-watcher')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _watcher(self):
+
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._inotify], [], [],
+                                           POLL_INTERVAL)
+            if readable:
+                self._handle_events(self._inotify.read_events())
+
+    def _handle_events(self, events):
+
+        now = time.time()
+        with self._lock:
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost: re-read files on next checks.
+                    self._heartbeats.clear()
+                    continue
+
+                dir_path = self._watched_dirs.get(wd)
+                if dir_path is None:
+                    continue
+
+                if mask & IN_IGNORED:
+                    # Directory was removed: watch again on next check.
+                    del self._watched_dirs[wd]
+                    self._watches.pop(dir_path, None)
+                    continue
+
+                path = os.path.join(dir_path, name)
+                if mask & GONE_EVENTS:
+                    self._heartbeats.pop(path, None)
+                elif mask & HEARTBEAT_EVENTS:
+                    self._heartbeats[path] = now
+
+    def _record(self, path, heartbeat):
+
+        with self._lock:
+            self._heartbeats[path] = max(heartbeat,
+                                         self._heartbeats.get(path, 0))
@@ -0,0 +1,210 @@
+"""Pool of persistent HTTP/1.1 connections.
+"""
+
+import select
+import threading
+import time
+
+from supervisor_checks.compat import httplib
+
+__author__ = 'vovanec@gmail.com'
+
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_TIMEOUT = 60
+
+
+class HTTPConnectionPool(object):
+    """Thread safe pool of persistent HTTP connections per host:port.
+
+    Idle connections are checked for staleness before reuse, and evicted
+    when they stay unused for longer than idle timeout. Request sent over
+    reused connection which turns out to be closed by server is
+    transparently repeated over a new connection.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """Constructor.
+
+        :param int pool_size: maximum number of idle connections kept per
+               host:port.
+        :param float idle_timeout: idle connections unused for longer than
+               that are closed, seconds.
+        """
+
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        # host_port -> list of (connection, last used time)
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def request(self, host_port, method, url, body=None, headers=None,
+                timeout=None, max_body_size=None):
+        """Make HTTP request using pooled connection. Response body is read
+        completely, so that connection can be reused, unless it's longer
+        than max_body_size.
+
+        :param str host_port: host:port string.
+        :param str method: HTTP method.
+        :param str url: request URL.
+        :param str body: request body.
+        :param dict headers: request headers.
+        :param float timeout: socket timeout, seconds.
+        :param int max_body_size: read not more than that many bytes of
+               response body.
+
+        :return: tuple (response, response body)
+        :rtype: (httplib.HTTPResponse, bytes)
+        """
+
+        connection, reused = self._acquire(host_port, timeout)
+
+        try:
+            res, res_body, truncated = self._do_request(
+                connection, method, url, body, headers, max_body_size)
+        except ConnectionError:
+            connection.close()
+            if not reused:
+                raise
+
+            # Server has closed idle connection, retry once using new one.
+            connection = httplib.HTTPConnection(host_port, timeout=timeout)
+            try:
+                res, res_body, truncated = self._do_request(
+                    connection, method, url, body, headers, max_body_size)
+            except Exception:
+                connection.close()
+                raise
+        except Exception:
+            connection.close()
+            raise
+
+        if res.will_close or truncated:
+            connection.close()
+        else:
+            self._release(host_port, connection)
+
+        return res, res_body
+
+    def close(self):
+        """Close all idle connections.
+        """
+
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+
+        for connections in idle_connections.values():
+            for connection, _ in connections:
+                connection.close()
+
+    def _acquire(self, host_port, timeout):
+        """Get idle connection from the pool or create a new one.
+
+        :return: tuple (connection, whether connection is reused)
+        """
+
+        stale = []
+        connection = None
+
+        with self._lock:
+            stale.extend(self._evict_idle(time.time()))
+
+            connections = self._idle_connections.get(host_port, [])
+            while connections:
+                candidate, _ = connections.pop()
+                if self._is_stale(candidate):
+                    stale.append(candidate)
+                else:
+                    connection = candidate
+                    break
+
+        for stale_connection in stale:
+            stale_connection.close()
+
+        if connection is None:
+            return httplib.HTTPConnection(host_port, timeout=timeout), False
+
+        connection.timeout = timeout
+        connection.sock.settimeout(timeout)
+
+        return connection, True
+
+    def _release(self, host_port, connection):
+        """Return connection to the pool, or close it if pool is full.
+        """
+
+        with self._lock:
+            connections = self._idle_connections.setdefault(host_port, [])
+            if len(connections) < self._pool_size:
+                connections.append((connection, time.time()))
+                return
+
+        connection.close()
+
+    def _evict_idle(self, now):
+        """Remove connections which have been idle for too long. Must be
+        called with lock held.
+
+        :return: list of removed connections.
+        """
+
+        evicted = []
+        for host_port, connections in list(self._idle_connections.items()):
+            fresh = []
+            for connection, last_used in connections:
+                if now - last_used > self._idle_timeout:
+                    evicted.append(connection)
+                else:
+                    fresh.append((connection, last_used))
+
+            if fresh:
+                self._idle_connections[host_port] = fresh
+            else:
+                del self._idle_connections[host_port]
+
+        return evicted
+
+    @staticmethod
+    def _is_stale(connection):
+        """Idle connection is stale if it was closed or if socket is
+        readable: server has closed it or sent unexpected data.
+        """
+
+        if connection.sock is None:
+            return True
+
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+
+        return bool(readable)
+
+    @staticmethod
+    def _do_request(connection, method, url, body, headers, max_body_size):
+
+        connection.request(method, url, body, headers=headers or {})
+        res = connection.getresponse()
+        res_body, truncated = read_body(res, max_body_size)
+
+        return res, res_body, truncated
+
+
+def read_body(res, max_size=None):
+    """Read HTTP response body, but not more than max_size bytes.
+
+    :param httplib.HTTPResponse res: HTTP response.
+    :param int max_size: maximum number of bytes to read.
+
+    :return: tuple (body, whether body was truncated)
+    :rtype: (bytes, bool)
+    """
+
+    if max_size is None:
+        return res.read(), False
+
+    body = res.read(max_size + 1)
+
+    return body[:max_size], len(body) > max_size
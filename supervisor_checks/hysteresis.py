@@ -0,0 +1,241 @@
+"""Failure hysteresis and restart damping.
+
+Every check config may contain optional `restart` dictionary:
+
+    {"http": {"port": 8080, "url": "/ping",
+              "restart": {"failures_before_restart": 3,
+                          "successes_to_recover": 2}}}
+
+  * failures_before_restart - restart the process when the check has failed
+    that many times since the process was last considered healthy. Default
+    is 1: restart on the first failure.
+  * successes_to_recover - consider the process healthy again, forgetting
+    its failures, after that many consecutive successful checks. Default
+    is 1.
+
+Restarts of every process are damped on the listener level: the process is
+not restarted more often than once in `min_restart_interval` seconds, and
+process which keeps failing right after restart is restarted with
+exponentially growing delays, starting with `restart_backoff` seconds and
+up to `max_restart_backoff` seconds.
+"""
+
+import threading
+import time
+
+from supervisor.options import make_namespec
+
+from supervisor_checks import errors
+
+__author__ = 'vovanec@gmail.com'
+
+
+RESTART_KEY = 'restart'
+DEFAULT_MAX_RESTART_BACKOFF = 3600
+
+
+class FailurePolicy(object):
+    """Failure hysteresis parameters of single check.
+    """
+
+    def __init__(self, failures_before_restart=1, successes_to_recover=1):
+        """Constructor.
+
+        :param int failures_before_restart: restart after that many failures.
+        :param int successes_to_recover: forget failures after that many
+               consecutive successes.
+        """
+
+        self.failures_before_restart = failures_before_restart
+        self.successes_to_recover = successes_to_recover
+
+    @classmethod
+    def from_config(cls, check_name, check_config):
+        """Create failure policy from check config.
+
+        :param str check_name: check name.
+        :param dict check_config: check config.
+
+        :rtype: FailurePolicy
+        """
+
+        restart_config = check_config.get(RESTART_KEY) or {}
+        if not isinstance(restart_config, dict):
+            raise errors.InvalidCheckConfig(
+                '`%s` parameter must be dictionary type in %s check config.'
+                % (RESTART_KEY, check_name))
+
+        for param in ('failures_before_restart', 'successes_to_recover'):
+            value = restart_config.get(param)
+            if value is not None and (not isinstance(value, int) or
+                                      value < 1):
+                raise errors.InvalidCheckConfig(
+                    '`%s` restart parameter must be positive integer in %s '
+                    'check config.' % (param, check_name))
+
+        return cls(
+            failures_before_restart=restart_config.get(
+                'failures_before_restart') or 1,
+            successes_to_recover=restart_config.get(
+                'successes_to_recover') or 1)
+
+
+class FailureTracker(object):
+    """Keeps track of failures and successes of every (check, process) pair.
+    Thread safe.
+    """
+
+    def __init__(self):
+
+        # (check id, group, name) -> [failures, consecutive successes]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record_failure(self, check, policy, process_spec):
+        """Record failed check.
+
+        :param BaseCheck check: check instance.
+        :param FailurePolicy policy: check failure policy.
+        :param dict process_spec: process specification dictionary.
+
+        :return: the number of failures, and whether it's enough to restart
+                 the process.
+        :rtype: (int, bool)
+        """
+
+        with self._lock:
+            counters = self._counters.setdefault(
+                self._get_key(check, process_spec), [0, 0])
+            counters[0] += 1
+            counters[1] = 0
+
+            return counters[0], counters[0] >= policy.failures_before_restart
+
+    def record_success(self, check, policy, process_spec):
+        """Record successful check.
+
+        :param BaseCheck check: check instance.
+        :param FailurePolicy policy: check failure policy.
+        :param dict process_spec: process specification dictionary.
+        """
+
+        key = self._get_key(check, process_spec)
+        with self._lock:
+            counters = self._counters.get(key)
+            if counters is None:
+                return
+
+            counters[1] += 1
+            if counters[1] >= policy.successes_to_recover:
+                del self._counters[key]
+
+    def forget(self, process_spec):
+        """Forget failures of all checks of the process, e.g. when the
+        process is restarted.
+
+        :param dict process_spec: process specification dictionary.
+        """
+
+        with self._lock:
+            for key in list(self._counters):
+                if key[1:] == (process_spec['group'], process_spec['name']):
+                    del self._counters[key]
+
+    @staticmethod
+    def _get_key(check, process_spec):
+
+        return id(check), process_spec['group'], process_spec['name']
+
+
+class RestartDamper(object):
+    """Limits how often every process is restarted. Thread safe.
+
+    Restart which follows the previous one within `max_backoff` seconds
+    continues the streak of restarts, and every restart in the streak doubles
+    the delay before the next one is allowed.
+    """
+
+    def __init__(self, min_interval=0, backoff=0,
+                 max_backoff=DEFAULT_MAX_RESTART_BACKOFF):
+        """Constructor.
+
+        :param float min_interval: minimum interval between restarts of the
+               process, seconds.
+        :param float backoff: delay before the second restart in the streak,
+               seconds. 0 disables exponential backoff.
+        :param float max_backoff: maximum delay between restarts, seconds.
+        """
+
+        self._min_interval = min_interval
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        # namespec -> (last restart time, number of restarts in streak)
+        self._restarts = {}
+        self._lock = threading.Lock()
+
+    def get_delay(self, process_spec, now=None):
+        """Get time left until the process may be restarted.
+
+        :param dict process_spec: process specification dictionary.
+        :param float now: current monotonic time.
+
+        :return: seconds, 0 if process may be restarted now.
+        :rtype: float
+        """
+
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last_restart = self._restarts.get(self._get_key(process_spec))
+
+        if last_restart is None:
+            return 0
+
+        restarted_at, streak = last_restart
+
+        return max(restarted_at + self._get_interval(streak) - now, 0)
+
+    def record_restart(self, process_spec, now=None):
+        """Record process restart.
+
+        :param dict process_spec: process specification dictionary.
+        :param float now: current monotonic time.
+        """
+
+        now = time.monotonic() if now is None else now
+        key = self._get_key(process_spec)
+        with self._lock:
+            self._evict(now)
+
+            restarted_at, streak = self._restarts.get(key, (None, 0))
+            if restarted_at is None or \
+                    now - restarted_at > self._max_backoff:
+                streak = 0
+
+            self._restarts[key] = (now, streak + 1)
+
+    def _get_interval(self, streak):
+        """Get minimum interval after the restart, which is streak-th in a
+        row.
+        """
+
+        interval = self._min_interval
+        if self._backoff and streak >= 1:
+            interval = max(interval, min(
+                self._backoff * 2 ** (streak - 1), self._max_backoff))
+
+        return interval
+
+    def _evict(self, now):
+        """Forget restarts which don't affect anything anymore. Must be
+        called with lock held.
+        """
+
+        stale_since = now - max(self._max_backoff, self._min_interval)
+        for key, (restarted_at, _) in list(self._restarts.items()):
+            if restarted_at < stale_since:
+                del self._restarts[key]
+
+    @staticmethod
+    def _get_key(process_spec):
+
+        return make_namespec(process_spec['group'], process_spec['name'])
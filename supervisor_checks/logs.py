@@ -0,0 +1,190 @@
+"""Leveled, buffered logging for check runner and check modules.
+
+Messages are formatted lazily, only if their level is enabled, and written
+to STDERR in batches: buffer is flushed when it is full, when a message of
+WARNING level or above is logged, when flush interval has passed since the
+last flush, and explicitly after each tick.
+"""
+
+import datetime
+import json
+import logging
+import sys
+import time
+
+__author__ = 'vovanec@gmail.com'
+
+
+LOG_FORMAT_TEXT = 'text'
+LOG_FORMAT_JSON = 'json'
+LOG_FORMATS = (LOG_FORMAT_TEXT, LOG_FORMAT_JSON)
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+DEFAULT_LOG_LEVEL = 'INFO'
+
+DATE_FORMAT = '%Y/%m/%d %H:%M:%S'
+DEFAULT_BUFFER_SIZE = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class TextFormatter(logging.Formatter):
+    """Format log record as `<date> [<check name>] <check class>: <message>`.
+    """
+
+    def __init__(self, check_name):
+
+        super().__init__()
+        self._check_name = check_name
+
+    def format(self, record):
+
+        msg = record.getMessage()
+        check = getattr(record, 'check', None)
+        if check:
+            msg = '%s: %s' % (check, msg)
+
+        curr_dt = datetime.datetime.fromtimestamp(record.created).strftime(
+            DATE_FORMAT)
+
+        return '%s [%s] %s' % (curr_dt, self._check_name, msg)
+
+
+class JSONFormatter(logging.Formatter):
+    """Format log record as JSON object, one per line.
+    """
+
+    def __init__(self, check_name):
+
+        super().__init__()
+        self._check_name = check_name
+
+    def format(self, record):
+
+        entry = {'time': record.created,
+                 'level': record.levelname,
+                 'check_name': self._check_name,
+                 'message': record.getMessage()}
+
+        check = getattr(record, 'check', None)
+        if check:
+            entry['check'] = check
+
+        return json.dumps(entry, default=str)
+
+
+class BufferedStreamHandler(logging.Handler):
+    """Logging handler which writes formatted records to the stream in
+    batches.
+    """
+
+    def __init__(self, stream=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 flush_level=logging.WARNING):
+        """Constructor.
+
+        :param stream: output stream, STDERR by default.
+        :param int buffer_size: flush buffer when it exceeds that many chars.
+        :param float flush_interval: flush buffer when that many seconds
+               passed since the last flush.
+        :param int flush_level: flush buffer immediately when record of that
+               level or above is logged.
+        """
+
+        super().__init__()
+
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._flush_level = flush_level
+
+        self._buffer = []
+        self._buffered = 0
+        self._flushed_at = time.time()
+
+    def emit(self, record):
+
+        try:
+            line = self.format(record) + '\n'
+            self._buffer.append(line)
+            self._buffered += len(line)
+
+            if (record.levelno >= self._flush_level or
+                    self._buffered >= self._buffer_size or
+                    record.created - self._flushed_at >= self._flush_interval):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+
+        self.acquire()
+        try:
+            if self._buffer:
+                stream = self._stream or sys.stderr
+                stream.write(''.join(self._buffer))
+                stream.flush()
+
+                self._buffer = []
+                self._buffered = 0
+
+            self._flushed_at = time.time()
+        finally:
+            self.release()
+
+    def close(self):
+
+        try:
+            self.flush()
+        finally:
+            super().close()
+
+
+class CheckLoggerAdapter(logging.LoggerAdapter):
+    """Adds check class name to records logged by check module.
+    """
+
+    def process(self, msg, kwargs):
+
+        kwargs['extra'] = self.extra
+
+        return msg, kwargs
+
+
+def make_logger(check_name, level=DEFAULT_LOG_LEVEL,
+                log_format=LOG_FORMAT_TEXT, stream=None):
+    """Create logger writing to STDERR through the buffered handler.
+
+    :param str check_name: the name of check to display in log.
+    :param str level: log level name.
+    :param str log_format: `text` or `json`.
+    :param stream: output stream, STDERR by default.
+
+    :rtype: logging.Logger
+    """
+
+    if log_format not in LOG_FORMATS:
+        raise ValueError('Unsupported log format: %s' % (log_format,))
+
+    formatter_class = (JSONFormatter if log_format == LOG_FORMAT_JSON
+                       else TextFormatter)
+
+    handler = BufferedStreamHandler(stream)
+    handler.setFormatter(formatter_class(check_name))
+
+    # Logger is not registered in logging module hierarchy, so it doesn't
+    # interfere with application logging configuration.
+    logger = logging.Logger('supervisor_checks.%s' % (check_name,),
+                            level=level.upper())
+    logger.addHandler(handler)
+
+    return logger
+
+
+def flush(logger):
+    """Flush all handlers of the logger.
+
+    :param logging.Logger logger: logger.
+    """
+
+    for handler in logger.handlers:
+        handler.flush()
@@ -0,0 +1,347 @@
+"""In-memory check metrics, exposed in Prometheus text format.
+
+Metrics may be scraped from local HTTP endpoint or written to a file for
+node_exporter textfile collector after every tick.
+"""
+
+import bisect
+import collections
+import os
+import tempfile
+import threading
+
+__author__ = 'vovanec@gmail.com'
+
+
+METRIC_PREFIX = 'supervisor_checks'
+METRICS_HOST = '127.0.0.1'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10,
+                           30, 60)
+
+# Check outcomes
+OUTCOME_SUCCESS = 'success'
+OUTCOME_FAILURE = 'failure'
+OUTCOME_EXCEPTION = 'exception'
+OUTCOMES = (OUTCOME_SUCCESS, OUTCOME_FAILURE, OUTCOME_EXCEPTION)
+
+
+class Histogram(object):
+    """Cumulative histogram of observed values. Not thread safe.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """Constructor.
+
+        :param tuple buckets: sorted upper bounds of buckets.
+        """
+
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add observed value.
+
+        :param float value: observed value.
+        """
+
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.counts):
+            self.counts[idx] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """Get the list of tuples (upper bound, number of values less or
+        equal to it), including `+Inf` bucket.
+
+        :rtype: list
+        """
+
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((_format_value(bound), total))
+        result.append(('+Inf', self.count))
+
+        return result
+
+
+class Metrics(object):
+    """Check metrics registry. Thread safe.
+    """
+
+    def __init__(self, latency_buckets=DEFAULT_LATENCY_BUCKETS):
+        """Constructor.
+
+        :param tuple latency_buckets: upper bounds of check latency
+               histogram buckets, seconds.
+        """
+
+        self._latency_buckets = latency_buckets
+        self._lock = threading.Lock()
+
+        # (check name, process name) -> Histogram
+        self._check_latency = {}
+        # (check name, process name, outcome) -> int
+        self._check_outcomes = collections.Counter()
+        # process name -> int
+        self._restarts = collections.Counter()
+        self._tick_duration = Histogram(latency_buckets)
+        self._skipped_ticks = 0
+        # process name -> int
+        self._abandoned = collections.Counter()
+        # Callables returning the list of tuples (check name, target, retries)
+        self._retry_sources = []
+
+    def observe_check(self, check_name, process_name, outcome, latency):
+        """Record check run.
+
+        :param str check_name: check NAME.
+        :param str process_name: checked process name.
+        :param str outcome: one of OUTCOMES.
+        :param float latency: check duration, seconds.
+        """
+
+        key = (check_name, process_name)
+        with self._lock:
+            histogram = self._check_latency.get(key)
+            if histogram is None:
+                histogram = self._check_latency[key] = Histogram(
+                    self._latency_buckets)
+
+            histogram.observe(latency)
+            self._check_outcomes[(check_name, process_name, outcome)] += 1
+
+    def observe_restart(self, process_name):
+        """Record process restart.
+
+        :param str process_name: restarted process name.
+        """
+
+        with self._lock:
+            self._restarts[process_name] += 1
+
+    def observe_tick(self, duration):
+        """Record tick duration.
+
+        :param float duration: time spent to check all processes, seconds.
+        """
+
+        with self._lock:
+            self._tick_duration.observe(duration)
+
+    def observe_skipped_tick(self):
+        """Record stale tick skipped.
+        """
+
+        with self._lock:
+            self._skipped_ticks += 1
+
+    def observe_abandoned(self, process_name):
+        """Record checks of the process abandoned at the tick deadline.
+
+        :param str process_name: checked process name.
+        """
+
+        with self._lock:
+            self._abandoned[process_name] += 1
+
+    def add_retry_source(self, source):
+        """Register source of retry counters, called on every render.
+
+        :param () -> list source: returns the list of tuples (check name,
+               target name, number of retries).
+        """
+
+        self._retry_sources.append(source)
+
+    def render(self):
+        """Render metrics in Prometheus text exposition format.
+
+        :rtype: str
+        """
+
+        lines = []
+
+        with self._lock:
+            _render_header(lines, 'check_duration_seconds', 'histogram',
+                           'Check duration.')
+            for (check_name, process_name), histogram in sorted(
+                    self._check_latency.items()):
+                _render_histogram(lines, 'check_duration_seconds', histogram,
+                                  check=check_name, process=process_name)
+
+            _render_header(lines, 'checks_total', 'counter',
+                           'Number of check runs by outcome.')
+            for (check_name, process_name, outcome), count in sorted(
+                    self._check_outcomes.items()):
+                _render_sample(lines, 'checks_total', count, check=check_name,
+                               process=process_name, outcome=outcome)
+
+            _render_header(lines, 'restarts_total', 'counter',
+                           'Number of process restarts queued by checks.')
+            for process_name, count in sorted(self._restarts.items()):
+                _render_sample(lines, 'restarts_total', count,
+                               process=process_name)
+
+            _render_header(lines, 'tick_duration_seconds', 'histogram',
+                           'Time spent to check all processes on tick.')
+            _render_histogram(lines, 'tick_duration_seconds',
+                              self._tick_duration)
+
+            _render_header(lines, 'ticks_skipped_total', 'counter',
+                           'Number of stale ticks skipped.')
+            _render_sample(lines, 'ticks_skipped_total', self._skipped_ticks)
+
+            _render_header(lines, 'checks_abandoned_total', 'counter',
+                           'Number of times checks of the process were '
+                           'abandoned at the tick deadline.')
+            for process_name, count in sorted(self._abandoned.items()):
+                _render_sample(lines, 'checks_abandoned_total', count,
+                               process=process_name)
+
+        _render_header(lines, 'check_retries_total', 'counter',
+                       'Number of retries made by checks.')
+        for source in self._retry_sources:
+            for check_name, target_name, retries in source():
+                _render_sample(lines, 'check_retries_total', retries,
+                               check=check_name, target=target_name)
+
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Atomically write metrics to the file, to be picked up by
+        node_exporter textfile collector.
+
+        :param str path: file path.
+        """
+
+        dir_name, file_name = os.path.split(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.%s.' % (file_name,),
+                                        dir=dir_name)
+        try:
+            with os.fdopen(fd, 'w') as fobj:
+                fobj.write(self.render())
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class MetricsServer(object):
+    """Serves metrics over HTTP in background thread.
+    """
+
+    def __init__(self, metrics, port, host=METRICS_HOST):
+        """Constructor.
+
+        :param Metrics metrics: metrics registry.
+        :param int port: port to listen on.
+        :param str host: address to listen on, localhost by default.
+        """
+
+        # Imported here, so that listeners which don't serve metrics don't
+        # pay for HTTP server modules.
+        import http.server
+
+        self._metrics = metrics
+        self._server = http.server.ThreadingHTTPServer(
+            (host, port), self._make_handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        """Start serving in background thread.
+        """
+
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='metrics-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close listening socket.
+        """
+
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+
+        self._server.server_close()
+
+    def _make_handler_class(self):
+
+        import http.server
+
+        metrics = self._metrics
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                body = metrics.render().encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                # Don't pollute listener STDERR with access log.
+                pass
+
+        return MetricsHandler
+
+
+def _render_header(lines, name, metric_type, help_text):
+
+    lines.append('# HELP %s_%s %s' % (METRIC_PREFIX, name, help_text))
+    lines.append('# TYPE %s_%s %s' % (METRIC_PREFIX, name, metric_type))
+
+
+def _render_histogram(lines, name, histogram, **labels):
+
+    for bound, count in histogram.cumulative_counts():
+        _render_sample(lines, name + '_bucket', count, le=bound, **labels)
+
+    _render_sample(lines, name + '_sum', histogram.sum, **labels)
+    _render_sample(lines, name + '_count', histogram.count, **labels)
+
+
+def _render_sample(lines, name, value, **labels):
+
+    if labels:
+        label_str = '{%s}' % (','.join(
+            '%s="%s"' % (label, _escape_label(label_value))
+            for label, label_value in sorted(labels.items())),)
+    else:
+        label_str = ''
+
+    lines.append('%s_%s%s %s' % (METRIC_PREFIX, name, label_str,
+                                 _format_value(value)))
+
+
+def _escape_label(value):
+
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+
+    if isinstance(value, float):
+        return repr(value)
+
+    return str(value)
@@ -0,0 +1,160 @@
+"""Snapshot of the host process tree, taken in single pass over /proc.
+
+Cumulative memory usage of the process is the sum over the process and all
+its descendants. psutil finds descendants by scanning every pid on the host,
+so checking many processes costs many full scans per tick. Snapshot reads
+parent pid and RSS of all processes once and is shared by all checks within
+the tick: checks expire it in prepare(), and the next check run takes a new
+one.
+"""
+
+import os
+import threading
+
+__author__ = 'vovanec@gmail.com'
+
+
+PROC_ROOT = '/proc'
+
+# Field of /proc/<pid>/stat after the command name, counting from state.
+_PPID_FIELD = 1
+# Field of /proc/<pid>/statm, the same psutil reads RSS from.
+_RSS_FIELD = 1
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class ProcessTreeSnapshot(object):
+    """Parent pid and RSS of every process on the host.
+    """
+
+    def __init__(self, ppids, rss):
+        """Constructor.
+
+        :param dict ppids: pid -> parent pid.
+        :param dict rss: pid -> RSS, bytes.
+        """
+
+        self._rss = rss
+        self._children = {}
+        for pid, ppid in ppids.items():
+            self._children.setdefault(ppid, []).append(pid)
+
+    @classmethod
+    def take(cls, proc_root=PROC_ROOT):
+        """Read all processes from /proc.
+
+        :param str proc_root: procfs mount point.
+
+        :rtype: ProcessTreeSnapshot
+        """
+
+        ppids = {}
+        rss = {}
+        for entry in os.scandir(proc_root):
+            if not entry.name.isdigit():
+                continue
+
+            try:
+                with open(os.path.join(entry.path, 'stat'), 'rb') as fobj:
+                    stat = fobj.read()
+                with open(os.path.join(entry.path, 'statm'), 'rb') as fobj:
+                    statm = fobj.read()
+            except OSError:
+                # Process has exited.
+                continue
+
+            # Command name may contain spaces and parentheses.
+            stat_fields = stat[stat.rfind(b')') + 2:].split()
+
+            pid = int(entry.name)
+            ppids[pid] = int(stat_fields[_PPID_FIELD])
+            rss[pid] = int(statm.split()[_RSS_FIELD]) * _PAGE_SIZE
+
+        return cls(ppids, rss)
+
+    def __contains__(self, pid):
+
+        return pid in self._rss
+
+    def get_descendants(self, pid):
+        """Get pids of all descendants of the process.
+
+        :param int pid: process id.
+
+        :rtype: list
+        """
+
+        descendants = []
+        pids = list(self._children.get(pid, ()))
+        while pids:
+            pid = pids.pop()
+            descendants.append(pid)
+            pids.extend(self._children.get(pid, ()))
+
+        return descendants
+
+    def get_cumulative_rss(self, pid):
+        """Get RSS of the process and all its descendants.
+
+        :param int pid: process id.
+
+        :return: RSS in bytes or None if process is not in snapshot.
+        :rtype: int|None
+        """
+
+        if pid not in self._rss:
+            return None
+
+        return self._rss[pid] + sum(self._rss[child_pid] for child_pid in
+                                    self.get_descendants(pid))
+
+
+class SnapshotCache(object):
+    """Shares snapshot between checks of single tick. Thread safe.
+    """
+
+    def __init__(self, proc_root=PROC_ROOT):
+        """Constructor.
+
+        :param str proc_root: procfs mount point.
+        """
+
+        self._proc_root = proc_root
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Get snapshot of the current tick, taking new one if it has been
+        expired.
+
+        :rtype: ProcessTreeSnapshot
+        """
+
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = ProcessTreeSnapshot.take(self._proc_root)
+
+            return self._snapshot
+
+    def expire(self):
+        """Expire snapshot on new tick. Called by every check using the
+        snapshot before any check of the tick is run, so all of them share
+        single snapshot, however long the tick period is.
+        """
+
+        with self._lock:
+            self._snapshot = None
+
+
+def is_supported(proc_root=PROC_ROOT):
+    """Whether process snapshots can be taken on this host.
+
+    :rtype: bool
+    """
+
+    return os.path.isfile(os.path.join(proc_root, 'self', 'stat'))
+
+
+# Shared by all memory checks of the listener.
+snapshot_cache = SnapshotCache()
@@ -0,0 +1,173 @@
+"""Cached table of processes running under SupervisorD.
+"""
+
+import threading
+
+from supervisor.states import ProcessStates
+
+__author__ = 'vovanec@gmail.com'
+
+
+# Process spec keys
+STATE_KEY = 'state'
+STATE_NAME_KEY = 'statename'
+NAME_KEY = 'name'
+GROUP_KEY = 'group'
+PID_KEY = 'pid'
+
+# Event payload keys
+EVENT_PROCESS_NAME_KEY = 'processname'
+EVENT_GROUP_NAME_KEY = 'groupname'
+EVENT_PID_KEY = 'pid'
+
+PROCESS_STATE_EVENT_PREFIX = 'PROCESS_STATE_'
+PROCESS_GROUP_EVENTS = set(['PROCESS_GROUP_ADDED', 'PROCESS_GROUP_REMOVED'])
+
+DEFAULT_RESYNC_TICKS = 1
+
+
+class ProcessTable(object):
+    """Process table cache indexed by group and by (group, name).
+
+    Table is updated incrementally from PROCESS_STATE_* events. The full
+    table is re-read from SupervisorD every `resync_ticks` ticks, or on the
+    next tick after mismatch has been detected.
+    """
+
+    def __init__(self, rpc_client, resync_ticks=DEFAULT_RESYNC_TICKS):
+        """Constructor.
+
+        :param rpc_client: SupervisorD XML RPC client.
+        :param int resync_ticks: re-read full process table every that many
+               ticks.
+        """
+
+        self._rpc_client = rpc_client
+        self._resync_ticks = resync_ticks
+        self._ticks_since_resync = 0
+        self._valid = False
+        self._lock = threading.Lock()
+
+        self._by_name = {}
+        self._by_group = {}
+
+    def tick(self):
+        """Called once per tick, before table lookups. Re-read full process
+        table if it's time to or if table is invalid.
+
+        :return: True if process table was re-read.
+        :rtype: bool
+        """
+
+        with self._lock:
+            self._ticks_since_resync += 1
+            if (self._valid and
+                    self._ticks_since_resync < self._resync_ticks):
+                return False
+
+        self.resync()
+
+        return True
+
+    def resync(self):
+        """Re-read full process table from SupervisorD.
+        """
+
+        process_specs = self._rpc_client.supervisor.getAllProcessInfo()
+
+        by_name = {}
+        by_group = {}
+        for process_spec in process_specs:
+            key = (process_spec[GROUP_KEY], process_spec[NAME_KEY])
+            by_name[key] = process_spec
+            by_group.setdefault(process_spec[GROUP_KEY], {})[
+                process_spec[NAME_KEY]] = process_spec
+
+        with self._lock:
+            self._by_name = by_name
+            self._by_group = by_group
+            self._ticks_since_resync = 0
+            self._valid = True
+
+    def invalidate(self):
+        """Force full re-read of process table on the next tick.
+        """
+
+        with self._lock:
+            self._valid = False
+
+    def handle_event(self, event_type, event_headers):
+        """Update process table from SupervisorD event.
+
+        :param str event_type: event name, e.g. PROCESS_STATE_RUNNING.
+        :param dict event_headers: event payload headers.
+
+        :return: True if event was relevant for process table.
+        :rtype: bool
+        """
+
+        if event_type in PROCESS_GROUP_EVENTS:
+            self.invalidate()
+            return True
+
+        if not event_type.startswith(PROCESS_STATE_EVENT_PREFIX):
+            return False
+
+        state_name = event_type[len(PROCESS_STATE_EVENT_PREFIX):]
+        state = getattr(ProcessStates, state_name, None)
+        key = (event_headers.get(EVENT_GROUP_NAME_KEY),
+               event_headers.get(EVENT_PROCESS_NAME_KEY))
+
+        with self._lock:
+            process_spec = self._by_name.get(key)
+            if state is None or process_spec is None:
+                # Unknown process or state: table is out of sync.
+                self._valid = False
+                return True
+
+            process_spec = dict(process_spec)
+            process_spec[STATE_KEY] = state
+            process_spec[STATE_NAME_KEY] = state_name
+            if EVENT_PID_KEY in event_headers:
+                process_spec[PID_KEY] = int(event_headers[EVENT_PID_KEY])
+
+            self._by_name[key] = process_spec
+            self._by_group[key[0]][key[1]] = process_spec
+
+        return True
+
+    def get_group(self, group, state=None):
+        """Get processes of the group.
+
+        :param str group: process group name.
+        :param int state: return processes only in that state.
+
+        :rtype: list
+        """
+
+        with self._lock:
+            process_specs = list(self._by_group.get(group, {}).values())
+
+        return [process_spec for process_spec in process_specs
+                if state is None or process_spec[STATE_KEY] == state]
+
+    def get_process(self, group, name, state=None):
+        """Get process by group and name.
+
+        :param str group: process group name.
+        :param str name: process name.
+        :param int state: return process only in that state.
+
+        :rtype: dict|None
+        """
+
+        with self._lock:
+            process_spec = self._by_name.get((group, name))
+
+        if process_spec is None:
+            return None
+
+        if state is not None and process_spec[STATE_KEY] != state:
+            return None
+
+        return process_spec
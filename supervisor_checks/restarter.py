@@ -0,0 +1,240 @@
+"""Restart queue: restarts processes in background with bounded concurrency.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+from supervisor.options import make_namespec
+from supervisor.states import ProcessStates
+
+from supervisor_checks.compat import xmlrpclib
+
+__author__ = 'vovanec@gmail.com'
+
+
+DEFAULT_MAX_RESTARTS = 4
+STOP_POLL_INTERVAL = 0.5
+# Supervisor kills process which didn't stop within `stopwaitsecs`, so this
+# is only a safety net.
+STOP_TIMEOUT = 300
+
+STOPPED_STATES = (ProcessStates.STOPPED, ProcessStates.EXITED,
+                  ProcessStates.FATAL)
+
+
+class RestartQueue(object):
+    """Restarts processes in background worker threads, so that slow
+    stopping process doesn't hold check workers.
+
+    Not more than `max_restarts` processes are restarted at once. Restart
+    request for the process which is already queued or being restarted is
+    ignored. If `max_group_restarts` is set, restart request is deferred
+    while that many processes of the same group are queued or being
+    restarted, so that a blip of a shared dependency doesn't take down the
+    whole group: the process is restarted when it fails the check again.
+    All workers share single SupervisorD RPC client. Process is stopped and
+    started using non-blocking RPC calls, so the client is only locked for
+    the duration of a call, not for the duration of process stop.
+    """
+
+    def __init__(self, rpc_client, log, max_restarts=DEFAULT_MAX_RESTARTS,
+                 on_restart=None, max_group_restarts=None, warn=None):
+        """Constructor.
+
+        :param rpc_client: SupervisorD XML RPC client.
+        :param (str) -> None log: logging function.
+        :param int max_restarts: maximum number of concurrent restarts.
+        :param () -> None on_restart: called after each process restart.
+        :param int|float max_group_restarts: maximum number of concurrent
+               restarts of processes of single group, or fraction of the
+               group's processes if less than 1. Default: no limit.
+        :param (str) -> None warn: logging function for deferred restarts.
+               Default: log.
+        """
+
+        self._rpc_client = rpc_client
+        self._rpc_lock = threading.Lock()
+        self._log = log
+        self._warn = warn or log
+        self._max_restarts = max_restarts
+        self._max_group_restarts = group_limit(max_group_restarts)
+        self._on_restart = on_restart
+
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_by_group = collections.Counter()
+        self._pending_lock = threading.Lock()
+        self._workers = []
+
+    def submit(self, process_spec, group_size=None):
+        """Queue process restart.
+
+        :param dict process_spec: process specification dictionary of the
+               process which failed the check.
+        :param int group_size: number of processes in the process group,
+               used when group limit is a fraction.
+
+        :return: False if restart of the process is already pending, or
+                 deferred because of group limit.
+        :rtype: bool
+        """
+
+        group = process_spec['group']
+        name_spec = make_namespec(group, process_spec['name'])
+
+        with self._pending_lock:
+            if name_spec in self._pending:
+                self._log('Restart of process %s is already pending.',
+                          name_spec)
+                return False
+
+            max_pending = self._get_group_limit(group_size)
+            if (max_pending is not None and
+                    self._pending_by_group[group] >= max_pending):
+                self._warn('%s processes of group %s are being restarted, '
+                           'deferring restart of process %s.',
+                           self._pending_by_group[group], group, name_spec)
+                return False
+
+            self._pending.add(name_spec)
+            self._pending_by_group[group] += 1
+            if len(self._workers) < self._max_restarts:
+                self._start_worker()
+
+        self._log('Queued restart of process %s', name_spec)
+        self._queue.put((group, name_spec, process_spec.get('pid')))
+
+        return True
+
+    def _get_group_limit(self, group_size):
+        """Get maximum number of concurrent restarts in the group.
+
+        :param int group_size: number of processes in the group.
+
+        :rtype: int|None
+        """
+
+        if self._max_group_restarts is None:
+            return None
+
+        if isinstance(self._max_group_restarts, int):
+            return self._max_group_restarts
+
+        # Fraction of the group, but never block restarts completely.
+        return max(1, int(self._max_group_restarts * (group_size or 0)))
+
+    def stop(self):
+        """Stop worker threads. Restarts in progress are not waited for.
+        """
+
+        with self._pending_lock:
+            for _ in self._workers:
+                self._queue.put(None)
+            self._workers = []
+
+    def _start_worker(self):
+
+        worker = threading.Thread(target=self._worker, name='restart-worker')
+        worker.daemon = True
+        worker.start()
+        self._workers.append(worker)
+
+    def _worker(self):
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            group, name_spec, pid = item
+            try:
+                self._restart_process(name_spec, pid)
+            except Exception as exc:
+                self._log('Failed to restart process %s: %s', name_spec, exc)
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(name_spec)
+                    self._pending_by_group[group] -= 1
+                    if not self._pending_by_group[group]:
+                        del self._pending_by_group[group]
+
+    def _restart_process(self, name_spec, pid):
+        """Restart a process.
+        """
+
+        process_spec = self._call('getProcessInfo', name_spec)
+        if process_spec['state'] != ProcessStates.RUNNING:
+            self._log('%s not in RUNNING state, cannot restart', name_spec)
+            return
+
+        if pid is not None and process_spec['pid'] != pid:
+            self._log('%s has been restarted since the check failed, '
+                      'skipping restart', name_spec)
+            return
+
+        self._log('Trying to stop process %s', name_spec)
+        try:
+            self._call('stopProcess', name_spec, False)
+            if self._wait_stopped(name_spec):
+                self._log('Stopped process %s', name_spec)
+            else:
+                self._log('Process %s did not stop within %s seconds',
+                          name_spec, STOP_TIMEOUT)
+        except xmlrpclib.Fault as exc:
+            self._log('Failed to stop process %s: %s', name_spec, exc)
+
+        try:
+            self._log('Starting process %s', name_spec)
+            self._call('startProcess', name_spec, False)
+        except xmlrpclib.Fault as exc:
+            self._log('Failed to start process %s: %s', name_spec, exc)
+
+        if self._on_restart is not None:
+            self._on_restart()
+
+    def _wait_stopped(self, name_spec):
+        """Wait until process is stopped.
+
+        :rtype: bool
+        """
+
+        deadline = time.time() + STOP_TIMEOUT
+        while time.time() < deadline:
+            if self._call('getProcessInfo', name_spec)['state'] in \
+                    STOPPED_STATES:
+                return True
+            time.sleep(STOP_POLL_INTERVAL)
+
+        return False
+
+    def _call(self, method_name, *args):
+        """Call SupervisorD RPC method using shared client.
+        """
+
+        with self._rpc_lock:
+            return getattr(self._rpc_client.supervisor, method_name)(*args)
+
+
+def group_limit(value):
+    """Parse group restarts limit: positive integer, or fraction of the
+    group's processes between 0 and 1.
+
+    :param int|float|str|None value: limit.
+
+    :rtype: int|float|None
+    :raise ValueError: if limit is invalid.
+    """
+
+    if value is None:
+        return None
+
+    limit = float(value)
+    if limit >= 1 and limit == int(limit):
+        return int(limit)
+    if 0 < limit < 1:
+        return limit
+
+    raise ValueError('Group restarts limit must be positive integer or '
+                     'fraction between 0 and 1: %r' % (value,))
@@ -0,0 +1,361 @@
+"""Caching of check results.
+
+Every check config may contain optional `cache` dictionary:
+
+    {"http": {"port": 8080, "url": "/ping",
+              "cache": {"ttl": 10, "backend": "file"}}}
+
+  * ttl - reuse result of the check for the same process for that many
+    seconds.
+  * backend - `memory` to share results between checks of single listener,
+    e.g. identical checks of many targets in multi check, or `file` to also
+    share them with other listeners on the host. Default is `memory`.
+  * path - directory the `file` backend keeps results in. Default is
+    /dev/shm/supervisor_checks-results-<uid>, so that results are never
+    written back to disk. Directory must be owned by the listener user and
+    not writable by others, otherwise results are not cached.
+
+Results are keyed by check name, check config except for scheduling, restart
+and cache parameters, and process pid, so that only identical checks of the
+same process share results. Checks which keep state between runs, such as
+memory growth check, can't be cached. Reused results are returned wrapped in
+CachedResult, so that check runner doesn't count them as new outcomes.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from supervisor_checks import errors
+from supervisor_checks import hysteresis
+from supervisor_checks import scheduler
+
+__author__ = 'vovanec@gmail.com'
+
+
+CACHE_KEY = 'cache'
+BACKEND_MEMORY = 'memory'
+BACKEND_FILE = 'file'
+BACKENDS = (BACKEND_MEMORY, BACKEND_FILE)
+
+SHM_DIR = '/dev/shm'
+RESULTS_DIR_NAME = 'supervisor_checks-results'
+# How often expired results are removed, seconds.
+EVICT_INTERVAL = 60
+
+# Config parameters which don't affect check result.
+_IGNORED_PARAMS = (CACHE_KEY, scheduler.SCHEDULE_KEY, hysteresis.RESTART_KEY)
+_RESULTS = {b'1': True, b'0': False}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class CachePolicy(object):
+    """Caching parameters of single check.
+    """
+
+    def __init__(self, ttl, backend=BACKEND_MEMORY, path=None):
+        """Constructor.
+
+        :param float ttl: reuse check result for that many seconds.
+        :param str backend: `memory` or `file`.
+        :param str path: results directory of `file` backend.
+        """
+
+        self.ttl = ttl
+        self.backend = backend
+        self.path = path
+
+    @classmethod
+    def from_config(cls, check_name, check_config, stateful=False):
+        """Create cache policy from check config.
+
+        :param str check_name: check name.
+        :param dict check_config: check config.
+        :param bool stateful: whether check keeps state between runs, in
+               which case its results can't be cached.
+
+        :return: cache policy, or None if results are not cached.
+        :rtype: CachePolicy|None
+        """
+
+        cache_config = check_config.get(CACHE_KEY)
+        if cache_config is None:
+            return None
+
+        if stateful:
+            raise errors.InvalidCheckConfig(
+                '`%s` parameter is not supported by %s check which keeps '
+                'state between runs with this config.' % (CACHE_KEY,
+                                                          check_name))
+
+        if not isinstance(cache_config, dict):
+            raise errors.InvalidCheckConfig(
+                '`%s` parameter must be dictionary type in %s check config.'
+                % (CACHE_KEY, check_name))
+
+        ttl = cache_config.get('ttl')
+        if not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise errors.InvalidCheckConfig(
+                'Required `ttl` cache parameter must be positive number in %s '
+                'check config.' % (check_name,))
+
+        backend = cache_config.get('backend', BACKEND_MEMORY)
+        if backend not in BACKENDS:
+            raise errors.InvalidCheckConfig(
+                '`backend` cache parameter must be one of %s in %s check '
+                'config.' % (', '.join(BACKENDS), check_name))
+
+        path = cache_config.get('path')
+        if path is not None and not isinstance(path, str):
+            raise errors.InvalidCheckConfig(
+                '`path` cache parameter must be string type in %s check '
+                'config.' % (check_name,))
+
+        return cls(ttl, backend=backend, path=path)
+
+
+class CachedResult(object):
+    """Check result reused from cache. Truth value is that of the result.
+    """
+
+    __slots__ = ('result',)
+
+    def __init__(self, result):
+        """Constructor.
+
+        :param bool result: cached check result.
+        """
+
+        self.result = result
+
+    def __bool__(self):
+
+        return self.result
+
+    def __repr__(self):
+
+        return 'CachedResult(%r)' % (self.result,)
+
+
+class MemoryResultCache(object):
+    """Results cache of single listener. Thread safe.
+    """
+
+    def __init__(self):
+
+        # key -> (result, expiration time)
+        self._results = {}
+        self._lock = threading.Lock()
+        self._evicted_at = time.monotonic()
+
+    def get(self, key):
+        """Get cached result.
+
+        :param str key: result key.
+
+        :return: check result, or None if there's no fresh result.
+        :rtype: bool|None
+        """
+
+        with self._lock:
+            result, expires_at = self._results.get(key, (None, 0))
+
+        return result if expires_at > time.monotonic() else None
+
+    def set(self, key, result, ttl):
+        """Cache result.
+
+        :param str key: result key.
+        :param bool result: check result.
+        :param float ttl: result lifetime, seconds.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            self._results[key] = (result, now + ttl)
+            if now - self._evicted_at > EVICT_INTERVAL:
+                self._evicted_at = now
+                for stale_key, (_, expires_at) in list(self._results.items()):
+                    if expires_at <= now:
+                        del self._results[stale_key]
+
+
+class FileResultCache(object):
+    """Results cache shared by listeners on the host: every result is a file
+    in results directory, and its modification time is the expiration time.
+    """
+
+    def __init__(self, path=None):
+        """Constructor.
+
+        :param str path: results directory. Default: get_default_path()
+        """
+
+        self.path = path or get_default_path()
+        self._evicted_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._is_trusted = False
+
+    def get(self, key):
+        """Get cached result.
+
+        :param str key: result key.
+
+        :return: check result, or None if there's no fresh result.
+        :rtype: bool|None
+        """
+
+        if not self._check_dir(create=False):
+            return None
+
+        try:
+            with open(os.path.join(self.path, key), 'rb') as fobj:
+                if os.fstat(fobj.fileno()).st_mtime <= time.time():
+                    return None
+
+                return _RESULTS.get(fobj.read())
+        except OSError:
+            return None
+
+    def set(self, key, result, ttl):
+        """Cache result. Errors are ignored: the result is just not cached.
+
+        :param str key: result key.
+        :param bool result: check result.
+        :param float ttl: result lifetime, seconds.
+        """
+
+        if not self._check_dir(create=True):
+            return
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.')
+            try:
+                os.write(fd, b'1' if result else b'0')
+                expires_at = time.time() + ttl
+                os.utime(fd, (expires_at, expires_at))
+            finally:
+                os.close(fd)
+            # Readers never see partially written result.
+            os.replace(tmp_path, os.path.join(self.path, key))
+        except OSError:
+            return
+
+        self._maybe_evict()
+
+    def _check_dir(self, create):
+        """Check that results directory is owned by the current user and
+        can't be written by others, who could plant fake results.
+
+        :param bool create: create directory if it doesn't exist.
+
+        :rtype: bool
+        """
+
+        if self._is_trusted:
+            return True
+
+        try:
+            if create:
+                os.makedirs(self.path, mode=0o700, exist_ok=True)
+            dir_stat = os.lstat(self.path)
+        except OSError:
+            return False
+
+        self._is_trusted = (stat.S_ISDIR(dir_stat.st_mode) and
+                            dir_stat.st_uid == os.geteuid() and
+                            not dir_stat.st_mode & (stat.S_IWGRP |
+                                                    stat.S_IWOTH))
+
+        return self._is_trusted
+
+    def _maybe_evict(self):
+        """Remove expired results once in a while.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._evicted_at <= EVICT_INTERVAL:
+                return
+            self._evicted_at = now
+
+        wall_now = time.time()
+        try:
+            for entry in os.scandir(self.path):
+                try:
+                    if entry.stat().st_mtime <= wall_now:
+                        os.unlink(entry.path)
+                except OSError:
+                    # Removed by another listener.
+                    continue
+        except OSError:
+            pass
+
+
+def get_default_path():
+    """Default results directory of `file` backend.
+
+    :rtype: str
+    """
+
+    root_dir = SHM_DIR if os.path.isdir(SHM_DIR) else tempfile.gettempdir()
+
+    return os.path.join(root_dir, '%s-%s' % (RESULTS_DIR_NAME, os.geteuid()))
+
+
+def is_cached(result):
+    """Whether check result has been reused from cache.
+
+    :param bool|CachedResult result: check result.
+
+    :rtype: bool
+    """
+
+    return isinstance(result, CachedResult)
+
+
+def get_cache(policy):
+    """Get cache for the policy. Checks with the same backend share cache.
+
+    :param CachePolicy policy: cache policy.
+
+    :rtype: MemoryResultCache|FileResultCache
+    """
+
+    cache_id = (policy.backend, policy.path)
+    with _caches_lock:
+        cache = _caches.get(cache_id)
+        if cache is None:
+            if policy.backend == BACKEND_FILE:
+                cache = FileResultCache(policy.path)
+            else:
+                cache = MemoryResultCache()
+            _caches[cache_id] = cache
+
+    return cache
+
+
+def make_key(check_name, check_config, process_spec):
+    """Make key of check result.
+
+    :param str check_name: check name.
+    :param dict check_config: check config.
+    :param dict process_spec: process specification dictionary.
+
+    :rtype: str
+    """
+
+    normalized_config = json.dumps(
+        {param: value for param, value in check_config.items()
+         if param not in _IGNORED_PARAMS},
+        sort_keys=True, default=str)
+
+    key = '%s\0%s\0%s' % (check_name, normalized_config, process_spec['pid'])
+
+    return hashlib.sha1(key.encode()).hexdigest()
@@ -0,0 +1,141 @@
+"""Per-check scheduling of checks across TICK events.
+
+Every check config may contain optional `schedule` dictionary:
+
+    {"tcp": {"port": 8080, "schedule": {"interval": 5, "timeout": 3}},
+     "memory": {"max_rss": 102400, "schedule": {"interval": 60, "jitter": 30}}}
+
+  * interval - run check not more often than once in that many seconds, must
+    be positive. By default check is run on every tick.
+  * jitter - delay the first run of the check by random number of seconds, up
+    to that many, so that checks of many processes are spread across ticks.
+    Every process keeps its offset, so the check is still run once per
+    interval.
+  * timeout - consider check failed if it didn't complete within that many
+    seconds, must be positive.
+  * gating - run the check before non-gating checks of the same process. If
+    any gating check fails, the rest of checks are skipped.
+
+Since checks are run on TICK events only, interval and jitter resolution is
+the tick period listener is subscribed to.
+"""
+
+import random
+import threading
+import time
+
+from supervisor_checks import errors
+
+__author__ = 'vovanec@gmail.com'
+
+
+SCHEDULE_KEY = 'schedule'
+# Check is due if it's scheduled to run within that many seconds, so that
+# ticks arriving slightly earlier than scheduled are not skipped.
+SCHEDULE_TOLERANCE = 1.0
+
+
+class CheckSchedule(object):
+    """Scheduling parameters of single check.
+    """
+
+    def __init__(self, interval=None, jitter=0, timeout=None, gating=False):
+        """Constructor.
+
+        :param float interval: run check once in that many seconds.
+        :param float jitter: maximum random delay of the first check run,
+               seconds.
+        :param float timeout: check timeout, seconds.
+        :param bool gating: whether other checks depend on this check.
+        """
+
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.gating = gating
+
+    @classmethod
+    def from_config(cls, check_name, check_config):
+        """Create schedule from check config.
+
+        :param str check_name: check name.
+        :param dict check_config: check config.
+
+        :rtype: CheckSchedule
+        """
+
+        schedule_config = check_config.get(SCHEDULE_KEY) or {}
+        if not isinstance(schedule_config, dict):
+            raise errors.InvalidCheckConfig(
+                '`%s` parameter must be dictionary type in %s check config.'
+                % (SCHEDULE_KEY, check_name))
+
+        for param in ('interval', 'timeout'):
+            value = schedule_config.get(param)
+            if value is not None and (not isinstance(value, (int, float)) or
+                                      value <= 0):
+                raise errors.InvalidCheckConfig(
+                    '`%s` schedule parameter must be positive number in %s '
+                    'check config.' % (param, check_name))
+
+        jitter = schedule_config.get('jitter')
+        if jitter is not None and (not isinstance(jitter, (int, float)) or
+                                   jitter < 0):
+            raise errors.InvalidCheckConfig(
+                '`jitter` schedule parameter must be non-negative number in '
+                '%s check config.' % (check_name,))
+
+        if not isinstance(schedule_config.get('gating', False), bool):
+            raise errors.InvalidCheckConfig(
+                '`gating` schedule parameter must be boolean type in %s check '
+                'config.' % (check_name,))
+
+        return cls(interval=schedule_config.get('interval'),
+                   jitter=schedule_config.get('jitter') or 0,
+                   timeout=schedule_config.get('timeout'),
+                   gating=schedule_config.get('gating', False))
+
+
+class Scheduler(object):
+    """Keeps track of next run time of every (check, process) pair. Thread
+    safe.
+    """
+
+    def __init__(self):
+
+        self._next_run = {}
+        self._lock = threading.Lock()
+
+    def is_due(self, check, schedule, process_spec, now=None):
+        """Whether the check is due for the process. If it is, the next run
+        is scheduled.
+
+        :param BaseCheck check: check instance.
+        :param CheckSchedule schedule: check schedule.
+        :param dict process_spec: process specification dictionary.
+        :param float now: current timestamp.
+
+        :rtype: bool
+        """
+
+        if schedule.interval is None and not schedule.jitter:
+            return True
+
+        now = time.time() if now is None else now
+        key = (id(check), process_spec['group'], process_spec['name'])
+
+        with self._lock:
+            next_run = self._next_run.get(key)
+            if next_run is None:
+                # First sight of the process: spread first runs within
+                # jitter. Later runs keep the offset, so that jitter doesn't
+                # stretch the interval.
+                next_run = now + random.uniform(0, schedule.jitter)
+                self._next_run[key] = next_run
+
+            if next_run - now > SCHEDULE_TOLERANCE:
+                return False
+
+            self._next_run[key] = now + (schedule.interval or 0)
+
+        return True
@@ -0,0 +1,383 @@
+"""Rolling window statistics of process samples.
+
+Samples are kept per process in fixed size array-backed ring buffers, so
+memory used per process is bounded no matter how long process runs. Ring
+buffer holds the whole window when process is sampled on every tick, so
+windows longer than MAX_WINDOW seconds are rejected.
+"""
+
+import array
+import math
+import re
+import threading
+import time
+
+from supervisor_checks import errors
+
+__author__ = 'vovanec@gmail.com'
+
+
+# Process is sampled at most once per tick, and the shortest SupervisorD tick
+# period is 5 seconds.
+MIN_SAMPLE_INTERVAL = 5
+# One day long window.
+MAX_SAMPLES = 17280
+MAX_WINDOW = MAX_SAMPLES * MIN_SAMPLE_INTERVAL
+EVICT_INTERVAL = 60
+
+STAT_MEAN = 'mean'
+STAT_EWMA = 'ewma'
+STAT_MIN = 'min'
+STAT_MAX = 'max'
+STATS = (STAT_MEAN, STAT_EWMA, STAT_MIN, STAT_MAX)
+
+_PERCENTILE_RE = re.compile(r'^p(\d{1,2}(?:\.\d+)?|100)$')
+
+
+class SampleWindow(object):
+    """Fixed size ring buffer of (timestamp, value) samples of single process.
+    """
+
+    def __init__(self, max_samples, ewma_window=None):
+        """Constructor.
+
+        :param int max_samples: maximum number of samples to keep.
+        :param float ewma_window: EWMA time constant, seconds.
+        """
+
+        self._timestamps = array.array('d', [0.0] * max_samples)
+        self._values = array.array('d', [0.0] * max_samples)
+        self._max_samples = max_samples
+        self._pos = 0
+        self._count = 0
+
+        self.first_seen = None
+        self.last_seen = None
+        self._ewma = None
+        self._ewma_window = ewma_window
+
+    def __len__(self):
+        return self._count
+
+    def add(self, value, timestamp):
+        """Add sample.
+
+        :param float value: sample value.
+        :param float timestamp: sample timestamp.
+        """
+
+        self._timestamps[self._pos] = timestamp
+        self._values[self._pos] = value
+        self._pos = (self._pos + 1) % self._max_samples
+        self._count = min(self._count + 1, self._max_samples)
+
+        if self.first_seen is None:
+            self.first_seen = timestamp
+
+        if self._ewma is None or not self._ewma_window:
+            self._ewma = value
+        else:
+            alpha = 1.0 - math.exp(
+                -(timestamp - self.last_seen) / self._ewma_window)
+            self._ewma += alpha * (value - self._ewma)
+
+        self.last_seen = timestamp
+
+    def covers(self, window, now):
+        """Whether samples have been collected for at least window seconds,
+        and none of them has been overwritten within the window.
+
+        :param float window: window length, seconds.
+        :param float now: current timestamp.
+
+        :rtype: bool
+        """
+
+        if self.first_seen is None or now - self.first_seen < window:
+            return False
+
+        if self._count < self._max_samples:
+            return True
+
+        # Ring buffer is full: current position holds the oldest sample.
+        return self._timestamps[self._pos] <= now - window
+
+    def values(self, window, now):
+        """Get sample values within the window.
+
+        :param float window: window length, seconds.
+        :param float now: current timestamp.
+
+        :rtype: list
+        """
+
+        return [value for _, value in self.samples(window, now)]
+
+    def samples(self, window, now):
+        """Get samples within the window, oldest first.
+
+        :param float window: window length, seconds.
+        :param float now: current timestamp.
+
+        :return: the list of tuples (timestamp, value)
+        :rtype: list
+        """
+
+        since = now - window
+        start = (self._pos - self._count) % self._max_samples
+
+        result = []
+        for idx in range(start, start + self._count):
+            idx %= self._max_samples
+            if self._timestamps[idx] >= since:
+                result.append((self._timestamps[idx], self._values[idx]))
+
+        return result
+
+    def get_stat(self, stat, window, now):
+        """Calculate statistic over the window.
+
+        :param str stat: statistic name: mean, ewma, min, max or percentile
+               in format pNN, e.g. p50, p95, p99.9.
+        :param float window: window length, seconds.
+        :param float now: current timestamp.
+
+        :rtype: float|None
+        """
+
+        if stat == STAT_EWMA:
+            return self._ewma
+
+        values = self.values(window, now)
+        if not values:
+            return None
+
+        if stat == STAT_MEAN:
+            return sum(values) / len(values)
+        elif stat == STAT_MIN:
+            return min(values)
+        elif stat == STAT_MAX:
+            return max(values)
+
+        return percentile(values, parse_percentile(stat))
+
+
+class StatsStore(object):
+    """Per process sample windows. Thread safe.
+
+    Process is identified by the tuple (pid, create_time) so that samples
+    of dead process are never attributed to a new process reusing its pid.
+    Windows which haven't received samples for longer than the maximum
+    window length are evicted.
+    """
+
+    def __init__(self, max_samples=None):
+        """Constructor.
+
+        :param int max_samples: maximum number of samples kept per process.
+               Default: get_max_samples(window)
+        """
+
+        self._max_samples = max_samples
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._evicted_at = time.time()
+        self._max_window = 0
+
+    def __len__(self):
+        return len(self._windows)
+
+    def add_sample(self, process_key, value, window, timestamp=None):
+        """Add process sample.
+
+        :param tuple process_key: process identity, (pid, create_time).
+        :param float value: sample value.
+        :param float window: window length samples are used for, seconds.
+        :param float timestamp: sample timestamp, current time by default.
+
+        :rtype: SampleWindow
+        """
+
+        timestamp = time.time() if timestamp is None else timestamp
+
+        with self._lock:
+            self._max_window = max(self._max_window, window)
+            self._evict(timestamp)
+
+            sample_window = self._windows.get(process_key)
+            if sample_window is None:
+                # EWMA time constant is the window length.
+                sample_window = SampleWindow(
+                    self._max_samples or get_max_samples(window), window)
+                self._windows[process_key] = sample_window
+
+            sample_window.add(value, timestamp)
+
+        return sample_window
+
+    def get_stat(self, process_key, stat, window, now=None):
+        """Calculate process statistic over the window.
+
+        :param tuple process_key: process identity, (pid, create_time).
+        :param str stat: statistic name.
+        :param float window: window length, seconds.
+        :param float now: current timestamp.
+
+        :return: statistic value or None if process has not been observed
+                 for the whole window yet.
+
+        :rtype: float|None
+        """
+
+        now = time.time() if now is None else now
+
+        with self._lock:
+            sample_window = self._windows.get(process_key)
+            if sample_window is None or not sample_window.covers(window, now):
+                return None
+
+            return sample_window.get_stat(stat, window, now)
+
+    def get_samples(self, process_key, window, now=None):
+        """Get process samples within the window.
+
+        :param tuple process_key: process identity, (pid, create_time).
+        :param float window: window length, seconds.
+        :param float now: current timestamp.
+
+        :return: the list of tuples (timestamp, value) or None if process
+                 has not been observed for the whole window yet.
+
+        :rtype: list|None
+        """
+
+        now = time.time() if now is None else now
+
+        with self._lock:
+            sample_window = self._windows.get(process_key)
+            if sample_window is None or not sample_window.covers(window, now):
+                return None
+
+            return sample_window.samples(window, now)
+
+    def _evict(self, now):
+
+        if now - self._evicted_at < EVICT_INTERVAL:
+            return
+
+        self._evicted_at = now
+        stale_since = now - max(self._max_window, EVICT_INTERVAL)
+        for process_key, sample_window in list(self._windows.items()):
+            if sample_window.last_seen < stale_since:
+                del self._windows[process_key]
+
+
+def get_max_samples(window):
+    """Get the number of samples process sampled on every tick has within
+    the window.
+
+    :param float window: window length, seconds.
+
+    :rtype: int
+    """
+
+    # Extra samples make up for ticks handled late.
+    return min(int(math.ceil(window / MIN_SAMPLE_INTERVAL)) + 2, MAX_SAMPLES)
+
+
+def parse_percentile(stat):
+    """Parse percentile statistic name, e.g. p95.
+
+    :param str stat: statistic name.
+
+    :rtype: float|None
+    """
+
+    match = _PERCENTILE_RE.match(stat)
+    if match:
+        return float(match.group(1))
+
+    return None
+
+
+def percentile(values, pct):
+    """Calculate percentile using linear interpolation between closest ranks.
+
+    :param list values: non empty list of values.
+    :param float pct: percentile, 0-100.
+
+    :rtype: float
+    """
+
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100.0
+    low = int(math.floor(rank))
+    high = int(math.ceil(rank))
+
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def linear_regression(samples):
+    """Fit a line to samples using least squares.
+
+    :param list samples: the list of at least two tuples (timestamp, value)
+           with distinct timestamps.
+
+    :return: tuple (slope per second, fitted value at the last timestamp)
+    :rtype: tuple
+    """
+
+    count = len(samples)
+    mean_t = sum(timestamp for timestamp, _ in samples) / count
+    mean_v = sum(value for _, value in samples) / count
+
+    # Timestamps are centered, so that big epoch values don't cost precision.
+    s_tt = 0.0
+    s_tv = 0.0
+    for timestamp, value in samples:
+        s_tt += (timestamp - mean_t) ** 2
+        s_tv += (timestamp - mean_t) * (value - mean_v)
+
+    slope = s_tv / s_tt
+
+    return slope, mean_v + slope * (samples[-1][0] - mean_t)
+
+
+def validate_config(config, check_name):
+    """Validate rolling window parameters of check config: `window` and
+    `stat`. Raise InvalidCheckConfig in case if configuration is invalid.
+
+    :param dict config: check config.
+    :param str check_name: check name.
+    """
+
+    stat = config.get('stat')
+    if not stat:
+        return
+
+    if stat not in STATS and parse_percentile(str(stat)) is None:
+        raise errors.InvalidCheckConfig(
+            '`stat` parameter must be one of %s or percentile in format pNN '
+            'in %s check config.' % (', '.join(STATS), check_name))
+
+    if not isinstance(config.get('window'), (int, float)) or \
+            config['window'] <= 0:
+        raise errors.InvalidCheckConfig(
+            '`window` parameter must be positive number when `stat` parameter '
+            'is specified in %s check config.' % (check_name,))
+
+    validate_window(config['window'], check_name)
+
+
+def validate_window(window, check_name):
+    """Raise InvalidCheckConfig if samples of the window don't fit in ring
+    buffer.
+
+    :param float window: window length, seconds.
+    :param str check_name: check name.
+    """
+
+    if window > MAX_WINDOW:
+        raise errors.InvalidCheckConfig(
+            '`window` parameter must not be greater than %s seconds in %s '
+            'check config.' % (MAX_WINDOW, check_name))
@@ -0,0 +1,260 @@
+"""Non-blocking TCP probes multiplexed on single selector.
+
+All probes of the batch are connected at once as non-blocking sockets, so
+the whole batch completes in about one round trip, no matter how many ports
+are probed. Every probe has its own deadline. Optionally, probe sends the
+request once connected and expects response to contain the given string,
+e.g. PING -> +PONG for Redis. Batch may be run in background thread with
+start_probes(), while consumers wait for results of their probes.
+"""
+
+import errno
+import os
+import selectors
+import socket
+import threading
+import time
+
+__author__ = 'vovanec@gmail.com'
+
+
+# Response is read until it contains expected string, but not more than that.
+MAX_RESPONSE_SIZE = 4096
+
+_CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+
+class UnexpectedResponse(Exception):
+    """Raised when response doesn't contain expected string.
+    """
+
+    pass
+
+
+class Probe(object):
+    """Single TCP probe and its result.
+    """
+
+    def __init__(self, host, port, timeout, send=None, expect=None):
+        """Constructor.
+
+        :param str host: host to connect to.
+        :param int port: port to connect to.
+        :param float timeout: probe timeout, seconds.
+        :param bytes send: data to send once connected.
+        :param bytes expect: response must contain that to succeed.
+        """
+
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.send = send
+        self.expect = expect
+
+        # Set when probe is done: None if it succeeded.
+        self.error = None
+        self.done = False
+        self._done_event = threading.Event()
+        self._done_callbacks = []
+        self._done_lock = threading.Lock()
+
+        self._sock = None
+        self._deadline = None
+        self._connected = False
+        self._out = send or b''
+        self._response = b''
+
+    def get_result(self):
+        """Get probe result.
+
+        :return: True if probe succeeded, otherwise error is raised.
+        :rtype: bool
+        """
+
+        if not self.done:
+            raise RuntimeError('Probe of port %s is not done.' % (self.port,))
+
+        if self.error is not None:
+            raise self.error
+
+        return True
+
+    def wait(self, timeout=None):
+        """Wait until probe is done.
+
+        :param float timeout: wait for that many seconds at most.
+
+        :return: True if probe is done.
+        :rtype: bool
+        """
+
+        return self._done_event.wait(timeout)
+
+    def add_done_callback(self, callback):
+        """Call the callback when probe is done, from the thread running the
+        probe. If probe is already done, callback is called right away.
+
+        :param () -> None callback: callback.
+        """
+
+        with self._done_lock:
+            if not self.done:
+                self._done_callbacks.append(callback)
+                return
+
+        callback()
+
+    def _start(self, now):
+
+        self._deadline = now + self.timeout
+        try:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setblocking(False)
+            err = self._sock.connect_ex((self.host, self.port))
+        except OSError as exc:
+            # E.g. out of file descriptors.
+            err = exc
+        else:
+            if err in _CONNECT_IN_PROGRESS:
+                return
+            if err:
+                err = _make_error(err)
+            else:
+                self._connected = True
+                if self._out or self.expect is not None:
+                    return
+                err = None
+
+        self._finish(err)
+        self._close()
+
+    def _get_events(self):
+
+        if not self._connected or self._out:
+            return selectors.EVENT_WRITE
+
+        return selectors.EVENT_READ
+
+    def _handle(self, events):
+        """Advance the probe on socket readiness.
+
+        :return: True if probe is still in progress.
+        :rtype: bool
+        """
+
+        try:
+            if not self._connected:
+                err = self._sock.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_ERROR)
+                if err:
+                    raise _make_error(err)
+                self._connected = True
+            elif events & selectors.EVENT_WRITE:
+                self._out = self._out[self._sock.send(self._out):]
+            elif events & selectors.EVENT_READ:
+                data = self._sock.recv(MAX_RESPONSE_SIZE)
+                self._response += data
+                if self.expect in self._response:
+                    return self._finish()
+                if not data or len(self._response) >= MAX_RESPONSE_SIZE:
+                    raise UnexpectedResponse(
+                        'Response from port %s does not contain %r: %r' % (
+                            self.port, self.expect,
+                            self._response[:MAX_RESPONSE_SIZE]))
+
+            if self._connected and not self._out and self.expect is None:
+                return self._finish()
+        except (OSError, UnexpectedResponse) as exc:
+            return self._finish(exc)
+
+        return True
+
+    def _finish(self, error=None):
+
+        with self._done_lock:
+            self.error = error
+            self.done = True
+            callbacks, self._done_callbacks = self._done_callbacks, []
+
+        self._done_event.set()
+        for callback in callbacks:
+            callback()
+
+        return False
+
+    def _close(self):
+
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def run_probes(probes):
+    """Run probes concurrently, until all of them are done or timed out.
+    Result of every probe is set on the probe itself.
+
+    :param list probes: the list of Probe instances.
+    """
+
+    now = time.monotonic()
+    in_progress = {}
+    with selectors.DefaultSelector() as selector:
+        try:
+            for probe in probes:
+                probe._start(now)
+                if not probe.done:
+                    in_progress[probe] = probe._get_events()
+                    selector.register(probe._sock, in_progress[probe], probe)
+
+            _select_loop(selector, in_progress)
+        finally:
+            for probe in in_progress:
+                probe._close()
+
+
+def start_probes(probes):
+    """Run probes concurrently in background thread, so that the caller is
+    not blocked until they are done.
+
+    :param list probes: the list of Probe instances.
+
+    :rtype: threading.Thread
+    """
+
+    thread = threading.Thread(target=run_probes, args=(probes,),
+                              name='tcp-probes')
+    thread.daemon = True
+    thread.start()
+
+    return thread
+
+
+def _select_loop(selector, in_progress):
+
+    while in_progress:
+        timeout = max(min(probe._deadline for probe in in_progress) -
+                      time.monotonic(), 0)
+        for key, events in selector.select(timeout):
+            probe = key.data
+            if not probe._handle(events):
+                selector.unregister(probe._sock)
+                probe._close()
+                del in_progress[probe]
+            elif probe._get_events() != in_progress[probe]:
+                in_progress[probe] = probe._get_events()
+                selector.modify(probe._sock, in_progress[probe], probe)
+
+        now = time.monotonic()
+        for probe in [probe for probe in in_progress
+                      if probe._deadline <= now]:
+            selector.unregister(probe._sock)
+            probe._close()
+            del in_progress[probe]
+            probe._finish(socket.timeout(
+                'Probe of port %s timed out after %s seconds' % (
+                    probe.port, probe.timeout)))
+
+
+def _make_error(err):
+
+    return OSError(err, os.strerror(err))
@@ -4,7 +4,11 @@
 
 import contextlib
 import functools
+import importlib
+import random
 import re
+import socket
+import threading
 import time
 import os
 import tempfile
@@ -15,38 +19,256 @@ __author__ = 'vovanec@gmail.com'
 
 
 RETRY_SLEEP_TIME = 3
+DEFAULT_RETRY_MAX_BACKOFF = 30
+# The shortest timeout of the try capped by the deadline, seconds.
+MIN_TRY_TIMEOUT = 0.01
+
+# Names of error classes which may be used in `retry_on` check config
+# parameter. Errors given by 'module:class' path are imported only when used,
+# so that utils doesn't depend on check modules and asyncio.
+RETRYABLE_ERRORS = {
+    'timeout': (TimeoutError, socket.timeout, 'asyncio:TimeoutError'),
+    'connection_refused': (ConnectionRefusedError,),
+    'connection_reset': (ConnectionResetError, ConnectionAbortedError,
+                         BrokenPipeError),
+    'connection_error': (ConnectionError,),
+    'protocol_error': ('http.client:HTTPException',
+                       'xmlrpc.client:ProtocolError',
+                       'supervisor_checks.tcp_probe:UnexpectedResponse'),
+    'os_error': (OSError,),
+}
+
+
+class RetryPolicy(object):
+    """When and how long to wait before retrying failed call.
+
+    Delay before retry grows exponentially and is fully jittered: before
+    N-th retry it's random number of seconds between 0 and
+    min(max_backoff, backoff * 2 ** (N - 1)). No retry is made if it
+    wouldn't start before the deadline.
+    """
+
+    def __init__(self, num_retries, backoff=RETRY_SLEEP_TIME,
+                 max_backoff=DEFAULT_RETRY_MAX_BACKOFF, deadline=None,
+                 retryable_errors=(Exception,)):
+        """Constructor.
+
+        :param int num_retries: maximum number of retries.
+        :param float backoff: base retry delay, seconds.
+        :param float max_backoff: maximum retry delay, seconds.
+        :param float deadline: give up retrying if that many seconds passed
+               since the first try.
+        :param tuple retryable_errors: retry only on errors of these classes.
+        """
+
+        self.num_retries = num_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.retryable_errors = retryable_errors
+
+    @classmethod
+    def from_config(cls, config, default_num_retries):
+        """Create retry policy from check config.
+
+        :param dict config: check config, validated with
+               validate_retry_config.
+        :param int default_num_retries: check's default number of retries.
+
+        :rtype: RetryPolicy
+        """
+
+        retryable_errors = (Exception,)
+        if config.get('retry_on') is not None:
+            retryable_errors = get_retryable_errors(config['retry_on'])
+
+        backoff = config.get('retry_backoff')
+        if backoff is None:
+            backoff = RETRY_SLEEP_TIME
+
+        max_backoff = config.get('retry_max_backoff')
+        if max_backoff is None:
+            max_backoff = DEFAULT_RETRY_MAX_BACKOFF
+
+        return cls(config.get('num_retries', default_num_retries),
+                   backoff=backoff, max_backoff=max_backoff,
+                   deadline=config.get('deadline'),
+                   retryable_errors=retryable_errors)
+
+    def get_deadline_at(self):
+        """Get monotonic time of the deadline for the call starting now.
+
+        :rtype: float|None
+        """
+
+        if self.deadline is None:
+            return None
+
+        return time.monotonic() + self.deadline
+
+    def get_retry_delay(self, exc, tries_count, deadline_at=None):
+        """Get delay before the next retry.
+
+        :param Exception exc: error raised by the last try.
+        :param int tries_count: number of tries made so far.
+        :param float deadline_at: monotonic time of the deadline.
+
+        :return: delay in seconds or None if call shouldn't be retried.
+        :rtype: float|None
+        """
+
+        if (tries_count > self.num_retries or
+                not isinstance(exc, self.retryable_errors)):
+            return None
+
+        retry_in = random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (tries_count - 1)))
+
+        if deadline_at is not None and \
+                time.monotonic() + retry_in >= deadline_at:
+            return None
+
+        return retry_in
+
+
+def get_retryable_errors(error_names):
+    """Get error classes by names used in `retry_on` check config parameter.
+
+    :param list error_names: names of RETRYABLE_ERRORS.
+
+    :rtype: tuple
+    """
+
+    error_classes = []
+    for error_name in error_names:
+        for error_class in RETRYABLE_ERRORS[error_name]:
+            if isinstance(error_class, str):
+                module_name, class_name = error_class.split(':')
+                error_class = getattr(importlib.import_module(module_name),
+                                      class_name)
+            error_classes.append(error_class)
+
+    return tuple(error_classes)
+
+
+def validate_retry_config(config, check_name):
+    """Validate retry policy parameters of check config.
+
+    :param dict config: check config.
+    :param str check_name: check name.
+
+    :raises errors.InvalidCheckConfig: if config is invalid.
+    """
+
+    for param in ('retry_backoff', 'retry_max_backoff'):
+        value = config.get(param)
+        if value is not None and (not isinstance(value, (int, float)) or
+                                  value < 0):
+            raise errors.InvalidCheckConfig(
+                '`%s` parameter must be non-negative number in %s check '
+                'config.' % (param, check_name))
+
+    # Zero deadline would make socket timeouts zero, i.e. non-blocking.
+    deadline = config.get('deadline')
+    if deadline is not None and (not isinstance(deadline, (int, float)) or
+                                 deadline <= 0):
+        raise errors.InvalidCheckConfig(
+            '`deadline` parameter must be positive number in %s check '
+            'config.' % (check_name,))
+
+    retry_on = config.get('retry_on')
+    if retry_on is not None:
+        if not isinstance(retry_on, (list, tuple)):
+            raise errors.InvalidCheckConfig(
+                '`retry_on` parameter must be list type in %s check '
+                'config.' % (check_name,))
+
+        for error_name in retry_on:
+            if error_name not in RETRYABLE_ERRORS:
+                raise errors.InvalidCheckConfig(
+                    'Unsupported error name in `retry_on` parameter in %s '
+                    'check config: %s. Must be one of: %s.' % (
+                        check_name, error_name,
+                        ', '.join(sorted(RETRYABLE_ERRORS))))
 
 
 class retry_errors(object):
     """Decorator to retry on errors.
+
+    If decorated function is called with `timeout` keyword argument and
+    retry policy has a deadline, timeout of every try is capped by the time
+    left until the deadline, so that the worst-case duration of the call is
+    bounded by the deadline.
     """
 
-    def __init__(self, num_retries, log):
+    def __init__(self, num_retries_or_policy, log, on_retry=None):
+        """Constructor.
+
+        :param int|RetryPolicy num_retries_or_policy: retry policy, or
+               maximum number of retries to use the default policy with.
+        :param (str) -> None log: logging function.
+        :param () -> None on_retry: called before every retry.
+        """
+
+        if isinstance(num_retries_or_policy, RetryPolicy):
+            self._policy = num_retries_or_policy
+        else:
+            self._policy = RetryPolicy(num_retries_or_policy)
 
-        self._num_retries = num_retries
         self._log = log
+        self._on_retry = on_retry
 
     def __call__(self, func):
 
         @functools.wraps(func)
         def wrap_it(*args, **kwargs):
+            deadline_at = self._policy.get_deadline_at()
+            timeout = kwargs.get('timeout')
             tries_count = 0
             while True:
+                self._cap_timeout(kwargs, timeout, deadline_at)
                 try:
                     return func(*args, **kwargs)
                 except Exception as exc:
                     tries_count += 1
 
-                    if tries_count <= self._num_retries:
-                        retry_in = tries_count * RETRY_SLEEP_TIME
-                        self._log(
-                            'Exception occurred: %s. Retry in %s seconds.' % (
-                                exc, retry_in))
+                    retry_in = self._get_retry_delay(
+                        exc, tries_count, deadline_at)
+                    if retry_in is None:
+                        raise
+
+                    time.sleep(retry_in)
+
+        return wrap_it
+
+    def wrap_async(self, coro_func):
+        """Same as decorator, but for coroutine functions. Sleeps between
+        retries without blocking the event loop.
+
+        :param coro_func: coroutine function.
+        """
+
+        import asyncio
 
-                        time.sleep(retry_in)
-                    else:
+        @functools.wraps(coro_func)
+        async def wrap_it(*args, **kwargs):
+            deadline_at = self._policy.get_deadline_at()
+            timeout = kwargs.get('timeout')
+            tries_count = 0
+            while True:
+                self._cap_timeout(kwargs, timeout, deadline_at)
+                try:
+                    return await coro_func(*args, **kwargs)
+                except Exception as exc:
+                    tries_count += 1
+
+                    retry_in = self._get_retry_delay(
+                        exc, tries_count, deadline_at)
+                    if retry_in is None:
                         raise
 
+                    await asyncio.sleep(retry_in)
+
         return wrap_it
 
     @contextlib.contextmanager
@@ -58,6 +280,34 @@ class retry_errors(object):
 
         yield self(func)
 
+    def _get_retry_delay(self, exc, tries_count, deadline_at):
+        """Get delay before the next retry and report the retry.
+
+        :return: delay in seconds or None if call shouldn't be retried.
+        """
+
+        retry_in = self._policy.get_retry_delay(exc, tries_count, deadline_at)
+        if retry_in is not None:
+            self._log('Exception occurred: %s. Retry in %.2f seconds.' % (
+                exc, retry_in))
+            if self._on_retry is not None:
+                self._on_retry()
+
+        return retry_in
+
+    @staticmethod
+    def _cap_timeout(kwargs, timeout, deadline_at):
+        """Cap `timeout` keyword argument by the time left until deadline.
+        """
+
+        if deadline_at is None or 'timeout' not in kwargs:
+            return
+
+        # Zero timeout would put socket in non-blocking mode.
+        time_left = max(deadline_at - time.monotonic(), MIN_TRY_TIMEOUT)
+        kwargs['timeout'] = (time_left if timeout is None
+                             else min(timeout, time_left))
+
 
 def get_port(port_or_port_re, process_name):
     """Given the regular expression, extract port from the process name.
@@ -138,7 +388,7 @@ class NotificationFile:
         pid = pid if pid is not None else os.getpid()
         return os.path.join(root_dir, NotificationFile.get_filename(process_group, process_name, pid))
 
-    def __init__(self, filepath=None, root_dir=None, delete=True):
+    def __init__(self, filepath=None, root_dir=None, delete=True, min_interval=0):
         """
         Creates a NotificationFile object used to indicate a heartbeat.
         Only supports UNIX.
@@ -146,6 +396,8 @@ class NotificationFile:
         param str filepath: optional filepath to use as notification file
         param str root_dir: optional root_dir to use for the notification file (default: tempfile.gettempdir())
         param bool delete: wether to delete the notification file after fd is closed 
+        param float min_interval: notify() touches the file at most once in that many seconds, so that it
+              may be called from hot loops (default: 0, touch the file on every call)
         """
         if filepath is None:
             filepath = self.get_filepath(root_dir=root_dir)
@@ -158,10 +410,57 @@ class NotificationFile:
         self._tmp = _TemporaryFileWrapper(fd, filepath, delete=delete)
 
         self.spinner = 0
+        self.min_interval = min_interval
+        # Monotonic time before which notify() is a no-op. No lock: racing
+        # threads at worst both touch the file, which is harmless.
+        self._next_notify = 0
+        self._auto_thread = None
+        self._auto_stop = threading.Event()
 
     def notify(self):
-        self.spinner = (self.spinner + 1) % 2
-        os.fchmod(self._tmp.fileno(), self.spinner)
+        if self.min_interval:
+            now = time.monotonic()
+            if now < self._next_notify:
+                return
+            self._next_notify = now + self.min_interval
+
+        self._touch()
+
+    def start_auto_heartbeat(self, progress, interval):
+        """
+        Notify from background thread every `interval` seconds, but only while the process makes progress,
+        so that a stuck process still fails the check.
+
+        param callable progress: returns progress counter, e.g. number of requests served so far
+        param float interval: how often to notify, seconds
+        """
+        if self._auto_thread is not None:
+            raise RuntimeError("Auto heartbeat is already started")
+
+        self._auto_stop.clear()
+        self._auto_thread = threading.Thread(
+            target=self._auto_heartbeat, args=(progress, interval), name="auto-heartbeat", daemon=True)
+        self._auto_thread.start()
+
+    def stop_auto_heartbeat(self):
+        if self._auto_thread is not None:
+            self._auto_stop.set()
+            if self._auto_thread is not threading.current_thread():
+                self._auto_thread.join()
+            self._auto_thread = None
 
     def close(self):
+        self.stop_auto_heartbeat()
         return self._tmp.close()
+
+    def _touch(self):
+        self.spinner = (self.spinner + 1) % 2
+        os.fchmod(self._tmp.fileno(), self.spinner)
+
+    def _auto_heartbeat(self, progress, interval):
+        last_progress = progress()
+        while not self._auto_stop.wait(interval):
+            current_progress = progress()
+            if current_progress != last_progress:
+                last_progress = current_progress
+                self._touch()
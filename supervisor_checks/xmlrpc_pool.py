@@ -0,0 +1,246 @@
+"""Cache of persistent XML-RPC transports.
+"""
+
+import collections
+import select
+import socket
+import threading
+import time
+
+import supervisor.xmlrpc
+
+from supervisor_checks.compat import xmlrpclib
+
+__author__ = 'vovanec@gmail.com'
+
+
+DEFAULT_MAX_TRANSPORTS = 256
+DEFAULT_IDLE_TIMEOUT = 60
+
+
+class UnixStreamHTTPConnection(supervisor.xmlrpc.UnixStreamHTTPConnection):
+    """HTTP connection over UNIX socket which honors timeout.
+    """
+
+    def connect(self):
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socketfile)
+
+
+class TimeoutTransport(supervisor.xmlrpc.SupervisorTransport):
+    """SupervisorTransport which bounds connect and every socket operation
+    by timeout, so that server which accepts connection and stalls doesn't
+    block the check forever.
+    """
+
+    def __init__(self, username=None, password=None, serverurl=None,
+                 timeout=None):
+        """Constructor.
+
+        :param str username: username for basic authentication.
+        :param str password: password for basic authentication.
+        :param str serverurl: http:// or unix:// server URL.
+        :param float timeout: socket timeout, seconds.
+        """
+
+        super().__init__(username, password, serverurl)
+        self.timeout = timeout
+
+        if serverurl.startswith('unix://'):
+            def get_connection():
+                # The same 'localhost' SupervisorTransport uses.
+                connection = UnixStreamHTTPConnection('localhost')
+                connection.socketfile = serverurl[len('unix://'):]
+                return connection
+        else:
+            get_connection = self._get_connection
+
+        def get_connection_with_timeout():
+            connection = get_connection()
+            connection.timeout = self.timeout
+            return connection
+
+        self._get_connection = get_connection_with_timeout
+
+    def set_timeout(self, timeout):
+        """Change timeout, including that of established connection.
+
+        :param float timeout: socket timeout, seconds.
+        """
+
+        self.timeout = timeout
+        if self.connection is not None:
+            self.connection.timeout = timeout
+            if self.connection.sock is not None:
+                self.connection.sock.settimeout(timeout)
+
+
+class TransportCache(object):
+    """Thread safe cache of persistent XML-RPC transports per server URL and
+    credentials.
+
+    Transport is used by single call at a time: it's taken out of the cache
+    for the duration of the call. Connection of idle transport is checked for
+    staleness before reuse. Call over reused connection which turns out to be
+    closed by server is transparently repeated over a new connection.
+    Transports unused for longer than idle timeout, e.g. those of processes
+    which no longer exist, are evicted, as well as least recently used ones
+    when cache is full.
+    """
+
+    def __init__(self, max_transports=DEFAULT_MAX_TRANSPORTS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """Constructor.
+
+        :param int max_transports: maximum number of idle transports kept.
+        :param float idle_timeout: idle transports unused for longer than
+               that are closed, seconds.
+        """
+
+        self._max_transports = max_transports
+        self._idle_timeout = idle_timeout
+        # (server_url, username, password) -> (transport, last used time),
+        # least recently used first.
+        self._idle_transports = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._idle_transports)
+
+    def call(self, server_url, method_name, username=None, password=None,
+             timeout=None):
+        """Call XML-RPC method using cached transport.
+
+        :param str server_url: http:// or unix:// server URL.
+        :param str method_name: XML-RPC method name.
+        :param str username: username for basic authentication.
+        :param str password: password for basic authentication.
+        :param float timeout: socket timeout, seconds.
+
+        :return: method call result.
+        """
+
+        key = (server_url, username, password)
+        transport, reused = self._acquire(key)
+        transport.set_timeout(timeout)
+
+        try:
+            try:
+                result = self._call(transport, method_name)
+            except ConnectionError:
+                transport.close()
+                if not reused:
+                    raise
+
+                # Server has closed idle connection, retry once using new
+                # one.
+                result = self._call(transport, method_name)
+        except xmlrpclib.Fault:
+            # Fault response has been read completely, connection is fine.
+            self._release(key, transport)
+            raise
+        except Exception:
+            # Connection state is unknown, re-establish on the next call.
+            transport.close()
+            raise
+
+        self._release(key, transport)
+
+        return result
+
+    def close(self):
+        """Close all idle transports.
+        """
+
+        with self._lock:
+            idle_transports = self._idle_transports
+            self._idle_transports = collections.OrderedDict()
+
+        for transport, _ in idle_transports.values():
+            transport.close()
+
+    def _acquire(self, key):
+        """Get idle transport from the cache or create a new one.
+
+        :return: tuple (transport, whether connection is reused)
+        """
+
+        stale = []
+        with self._lock:
+            stale.extend(self._evict_idle(time.time()))
+            transport, _ = self._idle_transports.pop(key, (None, None))
+
+        for stale_transport in stale:
+            stale_transport.close()
+
+        if transport is None:
+            server_url, username, password = key
+            return TimeoutTransport(username, password, server_url), False
+
+        if self._is_stale(transport):
+            transport.close()
+            return transport, False
+
+        return transport, transport.connection is not None
+
+    def _release(self, key, transport):
+        """Return transport to the cache, evicting least recently used one if
+        cache is full.
+        """
+
+        evicted = []
+        with self._lock:
+            if key in self._idle_transports:
+                # Concurrent call has already returned transport for the key.
+                evicted.append(transport)
+            else:
+                self._idle_transports[key] = (transport, time.time())
+
+            while len(self._idle_transports) > self._max_transports:
+                _, (lru_transport, _) = self._idle_transports.popitem(
+                    last=False)
+                evicted.append(lru_transport)
+
+        for evicted_transport in evicted:
+            evicted_transport.close()
+
+    def _evict_idle(self, now):
+        """Remove transports which have been idle for too long. Must be
+        called with lock held.
+
+        :return: list of removed transports.
+        """
+
+        evicted = []
+        for key, (transport, last_used) in list(
+                self._idle_transports.items()):
+            if now - last_used > self._idle_timeout:
+                evicted.append(transport)
+                del self._idle_transports[key]
+
+        return evicted
+
+    @staticmethod
+    def _is_stale(transport):
+        """Idle connection is stale if socket is readable: server has closed
+        it or sent unexpected data.
+        """
+
+        connection = transport.connection
+        if connection is None or connection.sock is None:
+            return False
+
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+
+        return bool(readable)
+
+    @staticmethod
+    def _call(transport, method_name):
+
+        return getattr(xmlrpclib.ServerProxy('http://127.0.0.1', transport),
+                       method_name)()
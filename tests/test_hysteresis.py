@@ -0,0 +1,132 @@
+"""Tests of failure hysteresis and restart damping.
+"""
+
+import unittest
+
+from supervisor_checks import errors
+from supervisor_checks import hysteresis
+
+__author__ = 'vovanec@gmail.com'
+
+
+PROCESS_SPEC = {'group': 'example_service', 'name': 'example_service_00'}
+OTHER_PROCESS_SPEC = {'group': 'example_service',
+                      'name': 'example_service_01'}
+
+
+class FailureTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tracker = hysteresis.FailureTracker()
+        self.check = object()
+        self.policy = hysteresis.FailurePolicy(failures_before_restart=3,
+                                               successes_to_recover=2)
+
+    def test_restart_after_enough_failures(self):
+
+        results = [self.tracker.record_failure(self.check, self.policy,
+                                               PROCESS_SPEC)
+                   for _ in range(3)]
+
+        self.assertEqual(results, [(1, False), (2, False), (3, True)])
+
+    def test_single_success_does_not_recover(self):
+
+        self.tracker.record_failure(self.check, self.policy, PROCESS_SPEC)
+        self.tracker.record_failure(self.check, self.policy, PROCESS_SPEC)
+        self.tracker.record_success(self.check, self.policy, PROCESS_SPEC)
+
+        self.assertEqual(
+            self.tracker.record_failure(self.check, self.policy,
+                                        PROCESS_SPEC), (3, True))
+
+    def test_consecutive_successes_recover(self):
+
+        self.tracker.record_failure(self.check, self.policy, PROCESS_SPEC)
+        self.tracker.record_failure(self.check, self.policy, PROCESS_SPEC)
+        self.tracker.record_success(self.check, self.policy, PROCESS_SPEC)
+        self.tracker.record_success(self.check, self.policy, PROCESS_SPEC)
+
+        self.assertEqual(
+            self.tracker.record_failure(self.check, self.policy,
+                                        PROCESS_SPEC), (1, False))
+
+    def test_forget(self):
+
+        self.tracker.record_failure(self.check, self.policy, PROCESS_SPEC)
+        self.tracker.record_failure(self.check, self.policy,
+                                    OTHER_PROCESS_SPEC)
+        self.tracker.forget(PROCESS_SPEC)
+
+        self.assertEqual(
+            self.tracker.record_failure(self.check, self.policy,
+                                        PROCESS_SPEC), (1, False))
+        self.assertEqual(
+            self.tracker.record_failure(self.check, self.policy,
+                                        OTHER_PROCESS_SPEC), (2, False))
+
+    def test_invalid_policy(self):
+
+        with self.assertRaises(errors.InvalidCheckConfig):
+            hysteresis.FailurePolicy.from_config(
+                'http', {'restart': {'failures_before_restart': 0}})
+
+
+class RestartDamperTest(unittest.TestCase):
+
+    def test_not_restarted(self):
+
+        damper = hysteresis.RestartDamper(min_interval=10, backoff=30)
+
+        self.assertEqual(damper.get_delay(PROCESS_SPEC, now=100), 0)
+
+    def test_min_interval(self):
+
+        damper = hysteresis.RestartDamper(min_interval=10)
+        damper.record_restart(PROCESS_SPEC, now=100)
+
+        self.assertEqual(damper.get_delay(PROCESS_SPEC, now=104), 6)
+        self.assertEqual(damper.get_delay(PROCESS_SPEC, now=110), 0)
+        self.assertEqual(damper.get_delay(OTHER_PROCESS_SPEC, now=104), 0)
+
+    def test_backoff_before_second_restart(self):
+
+        damper = hysteresis.RestartDamper(backoff=30)
+        damper.record_restart(PROCESS_SPEC, now=100)
+
+        self.assertEqual(damper.get_delay(PROCESS_SPEC, now=100), 30)
+
+    def test_backoff_doubles_within_streak(self):
+
+        damper = hysteresis.RestartDamper(backoff=30, max_backoff=100)
+
+        delays = []
+        now = 0
+        for _ in range(4):
+            damper.record_restart(PROCESS_SPEC, now=now)
+            delay = damper.get_delay(PROCESS_SPEC, now=now)
+            delays.append(delay)
+            now += delay
+
+        self.assertEqual(delays, [30, 60, 100, 100])
+
+    def test_streak_is_over_after_max_backoff(self):
+
+        damper = hysteresis.RestartDamper(backoff=30, max_backoff=100)
+        damper.record_restart(PROCESS_SPEC, now=0)
+        damper.record_restart(PROCESS_SPEC, now=30)
+        damper.record_restart(PROCESS_SPEC, now=131)
+
+        self.assertEqual(damper.get_delay(PROCESS_SPEC, now=131), 30)
+
+    def test_min_interval_is_lower_bound(self):
+
+        damper = hysteresis.RestartDamper(min_interval=45, backoff=30)
+        damper.record_restart(PROCESS_SPEC, now=0)
+
+        self.assertEqual(damper.get_delay(PROCESS_SPEC, now=0), 45)
+
+
+if __name__ == '__main__':
+    unittest.main()
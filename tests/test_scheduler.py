@@ -0,0 +1,115 @@
+"""Tests of per-check scheduling.
+"""
+
+import unittest
+from unittest import mock
+
+from supervisor_checks import errors
+from supervisor_checks import scheduler
+
+__author__ = 'vovanec@gmail.com'
+
+
+PROCESS_SPEC = {'group': 'example_service', 'name': 'example_service_00'}
+OTHER_PROCESS_SPEC = {'group': 'example_service',
+                      'name': 'example_service_01'}
+
+
+class CheckScheduleTest(unittest.TestCase):
+
+    def test_defaults(self):
+
+        schedule = scheduler.CheckSchedule.from_config('tcp', {'port': 8080})
+
+        self.assertIsNone(schedule.interval)
+        self.assertEqual(schedule.jitter, 0)
+        self.assertIsNone(schedule.timeout)
+        self.assertFalse(schedule.gating)
+
+    def test_from_config(self):
+
+        schedule = scheduler.CheckSchedule.from_config(
+            'tcp', {'schedule': {'interval': 60, 'jitter': 30, 'timeout': 3,
+                                 'gating': True}})
+
+        self.assertEqual(schedule.interval, 60)
+        self.assertEqual(schedule.jitter, 30)
+        self.assertEqual(schedule.timeout, 3)
+        self.assertTrue(schedule.gating)
+
+    def test_invalid_config(self):
+
+        for schedule_config in ({'interval': 0}, {'timeout': 0},
+                                {'interval': -1}, {'timeout': '3'},
+                                {'jitter': -1}, {'gating': 'yes'}):
+            with self.assertRaises(errors.InvalidCheckConfig):
+                scheduler.CheckSchedule.from_config(
+                    'tcp', {'schedule': schedule_config})
+
+        with self.assertRaises(errors.InvalidCheckConfig):
+            scheduler.CheckSchedule.from_config('tcp', {'schedule': [60]})
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.scheduler = scheduler.Scheduler()
+        self.check = object()
+
+    def test_due_every_tick_by_default(self):
+
+        schedule = scheduler.CheckSchedule()
+
+        self.assertTrue(all(
+            self.scheduler.is_due(self.check, schedule, PROCESS_SPEC, now=now)
+            for now in range(0, 20, 5)))
+
+    def test_interval(self):
+
+        schedule = scheduler.CheckSchedule(interval=15)
+
+        due = [self.scheduler.is_due(self.check, schedule, PROCESS_SPEC,
+                                     now=now)
+               for now in range(0, 50, 5)]
+
+        self.assertEqual(due, [True, False, False,
+                               True, False, False,
+                               True, False, False,
+                               True])
+
+    def test_tick_arriving_early_is_not_skipped(self):
+
+        schedule = scheduler.CheckSchedule(interval=10)
+
+        self.assertTrue(self.scheduler.is_due(self.check, schedule,
+                                              PROCESS_SPEC, now=0))
+        self.assertTrue(self.scheduler.is_due(self.check, schedule,
+                                              PROCESS_SPEC, now=9.5))
+
+    def test_processes_are_scheduled_separately(self):
+
+        schedule = scheduler.CheckSchedule(interval=60)
+
+        self.assertTrue(self.scheduler.is_due(self.check, schedule,
+                                              PROCESS_SPEC, now=0))
+        self.assertTrue(self.scheduler.is_due(self.check, schedule,
+                                              OTHER_PROCESS_SPEC, now=5))
+        self.assertFalse(self.scheduler.is_due(self.check, schedule,
+                                               PROCESS_SPEC, now=5))
+
+    def test_jitter_delays_first_run_only(self):
+
+        schedule = scheduler.CheckSchedule(interval=20, jitter=30)
+
+        with mock.patch('random.uniform', return_value=12):
+            due = [now for now in range(0, 100, 5)
+                   if self.scheduler.is_due(self.check, schedule,
+                                            PROCESS_SPEC, now=now)]
+
+        # First run is delayed by jitter, then check is run every interval.
+        self.assertEqual(due, [15, 35, 55, 75, 95])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Tests of process sample statistics.
+"""
+
+import unittest
+
+from supervisor_checks import stats
+
+__author__ = 'vovanec@gmail.com'
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_single_value(self):
+
+        self.assertEqual(stats.percentile([7], 99), 7)
+
+    def test_bounds(self):
+
+        values = [5, 1, 4, 2, 3]
+
+        self.assertEqual(stats.percentile(values, 0), 1)
+        self.assertEqual(stats.percentile(values, 100), 5)
+        self.assertEqual(stats.percentile(values, 50), 3)
+
+    def test_interpolation(self):
+
+        self.assertAlmostEqual(stats.percentile([10, 20, 30, 40], 50), 25)
+        self.assertAlmostEqual(stats.percentile([10, 20], 95), 19.5)
+
+    def test_parse_percentile(self):
+
+        self.assertEqual(stats.parse_percentile('p95'), 95)
+        self.assertEqual(stats.parse_percentile('p99.9'), 99.9)
+        self.assertEqual(stats.parse_percentile('p100'), 100)
+        self.assertIsNone(stats.parse_percentile('p101'))
+        self.assertIsNone(stats.parse_percentile('mean'))
+
+
+class SampleWindowTest(unittest.TestCase):
+
+    def test_not_covered_until_window_passed(self):
+
+        window = stats.SampleWindow(10)
+        for timestamp in range(0, 30, 5):
+            window.add(1, timestamp)
+
+        self.assertFalse(window.covers(30, now=25))
+        self.assertTrue(window.covers(30, now=30))
+
+    def test_covers_after_ring_wrap(self):
+
+        window = stats.SampleWindow(4)
+        for timestamp in range(0, 100, 5):
+            window.add(1, timestamp)
+
+        # Samples of the last 15 seconds are kept, older are overwritten.
+        self.assertEqual(len(window), 4)
+        self.assertTrue(window.covers(15, now=95))
+        self.assertFalse(window.covers(20, now=95))
+
+    def test_samples_after_ring_wrap(self):
+
+        window = stats.SampleWindow(3)
+        for timestamp, value in enumerate([1, 2, 3, 4, 5]):
+            window.add(value, timestamp)
+
+        self.assertEqual(window.samples(10, now=4),
+                         [(2, 3), (3, 4), (4, 5)])
+        self.assertEqual(window.values(1, now=4), [4, 5])
+
+    def test_get_stat(self):
+
+        window = stats.SampleWindow(10)
+        for timestamp, value in enumerate([4, 1, 3, 2]):
+            window.add(value, timestamp)
+
+        self.assertEqual(window.get_stat(stats.STAT_MEAN, 10, now=3), 2.5)
+        self.assertEqual(window.get_stat(stats.STAT_MIN, 10, now=3), 1)
+        self.assertEqual(window.get_stat(stats.STAT_MAX, 10, now=3), 4)
+        self.assertEqual(window.get_stat('p100', 10, now=3), 4)
+        self.assertIsNone(window.get_stat(stats.STAT_MEAN, 10, now=100))
+
+    def test_get_max_samples(self):
+
+        self.assertEqual(stats.get_max_samples(60), 14)
+        self.assertEqual(stats.get_max_samples(stats.MAX_WINDOW * 2),
+                         stats.MAX_SAMPLES)
+
+
+class LinearRegressionTest(unittest.TestCase):
+
+    def test_exact_line(self):
+
+        samples = [(timestamp, 100 + 2 * timestamp)
+                   for timestamp in range(0, 50, 5)]
+
+        slope, last_value = stats.linear_regression(samples)
+
+        self.assertAlmostEqual(slope, 2)
+        self.assertAlmostEqual(last_value, 190)
+
+    def test_epoch_timestamps(self):
+
+        samples = [(1700000000 + timestamp, 5 - 0.5 * timestamp)
+                   for timestamp in range(10)]
+
+        slope, last_value = stats.linear_regression(samples)
+
+        self.assertAlmostEqual(slope, -0.5)
+        self.assertAlmostEqual(last_value, 0.5)
+
+    def test_noise_is_fitted(self):
+
+        slope, last_value = stats.linear_regression(
+            [(0, 0), (1, 2), (2, 0), (3, 2)])
+
+        self.assertAlmostEqual(slope, 0.4)
+        self.assertAlmostEqual(last_value, 1.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""Tests of concurrent TCP probes.
+"""
+
+import socket
+import threading
+import unittest
+
+from supervisor_checks import tcp_probe
+
+__author__ = 'vovanec@gmail.com'
+
+
+HOST = '127.0.0.1'
+
+
+class ProbeServer(object):
+    """Local TCP server which accepts connections. If response is given,
+    server replies to the first request of every connection with it and
+    closes the connection.
+    """
+
+    def __init__(self, response=None):
+
+        self.response = response
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind((HOST, 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        self._conns = []
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+
+        self._sock.close()
+        for conn in self._conns:
+            conn.close()
+
+    def _serve(self):
+
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            if self.response is None:
+                self._conns.append(conn)
+                continue
+            with conn:
+                conn.recv(1024)
+                conn.sendall(self.response)
+
+
+def get_closed_port():
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind((HOST, 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    return port
+
+
+class RunProbesTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.server = ProbeServer()
+        self.addCleanup(self.server.close)
+
+    def test_connect(self):
+
+        probe = tcp_probe.Probe(HOST, self.server.port, 1)
+        tcp_probe.run_probes([probe])
+
+        self.assertTrue(probe.done)
+        self.assertTrue(probe.get_result())
+
+    def test_connection_refused(self):
+
+        probe = tcp_probe.Probe(HOST, get_closed_port(), 1)
+        tcp_probe.run_probes([probe])
+
+        with self.assertRaises(ConnectionRefusedError):
+            probe.get_result()
+
+    def test_expect(self):
+
+        server = ProbeServer(response=b'+PONG\r\n')
+        self.addCleanup(server.close)
+
+        probe = tcp_probe.Probe(HOST, server.port, 1, send=b'PING\r\n',
+                                expect=b'PONG')
+        tcp_probe.run_probes([probe])
+
+        self.assertTrue(probe.get_result())
+
+    def test_unexpected_response(self):
+
+        server = ProbeServer(response=b'-ERR\r\n')
+        self.addCleanup(server.close)
+
+        probe = tcp_probe.Probe(HOST, server.port, 1, send=b'PING\r\n',
+                                expect=b'PONG')
+        tcp_probe.run_probes([probe])
+
+        with self.assertRaises(tcp_probe.UnexpectedResponse):
+            probe.get_result()
+
+    def test_timeout(self):
+
+        probe = tcp_probe.Probe(HOST, self.server.port, 0.2,
+                                expect=b'never sent')
+        tcp_probe.run_probes([probe])
+
+        with self.assertRaises(socket.timeout):
+            probe.get_result()
+
+    def test_probes_run_concurrently(self):
+
+        probes = [tcp_probe.Probe(HOST, self.server.port, 0.3,
+                                  expect=b'never sent')
+                  for _ in range(5)]
+        probes.append(tcp_probe.Probe(HOST, self.server.port, 1))
+
+        thread = tcp_probe.start_probes(probes)
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(probes[-1].get_result())
+        for probe in probes[:-1]:
+            with self.assertRaises(socket.timeout):
+                probe.get_result()
+
+    def test_done_callback(self):
+
+        done = []
+        probe = tcp_probe.Probe(HOST, self.server.port, 1)
+        probe.add_done_callback(lambda: done.append(1))
+
+        tcp_probe.start_probes([probe])
+
+        self.assertTrue(probe.wait(1))
+        self.assertEqual(done, [1])
+
+        probe.add_done_callback(lambda: done.append(2))
+        self.assertEqual(done, [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests of retry policy.
+"""
+
+import socket
+import time
+import unittest
+from unittest import mock
+
+from supervisor_checks import utils
+
+__author__ = 'vovanec@gmail.com'
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_no_retry_after_num_retries(self):
+
+        policy = utils.RetryPolicy(2)
+
+        self.assertIsNotNone(policy.get_retry_delay(OSError(), 1))
+        self.assertIsNotNone(policy.get_retry_delay(OSError(), 2))
+        self.assertIsNone(policy.get_retry_delay(OSError(), 3))
+
+    def test_full_jitter_grows_exponentially(self):
+
+        policy = utils.RetryPolicy(10, backoff=2, max_backoff=10)
+
+        with mock.patch('random.uniform', side_effect=lambda low, high: high):
+            delays = [policy.get_retry_delay(OSError(), tries_count)
+                      for tries_count in range(1, 6)]
+
+        self.assertEqual(delays, [2, 4, 8, 10, 10])
+
+    def test_jitter_is_random_within_backoff(self):
+
+        policy = utils.RetryPolicy(10, backoff=2, max_backoff=10)
+
+        delays = [policy.get_retry_delay(OSError(), 3) for _ in range(100)]
+
+        self.assertTrue(all(0 <= delay <= 8 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_retryable_errors(self):
+
+        policy = utils.RetryPolicy(
+            3, retryable_errors=utils.get_retryable_errors(['timeout']))
+
+        self.assertIsNotNone(policy.get_retry_delay(socket.timeout(), 1))
+        self.assertIsNone(policy.get_retry_delay(ConnectionRefusedError(), 1))
+
+    def test_no_retry_past_deadline(self):
+
+        policy = utils.RetryPolicy(3, backoff=1, max_backoff=1, deadline=5)
+        deadline_at = time.monotonic() + 0.5
+
+        with mock.patch('random.uniform', return_value=1):
+            self.assertIsNone(
+                policy.get_retry_delay(OSError(), 1, deadline_at))
+
+        with mock.patch('random.uniform', return_value=0.1):
+            self.assertEqual(
+                policy.get_retry_delay(OSError(), 1, deadline_at), 0.1)
+
+    def test_get_deadline_at(self):
+
+        self.assertIsNone(utils.RetryPolicy(3).get_deadline_at())
+
+        deadline_at = utils.RetryPolicy(3, deadline=10).get_deadline_at()
+        self.assertAlmostEqual(deadline_at, time.monotonic() + 10, delta=1)
+
+
+class RetryErrorsTest(unittest.TestCase):
+
+    def test_timeout_is_capped_by_deadline(self):
+
+        timeouts = []
+
+        @utils.retry_errors(utils.RetryPolicy(5, backoff=0.01,
+                                              max_backoff=0.01, deadline=1),
+                            lambda msg: None)
+        def call(timeout=None):
+            timeouts.append(timeout)
+            raise OSError('error')
+
+        with self.assertRaises(OSError):
+            call(timeout=10)
+
+        self.assertEqual(len(timeouts), 6)
+        self.assertTrue(all(timeout <= 1 for timeout in timeouts))
+
+    def test_retries_are_counted(self):
+
+        retries = []
+        results = [OSError('error'), OSError('error'), True]
+
+        def call():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        wrapped = utils.retry_errors(
+            utils.RetryPolicy(3, backoff=0.01, max_backoff=0.01),
+            lambda msg: None, on_retry=lambda: retries.append(1))(call)
+
+        self.assertTrue(wrapped())
+        self.assertEqual(len(retries), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()